@@ -3,10 +3,19 @@ import FingerRigTool as frt
 import maya.api.OpenMaya as om
 import rigging_utils as ru
 import pose_library as pl
+import facs_driven_keys as fdk
+import facs_index as fi
+import face_control_registry as fcr
+import facs_combination as fc
+import facs_transfer as ft
 import importlib
 importlib.reload(frt)
 importlib.reload(pl)
 importlib.reload(ru)
+importlib.reload(fdk)
+importlib.reload(fi)
+importlib.reload(fc)
+importlib.reload(ft)
 from functools import wraps
 
 import math
@@ -103,6 +112,29 @@ def storeTransformationBackToControl(control):
     mc.setAttr(f"{control}.scale", *scale)
 
 
+def storeTransformationsBackToControls(controls):
+    """
+    batched storeTransformationBackToControl, one matrix read pass and a single modifier for the whole face
+    Args:
+        controls (list) : controls getting back the transformation of their blend and constrain nodes
+    """
+    ft.store_back_to_controls(controls, [getCorrespondingBlendNode(control) for control in controls],
+                              [getCorrespondingConstrainNode(control) for control in controls])
+
+
+def writeShapeKeys(controls, driverAttr):
+    """
+    transfer the pose of the controls to their blend nodes and key it at the current driver value,
+    all the values are computed first and written by facs_driven_keys in bulk
+    Args:
+        controls (list) : controls contributing to the shape
+        driverAttr (string) : FACS_HUB attribute of the shape
+    """
+    blendNodes = [getCorrespondingBlendNode(control) for control in controls]
+    keyValues = fdk.get_blend_node_values(controls, blendNodes)
+    fdk.write_driven_keys(driverAttr, keyValues, driver_value=mc.getAttr(driverAttr))
+    ft.zero_transformations(controls)
+
 
 def undo_chunk(func):
 
@@ -142,14 +174,12 @@ def addControlsToShape(controls, shape):
     if not mc.ls(driverAttr):
         mc.addAttr(FACS_HUB, longName=shape, attributeType='float', minValue=0.0, maxValue=1.0, defaultValue=0.0, keyable=True)
     mc.setAttr(driverAttr, 0)
-    for control in controls:
-        blendNode = getCorrespondingBlendNode(control)
+    # neutral keys of every blend node written in bulk instead of setDrivenKeyframe per attribute
+    blendNodes = [getCorrespondingBlendNode(control) for control in controls]
+    for blendNode in blendNodes:
         zeroOutTransformation(blendNode)
-        for tfm in "trs":
-            for axis in "xyz":
-                drivenAttr = f"{blendNode}.{tfm}{axis}"
-                mc.setDrivenKeyframe(drivenAttr, currentDriver=driverAttr, inTangentType="linear",
-                                     outTangentType="linear")
+    fdk.write_driven_keys(driverAttr, {blendNode: fdk.NEUTRAL_VALUES for blendNode in blendNodes}, driver_value=0.0)
+    fi.add_controls(shape, controls)
 
     if mc.ls(driverAttr):
         connection = mc.listConnections(driverAttr, source=True, destination=False, connections=True, plugs=True)
@@ -172,99 +202,60 @@ def bakeTransformationToShape(controls, shape):
     if not mc.ls(driverAttr):
         mc.addAttr(FACS_HUB, longName=shape, attributeType='float', minValue=0.0, maxValue=1.0, defaultValue=0.0, keyable=True)
     mc.setAttr(driverAttr, 1)
-    for control in controls:
-        blendNode = getCorrespondingBlendNode(control)
-        transferFromControlToBlendNode(control)
-        for tfm in "trs":
-            for axis in "xyz":
-                drivenAttr = f"{blendNode}.{tfm}{axis}"
-                mc.setDrivenKeyframe(drivenAttr, currentDriver=driverAttr, inTangentType="linear",
-                                     outTangentType="linear")
+    writeShapeKeys(controls, driverAttr)
+    fi.add_controls(shape, controls)
 
 @undo_chunk
 def editShape(controls, shape):
-    for control in controls:
-        storeTransformationBackToControl(control)
+    storeTransformationsBackToControls(controls)
     driverAttr = f"{FACS_HUB}.{shape}"
     #grab the connection and disconnect to be able to set the attribute
     connection = mc.listConnections(driverAttr, source=True, destination=False, connections=True, plugs=True)
     if connection:
         mc.disconnectAttr(connection[1], connection[0])
     mc.setAttr(driverAttr, 1)
-    for control in controls:
-        blendNode = getCorrespondingBlendNode(control)
-        #clear out the old data
-        zeroOutTransformation(blendNode)
-        transferFromControlToBlendNode(control)
-        for tfm in "trs":
-            for axis in "xyz":
-                drivenAttr = f"{blendNode}.{tfm}{axis}"
-                mc.setDrivenKeyframe(drivenAttr, currentDriver=driverAttr, inTangentType="linear",
-                                     outTangentType="linear")
+    #clear out the old data
+    ft.zero_transformations([getCorrespondingBlendNode(control) for control in controls])
+    writeShapeKeys(controls, driverAttr)
+    fi.add_controls(shape, controls)
     if connection:
         mc.connectAttr(connection[1], connection[0])
 
 
 @undo_chunk
-def createCorrectivePose(shape):
+def createCorrectivePose(shape, operation="product"):
+    """
+    key a combination shape (e.g. "JawOpen_LipFunnel_LeftSmile") from the current pose,
+    the combined shapes are set on FACS_HUB and the controls posed on top of them
+    Args:
+        shape (string) : combination shape, the combined shapes joined by "_"
+        operation (string) : "product" or "min" of the combined weights, computed by one facsCombination node
+
+    Returns:
+    """
     if "Left" in shape:
         maskFaceControls(side="Left")
     elif "Right" in shape:
         maskFaceControls(side="Right")
-    else:
-        side="Center"
-    driverAttr = f"{FACS_HUB}.{shape}"
-    controls = getControlsFromFACSAttr(driverAttr)
-    for control in controls:
-        storeTransformationBackToControl(control)
-
-    pose_data_target = pl.collect_pose_data(controls)
-
-    resetAllControls()
-    #get sub poses
-    sub_poses = shape.split("_")
-    connections = []
+    sub_poses = fc.get_combined_shapes(shape)
     for sub_pose in sub_poses:
         if sub_pose not in mc.listAttr(FACS_HUB, userDefined=True):
             raise RuntimeError(f"Failed to find {sub_pose} in registered poses")
 
-        connection = mc.listConnections(f"{FACS_HUB}.{sub_pose}", source=True, destination=False, connections=True,
-                                        plugs=True)
-        connections.append(connection)
-        if connection:
-            mc.disconnectAttr(connection[1], connection[0])
-
-    pose_data_orig = pl.collect_pose_data(controls)
-    for sub_pose in sub_poses:
-        mc.setAttr(f"{FACS_HUB}.{sub_pose}", 0.0)
-    pl.apply_pose_data(pose_data_orig, space="world")
-
-    for control in controls:
-        deltas_translate = (om.MPoint(pose_data_target.get(control).get("localTrs")[0]) - om.MPoint(
-            mc.getAttr(f"{control}.translate")[0]))
-        deltas_rotate = (om.MPoint(pose_data_target.get(control).get("localTrs")[1]) - om.MPoint(
-            mc.getAttr(f"{control}.rotate")[1]))
-
-        mc.setAttr(f"{control}.translate", *deltas_translate)
-        mc.setAttr(f"{control}.rotate", *deltas_rotate)
+    # controls of the combination and of every shape it combines
+    controls = []
+    for pose in [shape] + sub_poses:
+        controls += [control for control in getControlsFromFACSAttr(f"{FACS_HUB}.{pose}") if control not in controls]
 
-    editShape(controls, shape)
-    for connection in connections:
-        mc.connectAttr(connection[1], connection[0])
+    fc.create_combination(shape, sub_poses, operation=operation)
+    # the keys hold the pose minus every lower order shape at the current weights
+    fc.key_combination(shape, controls)
+    ft.zero_transformations(controls)
+    fi.add_controls(shape, controls)
 
     #reevaluate all plugs
     mc.dgdirty(allPlugs=True)
 
-    mix_node = mc.createNode('multiplyDivide', name= shape + "_corrective_blend")
-
-    #multiply
-    mc.setAttr(f"{mix_node}.operation", 1)
-
-    mc.connectAttr(f"{FACS_HUB}.{sub_poses[0]}", f"{mix_node}.input1X")
-    mc.connectAttr(f"{FACS_HUB}.{sub_poses[1]}", f"{mix_node}.input2X")
-
-    mc.connectAttr(f"{mix_node}.outputX", f"{FACS_HUB}.{shape}")
-
 
 
 def createSliderGroup(topGroup, shapeName):
@@ -283,21 +274,9 @@ def createSliderGroup(topGroup, shapeName):
 
 
 def getControlsFromFACSAttr(facsAttr):
-    blendNodes = set()
-    outputs = mc.listConnections(facsAttr, source=False, destination=True, type="animCurve")
-    for animCurve in outputs:
-        dst = mc.listConnections(animCurve, source=False, destination=True)
-        for d in dst:
-            if mc.objectType(d) == "transform":
-                blendNodes.add(d)
-            elif mc.objectType(d) == "blendWeighted":
-                blendNodes.add(mc.listConnections(d, source=False, destination=True, type="transform")[0])
-
-    blendNodes = list(blendNodes)
-    controls = []
-    for blendNode in blendNodes:
-        controls.append(mc.listRelatives(blendNode, children=True, type="transform")[0])
-    return controls
+    # O(1) lookup in the shape control index stored on FACS_HUB, see facs_index.rebuild_index for legacy scenes
+    hub, shape = facsAttr.split(".", 1)
+    return fi.get_controls(shape, hub=hub)
 
 @undo_chunk
 def assumePose(poseName):
@@ -307,23 +286,20 @@ def assumePose(poseName):
         mc.disconnectAttr(connection[1], connection[0])
     mc.setAttr(driverAttr, 1)
     controls = getControlsFromFACSAttr(driverAttr)
-    for ctrl in controls:
-        storeTransformationBackToControl(ctrl)
+    storeTransformationsBackToControls(controls)
     mc.setAttr(driverAttr, 0)
     if connection:
         mc.connectAttr(connection[1], connection[0])
 
 
 def getFaceControls():
-    controls = mc.ls("*.controlType", objectsOnly=True)
-    #return if is Face control
-    return [control for control in controls if mc.getAttr(f"{control}.controlType") == 3]
+    # cached by the face control registry, kept current by attribute change callbacks
+    return fcr.get_face_controls()
 
 @undo_chunk
 def resetAllControls():
     faceControls = getFaceControls()
-    for control in faceControls:
-        zeroOutTransformation(control)
+    ft.zero_transformations(faceControls)
 
 @undo_chunk
 def mirrorPose(side="Left"):
@@ -334,8 +310,8 @@ def mirrorPose(side="Left"):
 
 
 def mirrorJoint(jnt, geo):
-    mc.xform(jnt, translation=True, worldSpace=True, query=True)
-    u, v = ru.getClosestUvAtPoint(jnt, geo, uvSet="map1")
+    position = mc.xform(jnt, translation=True, worldSpace=True, query=True)
+    u, v = ru.getClosestUVAtPoint(position, geo, uvSet="map1")
     mirrorPoint = ru.getPointAtUv([1-u, v], geo, uvSet="map1")
     mirrorJnt = jnt.replace("Left", "Right")
     mc.xform(mirrorJnt, translation=(mirrorPoint.x, mirrorPoint.y, mirrorPoint.z), worldSpace=True)
@@ -361,11 +337,11 @@ def createFaceControls(faceJoint):
 
 def maskFaceControls(side="Left"):
     sideIndex = ["Left", "Right", "Center"].index(side)
-    allFaceControls = getFaceControls()
-    for faceControl in allFaceControls:
-        if mc.getAttr(f"{faceControl}.controlLocation") == (1 - sideIndex):
+    allFaceControls, controlLocations = fcr.get_registry().get_controls_with_locations()
+    for faceControl, controlLocation in zip(allFaceControls, controlLocations):
+        if controlLocation == (1 - sideIndex):
             zeroOutTransformation(faceControl)
-        elif mc.getAttr(f"{faceControl}.controlLocation") == 2:
+        elif controlLocation == 2:
             # half the value as blend
             translation = mc.getAttr(f"{faceControl}.translate")[0]
             rotation = mc.getAttr(f"{faceControl}.rotate")[0]
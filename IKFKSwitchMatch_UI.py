@@ -8,6 +8,7 @@ import maya.cmds as mc
 import IKFKSwitchMatch as ifm
 import limb_data_node as ldn
 import ik_fk_match_callback as ifmc
+import callback_registry as cbr
 
 
 import importlib
@@ -194,11 +195,13 @@ class MyWindow(QMainWindow):
             widget.setStyleSheet("QLable {color : #ff6347;}")
 
     def bind_selectioncallbacks(self):
-        self.callback_id = om.MEventMessage.addEventCallback("SelectionChanged", self.selection_check, self.selection_display)
+        self.callback_id = cbr.register_callback(
+            lambda callback: om.MEventMessage.addEventCallback("SelectionChanged", callback, self.selection_display),
+            self.selection_check, name="IKFKMatchingUI.selection_check", persistent=True)
 
     def unbind_callbacks(self):
         if self.callback_id:
-            om.MMessage.removeCallback(self.callback_id)
+            cbr.remove_callback(self.callback_id)
             self.callback_id = None
 
     def closeEvent(self, event):
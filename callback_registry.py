@@ -0,0 +1,211 @@
+import logging
+import time
+import maya.api.OpenMaya as om
+
+#initiate logging with module name
+logger = logging.getLogger(__name__)
+
+"""
+registry owning every callback the toolkit installs
+
+callbacks are installed through register(), which wraps them to record call counts and execution time,
+and keeps their ids so they can be removed per node, per name or all at once without touching
+callbacks installed by anything else. Callbacks tied to the scene are torn down on scene new/open,
+the ones registered with persistent=True survive.
+
+usage:
+    import callback_registry as cbr
+    cbr.register_callback(lambda cb: om.MNodeMessage.addNodeDirtyPlugCallback(node_mobject, cb),
+                          myCallback, name="myCallback", node="myNode")
+    cbr.print_report()
+"""
+
+
+class CallbackEntry(object):
+
+    def __init__(self, name, callback, node_handle=None, persistent=False):
+        self.name = name
+        self.callback = callback
+        self.node_handle = node_handle
+        self.persistent = persistent
+        self.identifier = None
+        self.call_count = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def __call__(self, *args):
+        start = time.perf_counter()
+        try:
+            return self.callback(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.call_count += 1
+            self.total_time += elapsed
+            if elapsed > self.max_time:
+                self.max_time = elapsed
+
+    def get_node_name(self):
+        if self.node_handle is None or not self.node_handle.isValid():
+            return None
+        return om.MFnDependencyNode(self.node_handle.object()).name()
+
+
+def get_node_handle(node):
+    if node is None:
+        return None
+    if isinstance(node, om.MObject):
+        return om.MObjectHandle(node)
+    selection_list = om.MSelectionList()
+    selection_list.add(node)
+    return om.MObjectHandle(selection_list.getDependNode(0))
+
+
+class CallbackRegistry(object):
+
+    def __init__(self):
+        # callback id -> CallbackEntry
+        self.entries = {}
+        self.scene_callback_ids = []
+
+    def register(self, install, callback, name=None, node=None, persistent=False):
+        """
+        install a callback through the registry
+
+        Args:
+            install (callable): receives the wrapped callback and returns the id from the MMessage add function,
+                                e.g. lambda cb: om.MNodeMessage.addNodeDirtyPlugCallback(node_mobject, cb)
+            callback (callable): the actual callback
+            name (str): name shown in the report, the callback's name by default
+            node (str or MObject): node the callback is attached to, for removal per node
+            persistent (bool): keep the callback when a scene is opened or created
+
+        Returns:
+            the callback id
+        """
+        if name is None:
+            name = getattr(callback, "__qualname__", repr(callback))
+        entry = CallbackEntry(name, callback, node_handle=get_node_handle(node), persistent=persistent)
+        entry.identifier = install(entry.__call__)
+        self.entries[entry.identifier] = entry
+        return entry.identifier
+
+    def remove(self, identifier):
+        entry = self.entries.pop(identifier, None)
+        if entry is None:
+            return False
+        try:
+            om.MMessage.removeCallback(identifier)
+        except RuntimeError:
+            # the node owning the callback is gone and Maya removed it already
+            pass
+        logger.debug(f"Callback {entry.name} with ID {identifier} has been removed")
+        return True
+
+    def remove_on_node(self, node):
+        hash_code = get_node_handle(node).hashCode()
+        identifiers = [identifier for identifier, entry in self.entries.items()
+                       if entry.node_handle is not None and entry.node_handle.hashCode() == hash_code]
+        for identifier in identifiers:
+            self.remove(identifier)
+        return identifiers
+
+    def remove_by_name(self, name):
+        identifiers = [identifier for identifier, entry in self.entries.items() if entry.name == name]
+        for identifier in identifiers:
+            self.remove(identifier)
+        return identifiers
+
+    def remove_all(self, include_persistent=True):
+        identifiers = [identifier for identifier, entry in self.entries.items()
+                       if include_persistent or not entry.persistent]
+        for identifier in identifiers:
+            self.remove(identifier)
+
+    def get_callbacks_on_node(self, node):
+        hash_code = get_node_handle(node).hashCode()
+        return [identifier for identifier, entry in self.entries.items()
+                if entry.node_handle is not None and entry.node_handle.hashCode() == hash_code]
+
+    def scene_changed_callback(self, clientData):
+        self.remove_all(include_persistent=False)
+
+    def register_scene_callbacks(self):
+        if self.scene_callback_ids:
+            return
+        self.scene_callback_ids = [
+            om.MSceneMessage.addCallback(om.MSceneMessage.kBeforeNew, self.scene_changed_callback),
+            om.MSceneMessage.addCallback(om.MSceneMessage.kBeforeOpen, self.scene_changed_callback),
+        ]
+
+    def remove_scene_callbacks(self):
+        for identifier in self.scene_callback_ids:
+            om.MMessage.removeCallback(identifier)
+        self.scene_callback_ids = []
+
+    def report(self):
+        """
+        Returns:
+            list of dict per callback, sorted by cumulative execution time
+        """
+        rows = []
+        for identifier, entry in self.entries.items():
+            rows.append({"id": identifier,
+                         "name": entry.name,
+                         "node": entry.get_node_name(),
+                         "persistent": entry.persistent,
+                         "calls": entry.call_count,
+                         "total_time": entry.total_time,
+                         "max_time": entry.max_time,
+                         "average_time": entry.total_time / entry.call_count if entry.call_count else 0.0})
+        rows.sort(key=lambda row: row["total_time"], reverse=True)
+        return rows
+
+    def reset_statistics(self):
+        for entry in self.entries.values():
+            entry.call_count = 0
+            entry.total_time = 0.0
+            entry.max_time = 0.0
+
+
+_registry = None
+
+
+def get_registry():
+    global _registry
+    if _registry is None:
+        _registry = CallbackRegistry()
+        _registry.register_scene_callbacks()
+    return _registry
+
+
+def register_callback(install, callback, name=None, node=None, persistent=False):
+    return get_registry().register(install, callback, name=name, node=node, persistent=persistent)
+
+
+def remove_callback(identifier):
+    return get_registry().remove(identifier)
+
+
+def remove_callbacks_on_node(node):
+    return get_registry().remove_on_node(node)
+
+
+def get_callbacks_on_node(node):
+    return get_registry().get_callbacks_on_node(node)
+
+
+def remove_all_callbacks():
+    get_registry().remove_all()
+
+
+def report():
+    return get_registry().report()
+
+
+def print_report():
+    rows = report()
+    print(f"{'callback':<40} {'node':<30} {'calls':>8} {'total ms':>10} {'max ms':>8} {'avg ms':>8}")
+    for row in rows:
+        print(f"{row['name']:<40} {str(row['node']):<30} {row['calls']:>8} {row['total_time'] * 1000:>10.2f} "
+              f"{row['max_time'] * 1000:>8.2f} {row['average_time'] * 1000:>8.3f}")
+    return rows
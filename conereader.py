@@ -1,6 +1,16 @@
 import logging
+import os
 import maya.api.OpenMaya as om
 import maya.cmds as mc
+import callback_registry as cbr
+import conereader_eval as cre
+import metadata_index as mdi
+
+#initiate logging with module name
+logger = logging.getLogger(__name__)
+
+CONEREADER_PLUGIN = "conereader_node.py"
+CONEREADER_NODE_TYPE = "coneReader"
 
 """
 function helps to create cone reader at origin
@@ -10,12 +20,13 @@ Args:
     joint(str): name of the joint that this cone reader works on
     min_angle(float): angle that the minimum cone accept
     max_angle(float): angle that the maximum cone accept
+    use_node(bool): compute the readings with a single coneReader node instead of the utility node network
 """
 
 
-def setup_conereader(name, joint, min_angle, max_angle):
+def setup_conereader(name, joint, min_angle, max_angle, use_node=False):
 
-    cone_locators = create_conereader(name, min_angle, max_angle)
+    cone_locators = create_conereader(name, min_angle, max_angle, use_node=use_node)
 
     conereader_datanode = create_conereader_node(name, "coneReader", joint)
 
@@ -25,12 +36,11 @@ def setup_conereader(name, joint, min_angle, max_angle):
 
     create_HUD(conereader_datanode)
     group_node = mc.listConnections(f"{conereader_datanode}.group", source=True, destination=True)[0]
-    registerNodeDirtyPlugCallback(group_node)
+    registerNodeDirtyPlugCallback(group_node, conereader_datanode)
 
     return conereader_datanode
 
-def create_conereader(name, min_angle, max_angle):
-
+def create_conereader(name, min_angle, max_angle, use_node=False):
 
     temp_min_loc = mc.spaceLocator(name="temp_min")[0]
     temp_max_loc = mc.spaceLocator(name="temp_max")[0]
@@ -63,6 +73,9 @@ def create_conereader(name, min_angle, max_angle):
     for locator in locators:
         mc.parent(locator, cone_group)
 
+    if use_node:
+        create_conereader_solver(name, locators, cone_group)
+        return locators
 
     # get the angles between each vector formed by the locator with the origin
     angle_between_live_node = mc.createNode('angleBetween', name=name + 'angleBetween_live')
@@ -220,6 +233,105 @@ def create_conereader(name, min_angle, max_angle):
     return locators
 
 
+def load_conereader_plugin():
+    if not mc.pluginInfo(CONEREADER_PLUGIN, query=True, loaded=True):
+        plugin_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), CONEREADER_PLUGIN)
+        mc.loadPlugin(plugin_path, quiet=True)
+
+
+def add_reading_attributes(cone_group):
+    for attr in ["coneReading", "minAngleReading", "maxAngleReading"]:
+        if not mc.attributeQuery(attr, node=cone_group, exists=True):
+            mc.addAttr(cone_group, longName=attr, attributeType="float", defaultValue=.0, k=True)
+
+
+def create_conereader_solver(name, cone_locators, cone_group):
+    """
+    create a single coneReader node driven by the locators and connect its readings to the group
+
+    Args:
+        name(str) : prefix of the cone reader
+        cone_locators(list) : center, min, max and live locators
+        cone_group(str) : group holding the coneReading/minAngleReading/maxAngleReading attributes
+
+    Returns:
+        the coneReader node
+    """
+    load_conereader_plugin()
+
+    center_loc, min_loc, max_loc, live_loc = cone_locators
+
+    solver_node = mc.createNode(CONEREADER_NODE_TYPE, name=name + "_solver")
+
+    mc.connectAttr(f"{live_loc}.translate", f"{solver_node}.liveVector")
+    mc.connectAttr(f"{center_loc}.translate", f"{solver_node}.centerVector")
+    mc.connectAttr(f"{min_loc}.translate", f"{solver_node}.minVector")
+    mc.connectAttr(f"{max_loc}.translate", f"{solver_node}.maxVector")
+
+    add_reading_attributes(cone_group)
+
+    mc.connectAttr(f"{solver_node}.coneReading", f"{cone_group}.coneReading", force=True)
+    mc.connectAttr(f"{solver_node}.minAngleReading", f"{cone_group}.minAngleReading", force=True)
+    mc.connectAttr(f"{solver_node}.maxAngleReading", f"{cone_group}.maxAngleReading", force=True)
+
+    return solver_node
+
+
+def get_network_utility_nodes(cone_group):
+    # walk upstream from the reading attributes until the locators are reached
+    utility_types = ["angleBetween", "plusMinusAverage", "condition", "multiplyDivide", "unitConversion"]
+    utility_nodes = set()
+    pending = [f"{cone_group}.{attr}" for attr in ["coneReading", "minAngleReading", "maxAngleReading"]]
+    while pending:
+        sources = mc.listConnections(pending.pop(), source=True, destination=False, skipConversionNodes=False) or []
+        for source in sources:
+            if source in utility_nodes or mc.nodeType(source) not in utility_types:
+                continue
+            utility_nodes.add(source)
+            pending.append(source)
+
+    return list(utility_nodes)
+
+
+def convert_conereader_network(data_node):
+    """
+    replace the utility node network of an existing cone reader with a single coneReader node
+
+    Args:
+        data_node(str) : cone reader data node
+
+    Returns:
+        the coneReader node, or None if the reader already uses one
+    """
+    group = mc.listConnections(f"{data_node}.group", source=False, destination=True)[0]
+    if mc.listConnections(f"{group}.coneReading", source=True, destination=False, type=CONEREADER_NODE_TYPE):
+        return None
+
+    name = mc.getAttr(f"{data_node}.name")
+    cone_locators = [mc.listConnections(f"{data_node}.{attr}", source=False, destination=True)[0]
+                     for attr in ["cen_loc", "min_loc", "max_loc", "live_loc"]]
+
+    utility_nodes = get_network_utility_nodes(group)
+    if utility_nodes:
+        mc.delete(utility_nodes)
+
+    return create_conereader_solver(name, cone_locators, group)
+
+
+def convert_all_conereaders():
+    solver_nodes = []
+    mc.undoInfo(openChunk=True)
+    try:
+        for data_node in get_conereader_nodes():
+            solver_node = convert_conereader_network(data_node)
+            if solver_node:
+                solver_nodes.append(solver_node)
+    finally:
+        mc.undoInfo(closeChunk=True)
+
+    return solver_nodes
+
+
 
 """
 function draws the actual cones and connect them to data node for further operation
@@ -228,6 +340,11 @@ Args:
     selected_nodes(str) : any node; ideally are the nodes associated with a cone reader
 """
 
+def get_cone_radius(loc_node):
+    # distance from the y axis, locators rotated around z or x (see conereader_builder) draw the same cone
+    return float(cre.cone_dimensions(mc.getAttr(f"{loc_node}.translate")[0])[0])
+
+
 def draw_and_connect_cone(selected_nodes):
     if type(selected_nodes) is not list:
         selected_nodes = [selected_nodes]
@@ -241,7 +358,7 @@ def draw_and_connect_cone(selected_nodes):
                                                    destination=False,
                                                    type="network")[0]
 
-                    if data_node in get_conereader_nodes():
+                    if mdi.is_metadata_node(data_node, "coneReader"):
 
                         # if there were cones drew before
                         if (mc.listConnections(f"{data_node}.min_cone", source=False, destination=True) and
@@ -252,6 +369,7 @@ def draw_and_connect_cone(selected_nodes):
 
                             mc.delete(old_min_cone)
                             mc.delete(old_max_cone)
+                            invalidateConeShapeCache(data_node)
 
                         name = mc.getAttr(f"{data_node}.name")
 
@@ -272,10 +390,10 @@ def draw_and_connect_cone(selected_nodes):
                             max_additional_rot = -1
                             max_translate_flag = -1
 
-                        min_cone_radius = abs(mc.getAttr(f"{min_loc_node}.translateX")) * min_additional_rot
+                        min_cone_radius = get_cone_radius(min_loc_node) * min_additional_rot
                         min_cone_height = abs(mc.getAttr(f"{min_loc_node}.translateY"))
 
-                        max_cone_radius = abs(mc.getAttr(f"{max_loc_node}.translateX")) * max_additional_rot
+                        max_cone_radius = get_cone_radius(max_loc_node) * max_additional_rot
                         max_cone_height = abs(mc.getAttr(f"{max_loc_node}.translateY"))
 
                         min_cone_hr = abs(min_cone_height / min_cone_radius)
@@ -368,13 +486,29 @@ def connect_data_node(data_node, cone_locators):
 
 
 def get_conereader_nodes():
-    conereader_nodes = []
-    data_nodes = mc.ls(type="network")
-    for dn in data_nodes:
-        if mc.getAttr(f"{dn}.node_type") == "coneReader":
-            conereader_nodes.append(dn)
+    return mdi.get_metadata_nodes("coneReader")
+
 
-    return conereader_nodes
+def get_reading_plugs(data_node, attributes=("coneReading", "minAngleReading", "maxAngleReading")):
+    """
+    resolve the reading attributes on the group of a cone reader as MPlugs, to be cached by the caller
+
+    Args:
+        data_node(str) : cone reader data node
+        attributes(sequence) : reading attributes on the group
+
+    Returns:
+        (group, list of MPlug) or None if the reader has no group with these attributes
+    """
+    groups = mc.listConnections(f"{data_node}.group", source=False, destination=True)
+    if not groups:
+        return None
+    selection_list = om.MSelectionList()
+    selection_list.add(groups[0])
+    mfn_group = om.MFnDependencyNode(selection_list.getDependNode(0))
+    if not all(mfn_group.hasAttribute(attr) for attr in attributes):
+        return None
+    return groups[0], [mfn_group.findPlug(attr, False) for attr in attributes]
 
 
 def getConeReading():
@@ -474,14 +608,77 @@ def delete_HUD(data_node):
 
 
 
+# data nodes whose cones need a redraw, flushed once on idle
+_pending_cone_updates = set()
+_cone_update_scheduled = False
+# data node -> (min_cone, max_cone, min makeNurbCone, max makeNurbCone, min_loc, max_loc)
+_cone_shape_cache = {}
+
+
 def ModifyConeShapeCallback(msg, plug, clientData):
     attrName = plug.partialName(useLongNames=True)
     #check the plug data type is Float
     if plug.attribute().apiType() == om.MFn.kNumericAttribute:
         #check the changed attribute name is correct
         if attrName in ["minAngleReading","maxAngleReading"]:
-            ModifyConeShape()
+            if clientData:
+                queueConeShapeUpdate(clientData)
+            else:
+                ModifyConeShape()
+
+
+def queueConeShapeUpdate(data_node):
+    # dragging a locator dirties the plugs many times per frame, only remember the reader and redraw on idle
+    global _cone_update_scheduled
+    _pending_cone_updates.add(data_node)
+    if not _cone_update_scheduled:
+        _cone_update_scheduled = True
+        mc.evalDeferred(flushConeShapeUpdates, lowestPriority=True)
+
+
+def flushConeShapeUpdates():
+    global _cone_update_scheduled
+    _cone_update_scheduled = False
+    data_nodes = list(_pending_cone_updates)
+    _pending_cone_updates.clear()
+    for data_node in data_nodes:
+        if mc.objExists(data_node):
+            updateConeShape(data_node)
+        else:
+            _cone_shape_cache.pop(data_node, None)
+
 
+def invalidateConeShapeCache(data_node=None):
+    if data_node is None:
+        _cone_shape_cache.clear()
+    else:
+        _cone_shape_cache.pop(data_node, None)
+
+
+def getConeShapeNodes(data_node):
+    cached = _cone_shape_cache.get(data_node)
+    if cached and all(mc.objExists(node) for node in cached):
+        return cached
+
+    min_cones = mc.listConnections(f"{data_node}.min_cone", source=False, destination=True)
+    max_cones = mc.listConnections(f"{data_node}.max_cone", source=False, destination=True)
+    if not (min_cones and max_cones):
+        _cone_shape_cache.pop(data_node, None)
+        return None
+    min_cone = min_cones[0]
+    max_cone = max_cones[0]
+
+    min_history = mc.listHistory(min_cone)
+    max_history = mc.listHistory(max_cone)
+    min_cone_node = next(node for node in min_history if mc.nodeType(node) == "makeNurbCone")
+    max_cone_node = next(node for node in max_history if mc.nodeType(node) == "makeNurbCone")
+
+    min_loc_node = mc.listConnections(f"{data_node}.min_loc", source=False, destination=True)[0]
+    max_loc_node = mc.listConnections(f"{data_node}.max_loc", source=False, destination=True)[0]
+
+    cached = (min_cone, max_cone, min_cone_node, max_cone_node, min_loc_node, max_loc_node)
+    _cone_shape_cache[data_node] = cached
+    return cached
 
 
 def ModifyConeShape():
@@ -491,79 +688,80 @@ def ModifyConeShape():
     for node in selectedNodes:
         if mc.listConnections(f"{node}.dataParent", source=True, destination=False):
             data_node = mc.listConnections(f"{node}.dataParent", source=True, destination=True)[0]
-            if (mc.listConnections(f"{data_node}.min_cone", source=False, destination=True) and
-            mc.listConnections(f"{data_node}.max_cone", source=False, destination=True)):
-                min_cone = mc.listConnections(f"{data_node}.min_cone", source=False, destination=True)[0]
-                max_cone = mc.listConnections(f"{data_node}.max_cone", source=False, destination=True)[0]
+            updateConeShape(data_node)
+
 
-                min_history = mc.listHistory(min_cone)
-                max_history = mc.listHistory(max_cone)
-                min_cone_node = next(node for node in min_history if mc.nodeType(node) == "makeNurbCone")
-                max_cone_node = next(node for node in max_history if mc.nodeType(node) == "makeNurbCone")
+def updateConeShape(data_node):
+    cone_nodes = getConeShapeNodes(data_node)
+    if not cone_nodes:
+        return
+    min_cone, max_cone, min_cone_node, max_cone_node, min_loc_node, max_loc_node = cone_nodes
 
-                min_loc_node = mc.listConnections(f"{data_node}.min_loc", source=False, destination=True)[0]
-                max_loc_node = mc.listConnections(f"{data_node}.max_loc", source=False, destination=True)[0]
+    min_translate_flag = 1
+    max_translate_flag = 1
 
-                min_translate_flag = 1
-                max_translate_flag = 1
+    min_translate = mc.getAttr(f"{min_loc_node}.translate")[0]
+    max_translate = mc.getAttr(f"{max_loc_node}.translate")[0]
 
-                if mc.getAttr(f"{min_loc_node}.translateY") < 0:
-                    min_translate_flag = -1
+    if min_translate[1] < 0:
+        min_translate_flag = -1
 
-                if mc.getAttr(f"{max_loc_node}.translateY") < 0:
-                    max_translate_flag = -1
+    if max_translate[1] < 0:
+        max_translate_flag = -1
 
-                min_cone_radius = abs(mc.getAttr(f"{min_loc_node}.translateX"))
-                min_cone_height = abs(mc.getAttr(f"{min_loc_node}.translateY"))
-                max_cone_radius = abs(mc.getAttr(f"{max_loc_node}.translateX"))
-                max_cone_height = abs(mc.getAttr(f"{max_loc_node}.translateY"))
+    min_cone_radius = get_cone_radius(min_loc_node)
+    min_cone_height = abs(min_translate[1])
+    max_cone_radius = get_cone_radius(max_loc_node)
+    max_cone_height = abs(max_translate[1])
 
-                min_cone_hr = abs(min_cone_height / min_cone_radius)
-                max_cone_hr = abs(max_cone_height / max_cone_radius)
+    min_cone_hr = abs(min_cone_height / min_cone_radius)
+    max_cone_hr = abs(max_cone_height / max_cone_radius)
 
-                min_cone_radius = (4 / (min_cone_hr**2 + 1)) ** 0.5 * min_translate_flag
-                max_cone_radius = (4 / (max_cone_hr**2 + 1)) ** 0.5 * max_translate_flag
-                #r**2 + r**2 * min_cone_hr**2 = 4
+    min_cone_radius = (4 / (min_cone_hr**2 + 1)) ** 0.5 * min_translate_flag
+    max_cone_radius = (4 / (max_cone_hr**2 + 1)) ** 0.5 * max_translate_flag
+    #r**2 + r**2 * min_cone_hr**2 = 4
 
-                mc.setAttr(f"{min_cone_node}.radius", min_cone_radius)
-                mc.setAttr(f"{max_cone_node}.radius", max_cone_radius)
+    mc.setAttr(f"{min_cone_node}.radius", min_cone_radius)
+    mc.setAttr(f"{max_cone_node}.radius", max_cone_radius)
 
-                mc.setAttr(f"{min_cone_node}.heightRatio", min_cone_hr)
-                mc.setAttr(f"{max_cone_node}.heightRatio", max_cone_hr)
+    mc.setAttr(f"{min_cone_node}.heightRatio", min_cone_hr)
+    mc.setAttr(f"{max_cone_node}.heightRatio", max_cone_hr)
 
-                min_new_height = abs(min_cone_radius) * min_cone_hr
-                max_new_height = abs(max_cone_radius) * max_cone_hr
+    min_new_height = abs(min_cone_radius) * min_cone_hr
+    max_new_height = abs(max_cone_radius) * max_cone_hr
 
-                mc.setAttr(f"{min_cone}.translateY", min_translate_flag * min_new_height * 0.5)
-                mc.setAttr(f"{max_cone}.translateY", max_translate_flag * max_new_height * 0.5)
+    mc.setAttr(f"{min_cone}.translateY", min_translate_flag * min_new_height * 0.5)
+    mc.setAttr(f"{max_cone}.translateY", max_translate_flag * max_new_height * 0.5)
 
 
-def registerNodeDirtyPlugCallback(nodeName: str):
+def registerNodeDirtyPlugCallback(nodeName: str, data_node=None):
 
     # add the node to selectionlist and get the Mobject
     selectionList = om.MSelectionList()
     selectionList.add(nodeName)
     nodeMObject = selectionList.getDependNode(0)
 
-    #bind the callback function and return the id as reference
-    id = om.MNodeMessage.addNodeDirtyPlugCallback(nodeMObject, ModifyConeShapeCallback)
+    # the data node is handed to the callback so redraws are queued per reader rather than per selection
+    if data_node is None and mc.attributeQuery("dataParent", node=nodeName, exists=True):
+        data_nodes = mc.listConnections(f"{nodeName}.dataParent", source=True, destination=False)
+        if data_nodes:
+            data_node = data_nodes[0]
+
+    #bind the callback function through the registry and return the id as reference
+    id = cbr.register_callback(
+        lambda callback: om.MNodeMessage.addNodeDirtyPlugCallback(nodeMObject, callback, data_node),
+        ModifyConeShapeCallback, name="ModifyConeShapeCallback", node=nodeMObject)
     return id
 
 def removeCallback(identifier):
-    om.MMessage.removeCallback(identifier)
-    logger.info(f"Callback with ID {identifier} has been removed")
+    if cbr.remove_callback(identifier):
+        logger.info(f"Callback with ID {identifier} has been removed")
 
 def getCallbacks(nodeName):
-    selectionList = om.MSelectionList()
-    selectionList.add(nodeName)
-    nodeMObject = selectionList.getDependNode(0)
-    #collect all callback identifiers on that node (cast to list not callback array)
-    identifiers = list(om.MMessage.nodeCallbacks(nodeMObject))
-    return identifiers
+    #only the callbacks installed by the toolkit, foreign callbacks on the node are left alone
+    return cbr.get_callbacks_on_node(nodeName)
 
 def removeCallbacksOnNode(nodeName):
     identifiers = getCallbacks(nodeName)
     for identifier in identifiers:
         removeCallback(identifier)
-
-
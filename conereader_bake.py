@@ -0,0 +1,122 @@
+import json
+import os
+import numpy as np
+import maya.api.OpenMaya as om
+import conereader as cr
+
+"""
+bake cone reader readings over a frame range for pose-space deformation and corrective training
+
+the readings of every coneReader data node are sampled in one pass through cached MPlugs evaluated
+with an MDGContext per frame (the current time is never changed), and streamed in chunks into a
+memory-mapped .npy file, so memory stays bounded by chunk_size whatever the length of the range
+
+the bake writes two files:
+    <filepath>.npy   float32 array shaped (frames, readers, attributes)
+    <filepath>.json  reader names, attributes and frame numbers
+
+usage:
+    import conereader_bake as crbk
+    crbk.bake_conereaders("D:/bakes/walk", start=1, end=2400)
+    readings, readers, frames = crbk.load_bake("D:/bakes/walk")
+"""
+
+READING_ATTRIBUTES = ("coneReading", "minAngleReading", "maxAngleReading")
+
+
+def get_bake_paths(filepath):
+    root = os.path.splitext(filepath)[0]
+    return root + ".npy", root + ".json"
+
+
+def bake_conereaders(filepath, start, end, step=1.0, data_nodes=None, attributes=READING_ATTRIBUTES,
+                     chunk_size=1024):
+    """
+    sample the readings of cone readers over a frame range
+
+    Args:
+        filepath (str): output path, the .npy/.json extensions are added
+        start (float): first frame
+        end (float): last frame, included
+        step (float): frame step
+        data_nodes (list): cone reader data nodes, all of them in the scene if None
+        attributes (sequence): reading attributes on the cone reader groups
+        chunk_size (int): number of frames held in memory before being flushed to disk
+
+    Returns:
+        path of the .npy file
+    """
+    if data_nodes is None:
+        data_nodes = cr.get_conereader_nodes()
+
+    readers = []
+    plugs = []
+    for data_node in data_nodes:
+        reader = cr.get_reading_plugs(data_node, attributes)
+        if reader:
+            readers.append(data_node)
+            plugs.append(reader[1])
+
+    if not readers:
+        raise RuntimeError("Failed to find any cone reader to bake")
+
+    frames = np.arange(start, end + step * 0.5, step, dtype=np.float64)
+    array_path, meta_path = get_bake_paths(filepath)
+
+    output = np.lib.format.open_memmap(array_path, mode="w+", dtype=np.float32,
+                                       shape=(len(frames), len(readers), len(attributes)))
+    buffer = np.empty((min(chunk_size, len(frames)), len(readers), len(attributes)), dtype=np.float32)
+
+    time_unit = om.MTime.uiUnit()
+    chunk_start = 0
+    for frame_index, frame in enumerate(frames):
+        context = om.MDGContext(om.MTime(frame, time_unit))
+        row = buffer[frame_index - chunk_start]
+        previous_context = context.makeCurrent()
+        try:
+            for reader_index, reader_plugs in enumerate(plugs):
+                for attr_index, plug in enumerate(reader_plugs):
+                    row[reader_index, attr_index] = plug.asFloat()
+        finally:
+            previous_context.makeCurrent()
+
+        if frame_index - chunk_start + 1 == len(buffer) or frame_index == len(frames) - 1:
+            chunk_end = frame_index + 1
+            output[chunk_start:chunk_end] = buffer[:chunk_end - chunk_start]
+            output.flush()
+            chunk_start = chunk_end
+
+    del output
+
+    with open(meta_path, "w") as fp:
+        json.dump({"readers": readers,
+                   "attributes": list(attributes),
+                   "frames": frames.tolist()}, fp, indent=4)
+
+    print(f"Cone readings baked to {array_path} successfully")
+    return array_path
+
+
+def load_bake(filepath, attribute="coneReading", mmap=True):
+    """
+    load a bake as a frames x readers matrix
+
+    Args:
+        filepath (str): path given to bake_conereaders, with or without extension
+        attribute (str): which reading to return, or None for the full (frames, readers, attributes) array
+        mmap (bool): memory-map the file instead of reading it in memory
+
+    Returns:
+        (readings, reader names, frame numbers)
+    """
+    array_path, meta_path = get_bake_paths(filepath)
+    with open(meta_path, "r") as fp:
+        meta = json.load(fp)
+
+    readings = np.load(array_path, mmap_mode="r" if mmap else None)
+    if attribute is not None:
+        if attribute not in meta["attributes"]:
+            raise ValueError(f"{attribute} was not baked, available: {meta['attributes']}")
+        readings = readings[:, :, meta["attributes"].index(attribute)]
+
+    return readings, meta["readers"], np.asarray(meta["frames"])
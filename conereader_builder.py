@@ -0,0 +1,268 @@
+import json
+import math
+import time
+import maya.api.OpenMaya as om
+import maya.cmds as mc
+import conereader as cr
+import modifier_undo as mu
+
+"""
+build many cone readers at once from a declarative spec
+
+spec file (json), a list of readers or {"readers": [...]}:
+    [
+        {"name": "LeftShoulderReader", "joint": "JOLeftUpperArm1", "min_angle": 20, "max_angle": 80, "axis": "z"},
+        ...
+    ]
+
+the locators are placed analytically instead of through temporary locators and parentConstraints,
+every node, attribute and connection is made through a few MDagModifier/MDGModifier passes inside one undo chunk,
+and the readings are computed by the coneReader node (see conereader_node.py) instead of the utility node network
+
+usage:
+    import conereader_builder as crb
+    data_nodes = crb.build_conereaders_from_file("path/to/readers.json")
+    crb.benchmark(counts=(10, 100, 500))
+"""
+
+LOCATOR_SUFFIXES = ("center", "min", "max", "live")
+LOCATOR_ATTRIBUTES = ("cen_loc", "min_loc", "max_loc", "live_loc")
+READING_ATTRIBUTES = ("coneReading", "minAngleReading", "maxAngleReading")
+SOLVER_INPUTS = ("centerVector", "minVector", "maxVector", "liveVector")
+
+# rest position of the center locator, see conereader.create_conereader
+CENTER_POSITION = (0.0, 2.0, 0.0)
+
+
+def rotate_point(point, angle, axis="z"):
+    """
+    rotate a point about the origin, the analytic equivalent of mc.rotate(..., pivot=(0, 0, 0))
+
+    Args:
+        point (sequence): point to rotate
+        angle (float): angle in degrees
+        axis (str): "x" or "z", rotating around "y" would leave the center vector in place
+
+    Returns:
+        rotated point as a tuple
+    """
+    radians = math.radians(angle)
+    cos, sin = math.cos(radians), math.sin(radians)
+    x, y, z = point
+    if axis == "z":
+        return x * cos - y * sin, x * sin + y * cos, z
+    elif axis == "x":
+        return x, y * cos - z * sin, y * sin + z * cos
+    else:
+        raise ValueError(f"Invalid cone reader axis: {axis}")
+
+
+def get_locator_positions(min_angle, max_angle, axis="z"):
+    # same placement as create_conereader: center, min, max and live halfway between min and max
+    return [CENTER_POSITION,
+            rotate_point(CENTER_POSITION, min_angle, axis),
+            rotate_point(CENTER_POSITION, max_angle, axis),
+            rotate_point(CENTER_POSITION, (max_angle + min_angle) / 2, axis)]
+
+
+def load_spec(filepath):
+    with open(filepath, "r") as fp:
+        spec = json.load(fp)
+    if isinstance(spec, dict):
+        spec = spec.get("readers", [])
+    return validate_spec(spec)
+
+
+def validate_spec(spec):
+    readers = []
+    names = set()
+    for entry in spec:
+        for key in ["name", "joint", "min_angle", "max_angle"]:
+            if key not in entry:
+                raise ValueError(f"Cone reader spec is missing '{key}': {entry}")
+        if entry["name"] in names:
+            raise ValueError(f"Duplicated cone reader name in spec: {entry['name']}")
+        names.add(entry["name"])
+        axis = entry.get("axis", "z").lower()
+        if axis not in ("x", "z"):
+            raise ValueError(f"Invalid cone reader axis for {entry['name']}: {axis}")
+        readers.append({"name": entry["name"],
+                        "joint": entry["joint"],
+                        "min_angle": float(entry["min_angle"]),
+                        "max_angle": float(entry["max_angle"]),
+                        "axis": axis})
+    return readers
+
+
+def create_attribute(attr_type, long_name, nice_name=None):
+    # dynamic attribute objects can only be added to a single node, so a new one is created per node
+    if attr_type == "string":
+        mfn_attr = om.MFnTypedAttribute()
+        attr = mfn_attr.create(long_name, long_name, om.MFnData.kString)
+    elif attr_type == "message":
+        mfn_attr = om.MFnMessageAttribute()
+        attr = mfn_attr.create(long_name, long_name)
+    else:
+        mfn_attr = om.MFnNumericAttribute()
+        attr = mfn_attr.create(long_name, long_name, om.MFnNumericData.kFloat, 0.0)
+        mfn_attr.keyable = True
+    if nice_name:
+        mfn_attr.setNiceNameOverride(nice_name)
+    return attr
+
+
+def build_conereaders(spec, draw_cones=True):
+    """
+    build every cone reader of the spec in a single undo chunk
+
+    Args:
+        spec (list): list of dict with name, joint, min_angle, max_angle and optional axis
+        draw_cones (bool): draw the min/max cones and register their redraw callbacks
+
+    Returns:
+        list of the cone reader data nodes
+    """
+    readers = validate_spec(spec)
+    if not readers:
+        return []
+
+    cr.load_conereader_plugin()
+    mu.load_plugin()
+
+    mc.undoInfo(openChunk=True)
+    try:
+        # first pass: create the nodes
+        dag_modifier = om.MDagModifier()
+        dg_modifier = om.MDGModifier()
+        for reader in readers:
+            name = reader["name"]
+            group = dag_modifier.createNode("transform")
+            dag_modifier.renameNode(group, name + "_coneReader")
+            locators = []
+            for suffix in LOCATOR_SUFFIXES:
+                locator = dag_modifier.createNode("transform", group)
+                dag_modifier.renameNode(locator, f"{name}_{suffix}")
+                locator_shape = dag_modifier.createNode("locator", locator)
+                dag_modifier.renameNode(locator_shape, f"{name}_{suffix}Shape")
+                locators.append(locator)
+            data_node = dg_modifier.createNode("network")
+            dg_modifier.renameNode(data_node, name)
+            solver_node = dg_modifier.createNode(cr.CONEREADER_NODE_TYPE)
+            dg_modifier.renameNode(solver_node, name + "_solver")
+
+            reader["group"] = group
+            reader["locators"] = locators
+            reader["data_node"] = data_node
+            reader["solver_node"] = solver_node
+
+        mu.apply_modifier(dag_modifier)
+        mu.apply_modifier(dg_modifier)
+
+        # second pass: add the dynamic attributes
+        attr_modifier = om.MDGModifier()
+        for reader in readers:
+            data_node = reader["data_node"]
+            attr_modifier.addAttribute(data_node, create_attribute("string", "name", "Name"))
+            attr_modifier.addAttribute(data_node, create_attribute("string", "node_type", "Node Type"))
+            attr_modifier.addAttribute(data_node, create_attribute("string", "joint", "Joint"))
+            for attr, nice_name in [("cen_loc", "Central Locator"), ("min_loc", "Minimum Locator"),
+                                    ("max_loc", "Maximum Locator"), ("live_loc", "Live Locator"),
+                                    ("min_cone", "Min Cone"), ("max_cone", "Max Cone"), ("group", "Group")]:
+                attr_modifier.addAttribute(data_node, create_attribute("message", attr, nice_name))
+
+            for node in reader["locators"] + [reader["group"]]:
+                attr_modifier.addAttribute(node, create_attribute("message", "dataParent", "dataParent"))
+            for attr in READING_ATTRIBUTES:
+                attr_modifier.addAttribute(reader["group"], create_attribute("float", attr))
+
+        mu.apply_modifier(attr_modifier)
+
+        # third pass: values and connections
+        connect_modifier = om.MDGModifier()
+        for reader in readers:
+            mfn_data = om.MFnDependencyNode(reader["data_node"])
+            mfn_group = om.MFnDependencyNode(reader["group"])
+            mfn_solver = om.MFnDependencyNode(reader["solver_node"])
+
+            connect_modifier.newPlugValueString(mfn_data.findPlug("name", False), mfn_data.name())
+            connect_modifier.newPlugValueString(mfn_data.findPlug("node_type", False), "coneReader")
+            connect_modifier.newPlugValueString(mfn_data.findPlug("joint", False), reader["joint"])
+
+            positions = get_locator_positions(reader["min_angle"], reader["max_angle"], reader["axis"])
+            for locator, attr, solver_input, position in zip(reader["locators"], LOCATOR_ATTRIBUTES,
+                                                             SOLVER_INPUTS, positions):
+                mfn_locator = om.MFnDependencyNode(locator)
+                for axis, value in zip("XYZ", position):
+                    connect_modifier.newPlugValueDouble(mfn_locator.findPlug(f"translate{axis}", False), value)
+                connect_modifier.connect(mfn_data.findPlug(attr, False), mfn_locator.findPlug("dataParent", False))
+                connect_modifier.connect(mfn_locator.findPlug("translate", False),
+                                         mfn_solver.findPlug(solver_input, False))
+
+            connect_modifier.connect(mfn_data.findPlug("group", False), mfn_group.findPlug("dataParent", False))
+            for attr in READING_ATTRIBUTES:
+                connect_modifier.connect(mfn_solver.findPlug(attr, False), mfn_group.findPlug(attr, False))
+
+        mu.apply_modifier(connect_modifier)
+
+        data_nodes = [om.MFnDependencyNode(reader["data_node"]).name() for reader in readers]
+
+        if draw_cones:
+            for reader, data_node in zip(readers, data_nodes):
+                center_locator = om.MFnDagNode(reader["locators"][0]).partialPathName()
+                group = om.MFnDagNode(reader["group"]).partialPathName()
+                cr.draw_and_connect_cone(center_locator)
+                cr.registerNodeDirtyPlugCallback(group, data_node)
+    finally:
+        mc.undoInfo(closeChunk=True)
+
+    return data_nodes
+
+
+def build_conereaders_from_file(filepath, draw_cones=True):
+    return build_conereaders(load_spec(filepath), draw_cones=draw_cones)
+
+
+def make_test_spec(count):
+    return [{"name": f"benchReader{index}", "joint": "JOBenchmark1",
+             "min_angle": 10 + index % 30, "max_angle": 60 + index % 30, "axis": "z"} for index in range(count)]
+
+
+def benchmark(counts=(10, 100, 500)):
+    """
+    compare setup_conereader one reader at a time with the batched builder, each run in a new scene
+
+    Args:
+        counts (sequence): number of readers per run
+
+    Returns:
+        dict of count -> {"per_reader": seconds, "per_reader_node": seconds, "bulk": seconds}
+    """
+    report = {}
+    for count in counts:
+        spec = make_test_spec(count)
+        timings = {}
+
+        for label, use_node in [("per_reader", False), ("per_reader_node", True)]:
+            mc.file(new=True, force=True)
+            start = time.perf_counter()
+            for reader in spec:
+                cr.setup_conereader(reader["name"], reader["joint"], reader["min_angle"], reader["max_angle"],
+                                    use_node=use_node)
+            timings[label] = time.perf_counter() - start
+
+        mc.file(new=True, force=True)
+        start = time.perf_counter()
+        build_conereaders(spec)
+        timings["bulk"] = time.perf_counter() - start
+
+        report[count] = timings
+
+    mc.file(new=True, force=True)
+
+    print(f"{'readers':>8} {'per reader':>12} {'per reader (node)':>18} {'bulk':>10} {'speedup':>8}")
+    for count, timings in report.items():
+        speedup = timings["per_reader"] / timings["bulk"] if timings["bulk"] else float("inf")
+        print(f"{count:>8} {timings['per_reader']:>11.3f}s {timings['per_reader_node']:>17.3f}s "
+              f"{timings['bulk']:>9.3f}s {speedup:>7.1f}x")
+
+    return report
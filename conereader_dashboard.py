@@ -0,0 +1,125 @@
+import time
+import maya.api.OpenMaya as om
+import maya.cmds as mc
+import callback_registry as cbr
+import conereader as cr
+
+"""
+heads up display showing the readings of every cone reader in the scene
+
+unlike create_HUD, which resolves the selection and queries the group on every refresh for every element,
+the dashboard resolves the reader groups once, caches MPlug handles for their reading attributes,
+updates the selection mapping only on SelectionChanged and limits how often the readings are re-read
+
+usage:
+    import conereader_dashboard as crd
+    crd.create_dashboard(max_rate=20)
+    crd.delete_dashboard()
+"""
+
+DASHBOARD_HUD = "coneReaderDashboard"
+READING_ATTRIBUTES = ("coneReading", "minAngleReading", "maxAngleReading")
+
+
+class ConeReaderDashboard(object):
+
+    def __init__(self, max_rate=30.0):
+        self.interval = 1.0 / max_rate if max_rate > 0 else 0.0
+        # data node -> (group, [coneReading, minAngleReading, maxAngleReading] plugs)
+        self.readers = {}
+        self.selected_readers = set()
+        self.last_update = 0.0
+        self.cached_text = ""
+        self.callback_id = None
+
+    def refresh_readers(self):
+        data_nodes = cr.get_conereader_nodes()
+        # drop readers which are gone and only resolve the new ones
+        existing = set(data_nodes)
+        self.readers = {data_node: reader for data_node, reader in self.readers.items() if data_node in existing}
+        for data_node in data_nodes:
+            if data_node not in self.readers:
+                reader = cr.get_reading_plugs(data_node, READING_ATTRIBUTES)
+                if reader:
+                    self.readers[data_node] = reader
+
+    def selection_changed_callback(self, clientData):
+        self.refresh_readers()
+        group_to_reader = {group: data_node for data_node, (group, plugs) in self.readers.items()}
+        selected_readers = set()
+        for node in mc.ls(selection=True) or []:
+            if node in group_to_reader:
+                selected_readers.add(group_to_reader[node])
+            elif mc.attributeQuery("dataParent", node=node, exists=True):
+                data_nodes = mc.listConnections(f"{node}.dataParent", source=True, destination=False)
+                if data_nodes and data_nodes[0] in self.readers:
+                    selected_readers.add(data_nodes[0])
+        self.selected_readers = selected_readers
+        # force the next refresh to redraw
+        self.last_update = 0.0
+
+    def get_text(self):
+        now = time.perf_counter()
+        if now - self.last_update < self.interval:
+            return self.cached_text
+        self.last_update = now
+
+        entries = []
+        for data_node, (group, plugs) in self.readers.items():
+            try:
+                cone_reading, min_reading, max_reading = [plug.asFloat() for plug in plugs]
+            except RuntimeError:
+                # the group was deleted since the last selection change
+                continue
+            marker = "*" if data_node in self.selected_readers else ""
+            entries.append(f"{marker}{data_node}: {cone_reading:.3f} ({min_reading:.1f}/{max_reading:.1f})")
+
+        self.cached_text = "    ".join(entries) if entries else "No cone readers"
+        return self.cached_text
+
+    def register(self):
+        self.refresh_readers()
+        self.selection_changed_callback(None)
+        if self.callback_id is None:
+            self.callback_id = cbr.register_callback(
+                lambda callback: om.MEventMessage.addEventCallback("SelectionChanged", callback),
+                self.selection_changed_callback, name="ConeReaderDashboard.selection_changed", persistent=True)
+
+        if mc.headsUpDisplay(DASHBOARD_HUD, exists=True):
+            mc.headsUpDisplay(DASHBOARD_HUD, remove=True)
+        mc.headsUpDisplay(DASHBOARD_HUD, section=1, block=mc.headsUpDisplay(nextFreeBlock=1), blockSize='medium',
+                          label='ConeReaders', labelFontSize='large', command=self.get_text, attachToRefresh=True)
+
+    def deregister(self):
+        if self.callback_id is not None:
+            cbr.remove_callback(self.callback_id)
+            self.callback_id = None
+        if mc.headsUpDisplay(DASHBOARD_HUD, exists=True):
+            mc.headsUpDisplay(DASHBOARD_HUD, remove=True)
+
+
+_dashboard = None
+
+
+def create_dashboard(max_rate=30.0):
+    """
+    show the readings of all cone readers in one HUD element
+
+    Args:
+        max_rate(float) : maximum number of times per second the readings are re-read
+
+    Returns:
+        the ConeReaderDashboard
+    """
+    global _dashboard
+    delete_dashboard()
+    _dashboard = ConeReaderDashboard(max_rate=max_rate)
+    _dashboard.register()
+    return _dashboard
+
+
+def delete_dashboard():
+    global _dashboard
+    if _dashboard is not None:
+        _dashboard.deregister()
+        _dashboard = None
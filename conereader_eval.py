@@ -0,0 +1,227 @@
+import numpy as np
+
+"""
+Maya-free evaluation of the cone reader network built by conereader.create_conereader.
+
+Every function takes arrays with a leading frame axis, so a whole take is evaluated in one call:
+
+    live = conereader_eval.live_vectors_from_rotations(rotations)
+    reading, min_reading, max_reading = conereader_eval.evaluate_cone_reading(live, min_angle=20, max_angle=80)
+"""
+
+# rest position of the center locator, see conereader.create_conereader
+CENTER_VECTOR = (0.0, 2.0, 0.0)
+# radius of the cone of a locator on the y axis, a needle instead of a division by zero
+MIN_CONE_RADIUS = 1e-4
+
+
+def angle_between(vectors1, vectors2, degrees=True):
+    """
+    vectorized equivalent of the angleBetween node
+
+    Args:
+        vectors1 (array_like): (N, 3) or (3,) vectors, angleBetween.vector1
+        vectors2 (array_like): (N, 3) or (3,) vectors, angleBetween.vector2
+        degrees (bool): output in degrees (the value the network sees through its unit conversion) or radians
+
+    Returns:
+        (N,) array of angles
+    """
+    vectors1 = np.asarray(vectors1, dtype=np.float64)
+    vectors2 = np.asarray(vectors2, dtype=np.float64)
+    cross = np.cross(vectors1, vectors2)
+    dot = np.sum(vectors1 * vectors2, axis=-1)
+    # atan2 keeps precision for nearly parallel vectors where acos(dot) would not
+    angles = np.arctan2(np.linalg.norm(cross, axis=-1), dot)
+    if degrees:
+        angles = np.degrees(angles)
+    return angles
+
+
+def locator_position(angle, center=CENTER_VECTOR, axis="z"):
+    """
+    position of a cone reader locator rotated around the origin, as placed by create_conereader (about Z)
+    or conereader_builder (about Z or X)
+
+    Args:
+        angle (float or array_like): rotation in degrees
+        center (sequence): rest position of the center locator
+        axis (str): "z" or "x"
+
+    Returns:
+        (3,) or (N, 3) array of positions
+    """
+    angle = np.radians(np.asarray(angle, dtype=np.float64))
+    cos, sin = np.cos(angle), np.sin(angle)
+    x, y, z = center
+    if axis == "z":
+        return np.stack([x * cos - y * sin, x * sin + y * cos, np.broadcast_to(z, np.shape(angle))], axis=-1)
+    elif axis == "x":
+        return np.stack([np.broadcast_to(x, np.shape(angle)), y * cos - z * sin, y * sin + z * cos], axis=-1)
+    raise ValueError(f"Invalid cone reader axis: {axis}")
+
+
+def cone_dimensions(positions, min_radius=MIN_CONE_RADIUS):
+    """
+    radius and height ratio of the cone drawn through a min or max locator, the cone axis is Y
+
+    the radius is the distance from the Y axis, so locators rotated about Z or X draw the same cone
+
+    Args:
+        positions (array_like): (3,) or (N, 3) locator positions
+        min_radius (float): radius of locators on the Y axis
+
+    Returns:
+        (radius, height ratio, side), side is -1 for locators below the XZ plane and 1 otherwise
+    """
+    positions = np.asarray(positions, dtype=np.float64)
+    radius = np.maximum(np.hypot(positions[..., 0], positions[..., 2]), min_radius)
+    height = np.abs(positions[..., 1])
+    side = np.where(positions[..., 1] < 0.0, -1.0, 1.0)
+    return radius, height / radius, side
+
+
+def rotation_matrices(rotations, rotate_order="xyz"):
+    """
+    build rotation matrices from euler rotations in Maya's row-vector convention (v' = v * M)
+
+    Args:
+        rotations (array_like): (N, 3) euler rotations in degrees
+        rotate_order (str): Maya rotate order, e.g. "xyz" or "zxy"
+
+    Returns:
+        (N, 3, 3) array of rotation matrices
+    """
+    rotations = np.radians(np.atleast_2d(np.asarray(rotations, dtype=np.float64)))
+    cos, sin = np.cos(rotations), np.sin(rotations)
+    count = rotations.shape[0]
+
+    axis_matrices = {}
+    for index, axis in enumerate("xyz"):
+        matrix = np.zeros((count, 3, 3))
+        c, s = cos[:, index], sin[:, index]
+        i, j = [k for k in range(3) if k != index]
+        matrix[:, index, index] = 1.0
+        matrix[:, i, i] = c
+        matrix[:, j, j] = c
+        # row-vector convention, signs follow MEulerRotation.asMatrix
+        if axis == "y":
+            matrix[:, i, j] = -s
+            matrix[:, j, i] = s
+        else:
+            matrix[:, i, j] = s
+            matrix[:, j, i] = -s
+        axis_matrices[axis] = matrix
+
+    result = axis_matrices[rotate_order[0]]
+    for axis in rotate_order[1:]:
+        result = result @ axis_matrices[axis]
+    return result
+
+
+def live_vectors_from_rotations(rotations, rotate_order="xyz", center=CENTER_VECTOR):
+    """
+    live locator positions for a joint rotating the center vector
+
+    Args:
+        rotations (array_like): (N, 3) joint rotations in degrees
+        rotate_order (str): Maya rotate order of the joint
+        center (sequence): rest position of the center locator
+
+    Returns:
+        (N, 3) array of live vectors
+    """
+    matrices = rotation_matrices(rotations, rotate_order=rotate_order)
+    return np.einsum("j,njk->nk", np.asarray(center, dtype=np.float64), matrices)
+
+
+def cone_reading_from_angles(live_angle, min_angle, max_angle):
+    """
+    reproduce the condition/plusMinusAverage/multiplyDivide chain of the cone reader on angles
+
+    Args:
+        live_angle (array_like): angle between live and center vectors
+        min_angle (array_like): angle between min and center vectors
+        max_angle (array_like): angle between max and center vectors
+
+    Returns:
+        array of cone readings broadcast over the inputs
+    """
+    live_angle, min_angle, max_angle = np.broadcast_arrays(np.asarray(live_angle, dtype=np.float64),
+                                                           np.asarray(min_angle, dtype=np.float64),
+                                                           np.asarray(max_angle, dtype=np.float64))
+    live_min_diff = live_angle - min_angle
+    max_min_diff = max_angle - min_angle
+
+    # multiplyDivide "weight"; the degenerate range is masked out below
+    weight = np.divide(live_min_diff, max_min_diff, out=np.zeros_like(live_min_diff), where=max_min_diff != 0)
+
+    # condition_less_than_min outputs 1 when live < min, or else the live angle itself,
+    # and if_less_than_min tests that value for equality with 1
+    less_than_min = np.where(live_angle < min_angle, 1.0, live_angle)
+    less_than_min_flag = np.where(less_than_min == 1.0, 0.0, 1.0)
+
+    # condition_more_than_max: weight while live <= max, or else 1
+    more_than_max = np.where(live_angle <= max_angle, weight, 1.0)
+
+    reverse = 1.0 - more_than_max * less_than_min_flag
+
+    # max_min_diff_conditional invalidates the reading when min angle >= max angle
+    mask = np.where(max_min_diff <= 0.0, 0.0, 1.0)
+    return reverse * mask
+
+
+def evaluate_cone_reading(live_vectors, center_vector=CENTER_VECTOR, min_vector=None, max_vector=None,
+                          min_angle=None, max_angle=None, degrees=True):
+    """
+    evaluate coneReading, minAngleReading and maxAngleReading for every frame
+
+    min/max can be passed either as vectors (the translate of the min/max locators, static or per frame)
+    or as the angles the reader was set up with.
+
+    Args:
+        live_vectors (array_like): (N, 3) live locator translates
+        center_vector (array_like): (3,) or (N, 3) center locator translate
+        min_vector (array_like): (3,) or (N, 3) min locator translate
+        max_vector (array_like): (3,) or (N, 3) max locator translate
+        min_angle (float): setup angle of the min locator, used when min_vector is None
+        max_angle (float): setup angle of the max locator, used when max_vector is None
+        degrees (bool): angle readings in degrees or radians
+
+    Returns:
+        tuple of (N,) arrays: coneReading, minAngleReading, maxAngleReading
+    """
+    if min_vector is None:
+        if min_angle is None:
+            raise ValueError("Either min_vector or min_angle is required")
+        min_vector = locator_position(min_angle, center=center_vector)
+    if max_vector is None:
+        if max_angle is None:
+            raise ValueError("Either max_vector or max_angle is required")
+        max_vector = locator_position(max_angle, center=center_vector)
+
+    live_vectors = np.atleast_2d(np.asarray(live_vectors, dtype=np.float64))
+    live_reading = angle_between(live_vectors, center_vector, degrees=degrees)
+    min_reading = np.broadcast_to(angle_between(min_vector, center_vector, degrees=degrees), live_reading.shape)
+    max_reading = np.broadcast_to(angle_between(max_vector, center_vector, degrees=degrees), live_reading.shape)
+
+    cone_reading = cone_reading_from_angles(live_reading, min_reading, max_reading)
+    return cone_reading, np.array(min_reading), np.array(max_reading)
+
+
+def evaluate_from_rotations(rotations, min_angle, max_angle, rotate_order="xyz", center=CENTER_VECTOR):
+    """
+    evaluate a cone reader driven by joint rotations, e.g. a whole mocap take
+
+    Args:
+        rotations (array_like): (N, 3) joint rotations in degrees
+        min_angle (float): angle that the minimum cone accept
+        max_angle (float): angle that the maximum cone accept
+        rotate_order (str): Maya rotate order of the joint
+        center (sequence): rest position of the center locator
+
+    Returns:
+        tuple of (N,) arrays: coneReading, minAngleReading, maxAngleReading
+    """
+    live_vectors = live_vectors_from_rotations(rotations, rotate_order=rotate_order, center=center)
+    return evaluate_cone_reading(live_vectors, center_vector=center, min_angle=min_angle, max_angle=max_angle)
@@ -0,0 +1,176 @@
+import math
+import maya.api.OpenMaya as om
+
+"""
+coneReader DG node replacing the angleBetween/plusMinusAverage/condition/multiplyDivide network
+built by conereader.create_conereader
+
+load with:
+    mc.loadPlugin("path/to/conereader_node.py")
+
+the node works in two modes:
+    vector mode (useMatrix off): live/center/min/max vectors, usually the translates of the cone reader locators
+    matrix mode (useMatrix on): the center vector rotated by inputMatrix is the live vector,
+                                min/max vectors are placed from minAngle/maxAngle like create_conereader does
+"""
+
+
+def maya_useNewAPI():
+    pass
+
+
+def cone_reading(live_angle, min_angle, max_angle):
+    """
+    scalar version of conereader_eval.cone_reading_from_angles, kept free of numpy for per-evaluation cost
+
+    Args:
+        live_angle (float): angle between live and center vectors
+        min_angle (float): angle between min and center vectors
+        max_angle (float): angle between max and center vectors
+
+    Returns:
+        the cone reading
+    """
+    max_min_diff = max_angle - min_angle
+    # max_min_diff_conditional invalidates the reading
+    if max_min_diff <= 0.0:
+        return 0.0
+
+    weight = (live_angle - min_angle) / max_min_diff
+
+    less_than_min = 1.0 if live_angle < min_angle else live_angle
+    less_than_min_flag = 0.0 if less_than_min == 1.0 else 1.0
+
+    more_than_max = weight if live_angle <= max_angle else 1.0
+
+    return 1.0 - more_than_max * less_than_min_flag
+
+
+def rotate_about_z(vector, angle):
+    radians = math.radians(angle)
+    cos, sin = math.cos(radians), math.sin(radians)
+    return om.MVector(vector.x * cos - vector.y * sin, vector.x * sin + vector.y * cos, vector.z)
+
+
+class ConeReaderNode(om.MPxNode):
+
+    kNodeName = "coneReader"
+    # id from the range reserved for local development
+    kNodeId = om.MTypeId(0x0007F100)
+
+    useMatrix = None
+    liveVector = None
+    centerVector = None
+    minVector = None
+    maxVector = None
+    inputMatrix = None
+    minAngle = None
+    maxAngle = None
+
+    coneReading = None
+    minAngleReading = None
+    maxAngleReading = None
+
+    def __init__(self):
+        om.MPxNode.__init__(self)
+
+    @classmethod
+    def creator(cls):
+        return cls()
+
+    @classmethod
+    def initialize(cls):
+        numeric_attr = om.MFnNumericAttribute()
+        matrix_attr = om.MFnMatrixAttribute()
+
+        cls.useMatrix = numeric_attr.create("useMatrix", "um", om.MFnNumericData.kBoolean, False)
+        numeric_attr.keyable = True
+
+        cls.liveVector = numeric_attr.createPoint("liveVector", "lv")
+        numeric_attr.keyable = True
+        cls.centerVector = numeric_attr.createPoint("centerVector", "cv")
+        numeric_attr.keyable = True
+        numeric_attr.default = (0.0, 2.0, 0.0)
+        cls.minVector = numeric_attr.createPoint("minVector", "mnv")
+        numeric_attr.keyable = True
+        cls.maxVector = numeric_attr.createPoint("maxVector", "mxv")
+        numeric_attr.keyable = True
+
+        cls.inputMatrix = matrix_attr.create("inputMatrix", "im", om.MFnMatrixAttribute.kDouble)
+        cls.minAngle = numeric_attr.create("minAngle", "mna", om.MFnNumericData.kDouble, 0.0)
+        numeric_attr.keyable = True
+        cls.maxAngle = numeric_attr.create("maxAngle", "mxa", om.MFnNumericData.kDouble, 90.0)
+        numeric_attr.keyable = True
+
+        cls.coneReading = numeric_attr.create("coneReading", "cr", om.MFnNumericData.kFloat, 0.0)
+        numeric_attr.writable = False
+        numeric_attr.storable = False
+        cls.minAngleReading = numeric_attr.create("minAngleReading", "mnr", om.MFnNumericData.kFloat, 0.0)
+        numeric_attr.writable = False
+        numeric_attr.storable = False
+        cls.maxAngleReading = numeric_attr.create("maxAngleReading", "mxr", om.MFnNumericData.kFloat, 0.0)
+        numeric_attr.writable = False
+        numeric_attr.storable = False
+
+        inputs = [cls.useMatrix, cls.liveVector, cls.centerVector, cls.minVector, cls.maxVector,
+                  cls.inputMatrix, cls.minAngle, cls.maxAngle]
+        outputs = [cls.coneReading, cls.minAngleReading, cls.maxAngleReading]
+
+        for attr in inputs + outputs:
+            cls.addAttribute(attr)
+
+        for input_attr in inputs:
+            for output_attr in outputs:
+                cls.attributeAffects(input_attr, output_attr)
+
+    def compute(self, plug, data_block):
+        if plug.isChild:
+            plug = plug.parent()
+        if plug not in (ConeReaderNode.coneReading, ConeReaderNode.minAngleReading, ConeReaderNode.maxAngleReading):
+            return None
+
+        center = om.MVector(data_block.inputValue(ConeReaderNode.centerVector).asFloat3())
+
+        if data_block.inputValue(ConeReaderNode.useMatrix).asBool():
+            matrix = data_block.inputValue(ConeReaderNode.inputMatrix).asMatrix()
+            # rotate only, the translation of the joint does not move the reading
+            live = center * om.MTransformationMatrix(matrix).asRotateMatrix()
+            min_vector = rotate_about_z(center, data_block.inputValue(ConeReaderNode.minAngle).asDouble())
+            max_vector = rotate_about_z(center, data_block.inputValue(ConeReaderNode.maxAngle).asDouble())
+        else:
+            live = om.MVector(data_block.inputValue(ConeReaderNode.liveVector).asFloat3())
+            min_vector = om.MVector(data_block.inputValue(ConeReaderNode.minVector).asFloat3())
+            max_vector = om.MVector(data_block.inputValue(ConeReaderNode.maxVector).asFloat3())
+
+        live_angle = math.degrees(live.angle(center))
+        min_angle = math.degrees(min_vector.angle(center))
+        max_angle = math.degrees(max_vector.angle(center))
+
+        reading = cone_reading(live_angle, min_angle, max_angle)
+
+        data_block.outputValue(ConeReaderNode.coneReading).setFloat(reading)
+        data_block.outputValue(ConeReaderNode.minAngleReading).setFloat(min_angle)
+        data_block.outputValue(ConeReaderNode.maxAngleReading).setFloat(max_angle)
+
+        data_block.setClean(ConeReaderNode.coneReading)
+        data_block.setClean(ConeReaderNode.minAngleReading)
+        data_block.setClean(ConeReaderNode.maxAngleReading)
+
+
+def initializePlugin(plugin):
+    plugin_fn = om.MFnPlugin(plugin, "Character-Rig", "1.0")
+    try:
+        plugin_fn.registerNode(ConeReaderNode.kNodeName, ConeReaderNode.kNodeId,
+                               ConeReaderNode.creator, ConeReaderNode.initialize)
+    except:
+        om.MGlobal.displayError(f"Failed to register node: {ConeReaderNode.kNodeName}")
+        raise
+
+
+def uninitializePlugin(plugin):
+    plugin_fn = om.MFnPlugin(plugin)
+    try:
+        plugin_fn.deregisterNode(ConeReaderNode.kNodeId)
+    except:
+        om.MGlobal.displayError(f"Failed to deregister node: {ConeReaderNode.kNodeName}")
+        raise
@@ -0,0 +1,270 @@
+import numpy as np
+import maya.api.OpenMaya as om
+import maya.cmds as mc
+import maya.mel as mel
+import control_shapes as cs
+import modifier_undo as mu
+
+"""
+library of control curve shapes
+
+a shape is stored as its CVs, knots, degree and form. Many shapes are packed column wise in one .npz file:
+    names, owners, degrees, forms      one entry per shape
+    cvs, knots                         every shape concatenated
+    cv_offsets, knot_offsets           where each shape starts in cvs/knots
+
+prototypes are built once per session (from a library file or a single createControlShapes call)
+and every new control stamps its curves from the cached data with MFnNurbsCurve.create, through CurveEdits
+so the new shapes and the rewritten CVs are undoable
+
+usage:
+    import control_shape_library as csl
+    csl.export_rig_shapes("D:/rig/shapes.npz")
+    csl.apply_rig_shapes("D:/rig/shapes.npz")
+"""
+
+# prototype name -> list of curve data dict
+_prototypes = {}
+
+
+def get_curve_data(shape):
+    mfn_curve = om.MFnNurbsCurve(cs.get_dag_path(shape))
+    return {"cvs": cs.points_to_array(mfn_curve.cvPositions(om.MSpace.kObject)),
+            "knots": np.array(list(mfn_curve.knots()), dtype=np.float64),
+            "degree": mfn_curve.degree,
+            "form": mfn_curve.form}
+
+
+def create_curve(data, parent):
+    """
+    create a curve from curve data, not undoable, see CurveEdits
+
+    Args:
+        data (dict): cvs, knots, degree and form
+        parent (MObject): transform the shape is created under, or nurbsCurve data
+
+    Returns:
+        MObject of the new shape
+    """
+    return om.MFnNurbsCurve().create(cs.array_to_points(data["cvs"]), om.MDoubleArray(data["knots"].tolist()),
+                                     int(data["degree"]), int(data["form"]), False, True, parent)
+
+
+class CurveEdits(object):
+    '''
+    curve shapes created, deleted and rewritten through modifier_undo like a modifier
+
+    the shapes are created on the first doIt and deleted by a modifier on undo, redo undoes that modifier
+    so the shapes keep their MObject (and the renames done after them stay valid)
+    '''
+
+    def __init__(self):
+        # (curve data, parent MObject, name)
+        self.curves = []
+        self.created = None
+        self.remove_modifier = None
+        self.delete_modifier = om.MDagModifier()
+        self.shape_points = cs.ShapePoints()
+
+    def create(self, data, parent, name=None):
+        self.curves.append((data, parent, name))
+
+    def delete(self, shape):
+        self.delete_modifier.deleteNode(cs.get_dag_path(shape).node(), False)
+
+    def set_cvs(self, shape, cvs):
+        self.shape_points.add(shape, cvs)
+
+    def doIt(self):
+        self.delete_modifier.doIt()
+        self.shape_points.doIt()
+        if self.created is None:
+            self.created = []
+            for data, parent, name in self.curves:
+                shape_object = create_curve(data, parent)
+                if name:
+                    om.MFnDagNode(shape_object).setName(name)
+                self.created.append(shape_object)
+        else:
+            self.remove_modifier.undoIt()
+
+    def undoIt(self):
+        if self.created:
+            if self.remove_modifier is None:
+                self.remove_modifier = om.MDagModifier()
+                for shape_object in self.created:
+                    self.remove_modifier.deleteNode(shape_object, False)
+            self.remove_modifier.doIt()
+        self.shape_points.undoIt()
+        self.delete_modifier.undoIt()
+
+
+def get_prototype(shape_name):
+    """
+    curve data of a prototype shape, built from createControlShapes the first time it is asked for
+
+    Args:
+        shape_name (str): shape name known by createControlShapes, or loaded from a library file
+
+    Returns:
+        list of curve data dict
+    """
+    if shape_name not in _prototypes:
+        control = mel.eval('createControlShapes("' + shape_name + '");')
+        shapes = mc.listRelatives(control, shapes=True, type="nurbsCurve", path=True) or []
+        _prototypes[shape_name] = [get_curve_data(shape) for shape in shapes]
+        mc.delete(control)
+    return _prototypes[shape_name]
+
+
+def clear_prototypes():
+    _prototypes.clear()
+
+
+def create_shapes(shape_name, parent):
+    """
+    stamp the curves of a prototype under a transform
+
+    Args:
+        shape_name (str): prototype name
+        parent (str): transform receiving the shapes
+
+    Returns:
+        list of the new shape names
+    """
+    parent_object = cs.get_dag_path(parent).node()
+    curve_edits = CurveEdits()
+    for data in get_prototype(shape_name):
+        curve_edits.create(data, parent_object)
+    mu.apply_modifier(curve_edits)
+    return [om.MFnDagNode(shape_object).partialPathName() for shape_object in curve_edits.created]
+
+
+def pack_shapes(names, owners, curve_data):
+    cv_counts = [len(data["cvs"]) for data in curve_data]
+    knot_counts = [len(data["knots"]) for data in curve_data]
+    return {"names": np.array(names, dtype=str),
+            "owners": np.array(owners, dtype=str),
+            "degrees": np.array([data["degree"] for data in curve_data], dtype=np.int32),
+            "forms": np.array([data["form"] for data in curve_data], dtype=np.int32),
+            "cvs": np.concatenate([data["cvs"] for data in curve_data]) if curve_data else np.zeros((0, 3)),
+            "knots": np.concatenate([data["knots"] for data in curve_data]) if curve_data else np.zeros(0),
+            "cv_offsets": np.concatenate([[0], np.cumsum(cv_counts)]).astype(np.int64),
+            "knot_offsets": np.concatenate([[0], np.cumsum(knot_counts)]).astype(np.int64)}
+
+
+def unpack_shapes(packed):
+    shapes = []
+    for index, name in enumerate(packed["names"]):
+        cv_start, cv_end = packed["cv_offsets"][index], packed["cv_offsets"][index + 1]
+        knot_start, knot_end = packed["knot_offsets"][index], packed["knot_offsets"][index + 1]
+        shapes.append((str(name), str(packed["owners"][index]),
+                       {"cvs": packed["cvs"][cv_start:cv_end],
+                        "knots": packed["knots"][knot_start:knot_end],
+                        "degree": int(packed["degrees"][index]),
+                        "form": int(packed["forms"][index])}))
+    return shapes
+
+
+def save_library(filepath, shape_names=None):
+    """
+    save prototypes to a library file
+
+    Args:
+        filepath (str): .npz path
+        shape_names (list): prototypes to save, all cached ones if None
+    """
+    if shape_names is None:
+        shape_names = list(_prototypes.keys())
+    names, owners, curve_data = [], [], []
+    for shape_name in shape_names:
+        for data in get_prototype(shape_name):
+            names.append(shape_name)
+            owners.append("")
+            curve_data.append(data)
+    np.savez_compressed(filepath, **pack_shapes(names, owners, curve_data))
+
+
+def load_library(filepath):
+    """
+    load prototypes from a library file into the session cache
+
+    Returns:
+        list of the loaded prototype names
+    """
+    with np.load(filepath) as packed:
+        shapes = unpack_shapes(packed)
+    loaded = {}
+    for name, owner, data in shapes:
+        loaded.setdefault(name, []).append(data)
+    _prototypes.update(loaded)
+    return list(loaded.keys())
+
+
+def get_control_transforms():
+    curves = mc.ls(type="nurbsCurve", noIntermediate=True, long=True) or []
+    controls = mc.listRelatives(curves, parent=True, path=True) or []
+    return sorted({control for control in controls if "Control" in control})
+
+
+def export_rig_shapes(filepath, controls=None):
+    """
+    export the curve shapes of every control in one file
+
+    Args:
+        filepath (str): .npz path
+        controls (list): controls to export, every transform with "Control" in its name and a curve shape if None
+
+    Returns:
+        number of exported shapes
+    """
+    if controls is None:
+        controls = get_control_transforms()
+
+    names, owners, curve_data = [], [], []
+    for control in controls:
+        for shape in mc.listRelatives(control, shapes=True, type="nurbsCurve", path=True, noIntermediate=True) or []:
+            names.append(shape.split("|")[-1])
+            owners.append(control)
+            curve_data.append(get_curve_data(shape))
+
+    np.savez_compressed(filepath, **pack_shapes(names, owners, curve_data))
+    print(f"{len(names)} control shapes exported to {filepath} successfully")
+    return len(names)
+
+
+def apply_rig_shapes(filepath):
+    """
+    reapply exported control shapes, CVs are written in place when the topology matches,
+    otherwise the shape is rebuilt from the stored data
+
+    Returns:
+        report dict with "updated", "rebuilt" and "missing" shapes
+    """
+    with np.load(filepath) as packed:
+        shapes = unpack_shapes(packed)
+
+    report = {"updated": [], "rebuilt": [], "missing": []}
+    # every shape in one undo step
+    curve_edits = CurveEdits()
+    for name, owner, data in shapes:
+        if not mc.ls(owner):
+            report["missing"].append(name)
+            continue
+        existing = [shape for shape in mc.listRelatives(owner, shapes=True, type="nurbsCurve", path=True) or []
+                    if shape.split("|")[-1] == name]
+        if existing:
+            mfn_curve = om.MFnNurbsCurve(cs.get_dag_path(existing[0]))
+            if (mfn_curve.numCVs, mfn_curve.degree, mfn_curve.form, mfn_curve.numKnots) == \
+                    (len(data["cvs"]), data["degree"], data["form"], len(data["knots"])):
+                curve_edits.set_cvs(existing[0], data["cvs"])
+                report["updated"].append(name)
+                continue
+            curve_edits.delete(existing[0])
+
+        curve_edits.create(data, cs.get_dag_path(owner).node(), name)
+        report["rebuilt"].append(name)
+
+    if report["updated"] or report["rebuilt"]:
+        mu.apply_modifier(curve_edits)
+    return report
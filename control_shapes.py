@@ -0,0 +1,457 @@
+import numpy as np
+import maya.api.OpenMaya as om
+import maya.cmds as mc
+import modifier_undo as mu
+
+"""
+array based editing of control shapes
+
+the CVs of a shape are read in one call (MFnNurbsCurve.cvPositions), edited as a NumPy array
+and written back in one call (setCVPositions), instead of a pointPosition/xform pair per CV
+
+the writes go through ShapePoints and modifier_undo so every edit is undoable
+"""
+
+MIRROR_PLANES = {"YZ": (1.0, 0.0, 0.0), "XZ": (0.0, 1.0, 0.0), "XY": (0.0, 0.0, 1.0)}
+# knot values closer than this are the same parameterization
+KNOT_TOLERANCE = 1e-6
+
+
+def get_dag_path(node):
+    selection_list = om.MSelectionList()
+    selection_list.add(node)
+    return selection_list.getDagPath(0)
+
+
+def points_to_array(points):
+    return np.array([(point.x, point.y, point.z) for point in points], dtype=np.float64).reshape(-1, 3)
+
+
+def array_to_points(array):
+    return om.MPointArray([om.MPoint(x, y, z) for x, y, z in array])
+
+
+def get_plane_normal(plane):
+    if isinstance(plane, str):
+        if plane.upper() not in MIRROR_PLANES:
+            raise ValueError(f"Invalid mirror plane: {plane}")
+        return np.array(MIRROR_PLANES[plane.upper()])
+    normal = np.asarray(plane, dtype=np.float64)
+    return normal / np.linalg.norm(normal)
+
+
+def mirror_points(points, plane="YZ", origin=(0.0, 0.0, 0.0)):
+    """
+    reflect points across a plane
+
+    Args:
+        points (array_like): (N, 3) points
+        plane (str or sequence): "YZ", "XZ", "XY" or the plane normal
+        origin (sequence): a point on the plane
+
+    Returns:
+        (N, 3) array of mirrored points
+    """
+    points = np.asarray(points, dtype=np.float64)
+    normal = get_plane_normal(plane)
+    distances = (points - np.asarray(origin, dtype=np.float64)) @ normal
+    return points - 2.0 * distances[:, None] * normal
+
+
+def read_points(dag_path, space=om.MSpace.kObject):
+    if dag_path.hasFn(om.MFn.kNurbsCurve):
+        return om.MFnNurbsCurve(dag_path).cvPositions(space)
+    elif dag_path.hasFn(om.MFn.kNurbsSurface):
+        return om.MFnNurbsSurface(dag_path).cvPositions(space)
+    elif dag_path.hasFn(om.MFn.kMesh):
+        return om.MFnMesh(dag_path).getPoints(space)
+    else:
+        raise TypeError(f"Unsupported shape type: {dag_path.partialPathName()}")
+
+
+def write_points(dag_path, point_array, space=om.MSpace.kObject):
+    if dag_path.hasFn(om.MFn.kNurbsCurve):
+        mfn_curve = om.MFnNurbsCurve(dag_path)
+        mfn_curve.setCVPositions(point_array, space)
+        mfn_curve.updateCurve()
+    elif dag_path.hasFn(om.MFn.kNurbsSurface):
+        mfn_surface = om.MFnNurbsSurface(dag_path)
+        mfn_surface.setCVPositions(point_array, space)
+        mfn_surface.updateSurface()
+    elif dag_path.hasFn(om.MFn.kMesh):
+        om.MFnMesh(dag_path).setPoints(point_array, space)
+    else:
+        raise TypeError(f"Unsupported shape type: {dag_path.partialPathName()}")
+
+
+class ShapePoints(object):
+    '''
+    point writes run through modifier_undo like a modifier, the old points are read when an edit is added
+    and written back on undo
+    '''
+
+    def __init__(self):
+        # (MDagPath, old MPointArray, new MPointArray, MSpace)
+        self.edits = []
+
+    def __len__(self):
+        return len(self.edits)
+
+    def add(self, shape, points, space=om.MSpace.kObject):
+        dag_path = shape if isinstance(shape, om.MDagPath) else get_dag_path(shape)
+        self.edits.append((dag_path, read_points(dag_path, space),
+                           array_to_points(np.asarray(points).reshape(-1, 3)), space))
+
+    def doIt(self):
+        for dag_path, old_points, new_points, space in self.edits:
+            write_points(dag_path, new_points, space)
+
+    def undoIt(self):
+        for dag_path, old_points, new_points, space in reversed(self.edits):
+            write_points(dag_path, old_points, space)
+
+
+def apply_points(shape_points):
+    # an empty edit would still be an undo step
+    if len(shape_points):
+        mu.apply_modifier(shape_points)
+    return shape_points
+
+
+def get_curve_cvs(shape, space=om.MSpace.kObject):
+    return points_to_array(om.MFnNurbsCurve(get_dag_path(shape)).cvPositions(space))
+
+
+def set_curve_cvs(shape, cvs, space=om.MSpace.kObject):
+    shape_points = ShapePoints()
+    shape_points.add(shape, cvs, space)
+    apply_points(shape_points)
+
+
+def get_curve_topology(mfn_curve):
+    return mfn_curve.numCVs, mfn_curve.degree, mfn_curve.form, mfn_curve.numKnots
+
+
+def knots_match(source, target, tolerance=KNOT_TOLERANCE):
+    """
+    same knot values within the tolerance, curves with the same knot count can still be parameterized differently
+    """
+    return np.allclose(np.array(list(source.knots())), np.array(list(target.knots())), rtol=0.0, atol=tolerance)
+
+
+def get_other_side_shape(shape, side, other_side):
+    other_shape = shape.replace(side, other_side)
+    if other_shape == shape or not mc.ls(other_shape):
+        return None
+    return mc.ls(other_shape)[0]
+
+
+def mirror_curve_shapes(controls=None, side="Left", plane="YZ", space="object"):
+    """
+    mirror the curve shapes of controls to their counterpart on the other side
+
+    every pair is checked first, shapes whose CV count, degree, form or knot values differ are reported
+    and left untouched instead of being mirrored halfway
+
+    Args:
+        controls (list): transforms to mirror from, the selection or every "<side>*Control*" if None
+        side (str): "Left" or "Right", the side mirrored from
+        plane (str or sequence): mirror plane, "YZ" flips X
+        space (str): "object" mirrors the local CVs like mirrorControlShapes did, "world" mirrors in world space
+
+    Returns:
+        report dict with "mirrored", "missing" and "mismatched" entries
+    """
+    other_side = "Right" if side == "Left" else "Left"
+    mspace = om.MSpace.kWorld if space == "world" else om.MSpace.kObject
+
+    if not controls:
+        controls = mc.ls(sl=True, type='transform')
+    if not controls:
+        controls = mc.ls(side + '*Control*', type='transform')
+
+    report = {"mirrored": [], "missing": [], "mismatched": []}
+    pairs = []
+    for control in controls:
+        shapes = mc.listRelatives(control, shapes=True, type="nurbsCurve", path=True) or []
+        for shape in shapes:
+            other_shape = get_other_side_shape(shape, side, other_side)
+            if not other_shape:
+                report["missing"].append(shape)
+                continue
+            source = om.MFnNurbsCurve(get_dag_path(shape))
+            target = om.MFnNurbsCurve(get_dag_path(other_shape))
+            source_topology = get_curve_topology(source)
+            target_topology = get_curve_topology(target)
+            if source_topology != target_topology:
+                report["mismatched"].append((shape, other_shape,
+                                             f"cvs/degree/form/knots {source_topology} != {target_topology}"))
+                continue
+            if not knots_match(source, target):
+                report["mismatched"].append((shape, other_shape, "knot values differ"))
+                continue
+            pairs.append((shape, other_shape, source, target))
+
+    # every pair in one undo step
+    shape_points = ShapePoints()
+    for shape, other_shape, source, target in pairs:
+        cvs = points_to_array(source.cvPositions(mspace))
+        shape_points.add(other_shape, mirror_points(cvs, plane), mspace)
+        report["mirrored"].append((shape, other_shape))
+    apply_points(shape_points)
+
+    return report
+
+
+def get_surface_cvs(shape, space=om.MSpace.kObject):
+    """
+    Returns:
+        (numCVsInU, numCVsInV, 3) array of the CVs of a NURBS surface
+    """
+    mfn_surface = om.MFnNurbsSurface(get_dag_path(shape))
+    cvs = points_to_array(mfn_surface.cvPositions(space))
+    # cvPositions is ordered U major
+    return cvs.reshape(mfn_surface.numCVsInU, mfn_surface.numCVsInV, 3)
+
+
+def set_surface_cvs(shape, cvs, space=om.MSpace.kObject, shape_points=None):
+    """
+    write a (U, V, 3) CV grid, added to shape_points when given and applied by the caller
+    """
+    if shape_points is not None:
+        shape_points.add(shape, cvs, space)
+        return
+    shape_points = ShapePoints()
+    shape_points.add(shape, cvs, space)
+    apply_points(shape_points)
+
+
+def get_surface_topology(mfn_surface):
+    return (mfn_surface.numCVsInU, mfn_surface.numCVsInV, mfn_surface.degreeInU, mfn_surface.degreeInV,
+            mfn_surface.formInU, mfn_surface.formInV)
+
+
+def mirror_surface_grid(cvs, plane="YZ", reverse="u"):
+    """
+    mirror a (U, V, 3) CV grid across a plane and reverse it along U or V so the mirrored surface keeps
+    its orientation
+
+    Args:
+        cvs (array_like): (numCVsInU, numCVsInV, 3) CV grid
+        plane (str or sequence): mirror plane
+        reverse (str): "u", "v" or None
+
+    Returns:
+        mirrored (numCVsInU, numCVsInV, 3) array
+    """
+    cvs = np.asarray(cvs, dtype=np.float64)
+    mirrored = mirror_points(cvs.reshape(-1, 3), plane).reshape(cvs.shape)
+    if reverse == "u":
+        mirrored = mirrored[::-1, :]
+    elif reverse == "v":
+        mirrored = mirrored[:, ::-1]
+    return mirrored
+
+
+def mirror_surface_in_place(cvs, plane="YZ", reverse="u"):
+    """
+    make a symmetric CV grid by mirroring its first half onto its second half along U or V
+
+    Args:
+        cvs (array_like): (numCVsInU, numCVsInV, 3) CV grid
+        plane (str or sequence): mirror plane
+        reverse (str): "u" or "v", the direction the surface crosses the mirror plane
+
+    Returns:
+        (numCVsInU, numCVsInV, 3) array, an odd middle row is left as is
+    """
+    cvs = np.array(cvs, dtype=np.float64)
+    if reverse == "v":
+        return mirror_surface_in_place(cvs.transpose(1, 0, 2), plane, "u").transpose(1, 0, 2)
+    half = cvs.shape[0] // 2
+    mirrored = mirror_points(cvs[:half].reshape(-1, 3), plane).reshape(half, cvs.shape[1], 3)
+    cvs[cvs.shape[0] - half:] = mirrored[::-1]
+    return cvs
+
+
+def mirror_surface_shapes(surfaces=None, side="Left", plane="YZ", reverse="u", space="object"):
+    """
+    mirror NURBS surfaces to their counterpart on the other side, each in one get and one set call
+
+    Args:
+        surfaces (list): transforms to mirror from, the selection if None
+        side (str): "Left" or "Right", the side mirrored from
+        plane (str or sequence): mirror plane, "YZ" flips X
+        reverse (str): "u" or "v", direction reversed so the mirrored surface keeps its orientation
+        space (str): "object" or "world"
+
+    Returns:
+        report dict with "mirrored", "missing" and "mismatched" entries
+    """
+    other_side = "Right" if side == "Left" else "Left"
+    mspace = om.MSpace.kWorld if space == "world" else om.MSpace.kObject
+
+    if not surfaces:
+        surfaces = mc.ls(sl=True, type='transform')
+
+    report = {"mirrored": [], "missing": [], "mismatched": []}
+    pairs = []
+    for surface in surfaces:
+        shapes = mc.listRelatives(surface, shapes=True, type="nurbsSurface", path=True) or []
+        for shape in shapes:
+            other_shape = get_other_side_shape(shape, side, other_side)
+            if not other_shape:
+                report["missing"].append(shape)
+                continue
+            source_topology = get_surface_topology(om.MFnNurbsSurface(get_dag_path(shape)))
+            target_topology = get_surface_topology(om.MFnNurbsSurface(get_dag_path(other_shape)))
+            if source_topology != target_topology:
+                report["mismatched"].append((shape, other_shape,
+                                             f"cvs/degrees/forms {source_topology} != {target_topology}"))
+                continue
+            pairs.append((shape, other_shape))
+
+    shape_points = ShapePoints()
+    for shape, other_shape in pairs:
+        cvs = get_surface_cvs(shape, mspace)
+        set_surface_cvs(other_shape, mirror_surface_grid(cvs, plane, reverse), mspace, shape_points)
+        report["mirrored"].append((shape, other_shape))
+    apply_points(shape_points)
+
+    return report
+
+
+def mirror_surface_shapes_in_place(surfaces=None, plane="YZ", reverse="u", space="object"):
+    """
+    make NURBS surfaces symmetric by mirroring their first half along U (or V) onto the second half
+
+    Returns:
+        list of the mirrored surface shapes
+    """
+    mspace = om.MSpace.kWorld if space == "world" else om.MSpace.kObject
+
+    if not surfaces:
+        surfaces = mc.ls(sl=True, type='transform')
+
+    mirrored = []
+    shape_points = ShapePoints()
+    for surface in surfaces:
+        for shape in mc.listRelatives(surface, shapes=True, type="nurbsSurface", path=True) or []:
+            cvs = get_surface_cvs(shape, mspace)
+            set_surface_cvs(shape, mirror_surface_in_place(cvs, plane, reverse), mspace, shape_points)
+            mirrored.append(shape)
+    apply_points(shape_points)
+    return mirrored
+
+
+def get_shape_points(shape, space=om.MSpace.kObject):
+    """
+    read all points of a curve, surface or mesh shape in one call
+
+    Returns:
+        (N, 3) array of points
+    """
+    return points_to_array(read_points(get_dag_path(shape), space))
+
+
+def set_shape_points(shape, points, space=om.MSpace.kObject, shape_points=None):
+    """
+    write all points of a curve, surface or mesh shape, added to shape_points when given and applied by the caller
+    """
+    if shape_points is not None:
+        shape_points.add(shape, points, space)
+        return
+    shape_points = ShapePoints()
+    shape_points.add(shape, points, space)
+    apply_points(shape_points)
+
+
+def translation_matrix(translation):
+    matrix = np.identity(4)
+    matrix[3, :3] = translation
+    return matrix
+
+
+def compose_matrix(scale=1.0, rotate=(0.0, 0.0, 0.0), offset=(0.0, 0.0, 0.0), pivot=(0.0, 0.0, 0.0),
+                   scale_pivot=None):
+    """
+    4x4 matrix (row-vector convention, p' = p * M) scaling and rotating about a pivot then offsetting
+
+    Args:
+        scale (float or sequence): uniform or per axis scale
+        rotate (sequence): euler rotation in degrees, xyz order
+        offset (sequence): translation applied last
+        pivot (sequence): pivot of the rotation, and of the scale unless scale_pivot is given
+        scale_pivot (sequence): pivot of the scale
+
+    Returns:
+        (4, 4) array
+    """
+    scale = np.broadcast_to(np.asarray(scale, dtype=np.float64), (3,))
+    rotation = om.MEulerRotation(*[np.radians(value) for value in rotate]).asMatrix()
+    rotation = np.array(list(rotation), dtype=np.float64).reshape(4, 4)
+    pivot = np.asarray(pivot, dtype=np.float64)
+    scale_pivot = pivot if scale_pivot is None else np.asarray(scale_pivot, dtype=np.float64)
+
+    # scale about the scale pivot, then rotate about the pivot and offset
+    return (translation_matrix(-scale_pivot) @ np.diag(np.append(scale, 1.0)) @
+            translation_matrix(scale_pivot - pivot) @ rotation @
+            translation_matrix(pivot + np.asarray(offset, dtype=np.float64)))
+
+
+def transform_points(points, matrix):
+    points = np.asarray(points, dtype=np.float64)
+    return points @ matrix[:3, :3] + matrix[3, :3]
+
+
+def transform_control_shapes(controls=None, scale=1.0, rotate=(0.0, 0.0, 0.0), offset=(0.0, 0.0, 0.0),
+                             pivot="object"):
+    """
+    scale, rotate and offset the shapes of many controls without selecting their components
+
+    the points of each shape are edited in the control's own space, so the transform of the control is untouched
+
+    Args:
+        controls (list): transforms whose shapes are edited, the selection if None
+        scale (float or sequence): uniform or per axis scale
+        rotate (sequence): euler rotation in degrees
+        offset (sequence): translation in the control's space
+        pivot (str or sequence): "object" for the control's rotate and scale pivots, "center" for the center of
+                                 each shape's points, or a point in the control's space
+
+    Returns:
+        list of the edited shapes
+    """
+    if not controls:
+        controls = mc.ls(selection=True)
+    if isinstance(controls, str):
+        controls = [controls]
+
+    edited = []
+    fixed_matrix = None
+    if not isinstance(pivot, str):
+        fixed_matrix = compose_matrix(scale, rotate, offset, pivot)
+    elif pivot not in ("object", "center"):
+        raise ValueError(f"Invalid pivot: {pivot}")
+
+    shape_points = ShapePoints()
+    for control in controls:
+        control_matrix = fixed_matrix
+        if pivot == "object":
+            # the pivots are in the control's object space, the space the shape points are read in
+            control_matrix = compose_matrix(scale, rotate, offset, mc.getAttr(f"{control}.rotatePivot")[0],
+                                            mc.getAttr(f"{control}.scalePivot")[0])
+        shapes = mc.listRelatives(control, children=True, shapes=True, path=True, noIntermediate=True) or []
+        for shape in shapes:
+            if mc.nodeType(shape) not in ["nurbsCurve", "nurbsSurface", "mesh"]:
+                continue
+            points = get_shape_points(shape)
+            if control_matrix is None:
+                matrix = compose_matrix(scale, rotate, offset, (points.min(axis=0) + points.max(axis=0)) * 0.5)
+            else:
+                matrix = control_matrix
+            set_shape_points(shape, transform_points(points, matrix), shape_points=shape_points)
+            edited.append(shape)
+
+    apply_points(shape_points)
+    return edited
@@ -0,0 +1,232 @@
+import logging
+import numpy as np
+import maya.api.OpenMaya as om
+import maya.cmds as mc
+import callback_registry as cbr
+
+#initiate logging with module name
+logger = logging.getLogger(__name__)
+
+# enum values of the flags added by rigging_utils.addFlagsToControl
+CONTROL_TYPE_ATTRIBUTE = "controlType"
+CONTROL_LOCATION_ATTRIBUTE = "controlLocation"
+FACE_CONTROL_TYPE = 3
+LOCATIONS = ("Left", "Right", "Center")
+
+
+class FaceControlRegistry(object):
+    '''
+    registry of the flagged controls (controlType / controlLocation) with their flags as arrays
+
+    the registry is built once with a single ls call and kept current by callbacks:
+        attribute changed on every registered control, to follow the flags being set or removed
+        name changed on every registered control, the names are cached
+        transform added, the flags are added after creation so the node is checked on the next lookup
+        transform removed, to drop the control
+        scene new / open, to rebuild lazily on the next lookup
+    '''
+
+    def __init__(self):
+        # hash code -> [MObjectHandle, name, control type, control location], insertion ordered
+        self.controls = {}
+        # hash code -> list of callback ids
+        self.node_callbacks = {}
+        self.callback_ids = []
+        self.built = False
+        # handles of the transforms added since the last lookup
+        self.pending_nodes = []
+        # arrays of the last lookup, rebuilt when the controls change
+        self.arrays = None
+
+    def build(self):
+        self.clear()
+        nodes = mc.ls(f"*.{CONTROL_TYPE_ATTRIBUTE}", objectsOnly=True) or []
+        if nodes:
+            selection_list = om.MSelectionList()
+            for node in nodes:
+                selection_list.add(node)
+            for index in range(selection_list.length()):
+                self.add_node(selection_list.getDependNode(index))
+        self.built = True
+
+    def clear(self):
+        for callback_ids in self.node_callbacks.values():
+            for callback_id in callback_ids:
+                cbr.remove_callback(callback_id)
+        self.controls = {}
+        self.node_callbacks = {}
+        self.pending_nodes = []
+        self.arrays = None
+        self.built = False
+
+    def invalidate(self):
+        self.clear()
+
+    def add_node(self, node_mobject):
+        mfn_node = om.MFnDependencyNode(node_mobject)
+        if not mfn_node.hasAttribute(CONTROL_TYPE_ATTRIBUTE):
+            return
+        handle = om.MObjectHandle(node_mobject)
+        hash_code = handle.hashCode()
+        if hash_code not in self.node_callbacks:
+            self.node_callbacks[hash_code] = [
+                cbr.register_callback(
+                    lambda callback: om.MNodeMessage.addAttributeChangedCallback(node_mobject, callback),
+                    self.attribute_changed_callback, name="FaceControlRegistry.attribute_changed",
+                    node=node_mobject),
+                cbr.register_callback(
+                    lambda callback: om.MNodeMessage.addNameChangedCallback(node_mobject, callback),
+                    self.name_changed_callback, name="FaceControlRegistry.name_changed", node=node_mobject),
+            ]
+        name = om.MFnDagNode(node_mobject).partialPathName() if node_mobject.hasFn(om.MFn.kDagNode) \
+            else mfn_node.name()
+        self.controls[hash_code] = [handle, name, self.read_flag(mfn_node, CONTROL_TYPE_ATTRIBUTE),
+                                    self.read_flag(mfn_node, CONTROL_LOCATION_ATTRIBUTE)]
+        self.arrays = None
+
+    def remove_node(self, node_mobject):
+        hash_code = om.MObjectHandle(node_mobject).hashCode()
+        if self.controls.pop(hash_code, None) is not None:
+            self.arrays = None
+        for callback_id in self.node_callbacks.pop(hash_code, []):
+            cbr.remove_callback(callback_id)
+
+    @staticmethod
+    def read_flag(mfn_node, attr):
+        if not mfn_node.hasAttribute(attr):
+            return -1
+        return mfn_node.findPlug(attr, False).asShort()
+
+    def get_arrays(self):
+        """
+        Returns:
+            (names list, control types (N,) array, control locations (N,) array)
+        """
+        if not self.built:
+            self.build()
+        if self.pending_nodes:
+            for handle in self.pending_nodes:
+                if handle.isValid():
+                    self.add_node(handle.object())
+            self.pending_nodes = []
+        if self.arrays is None:
+            entries = [entry for entry in self.controls.values() if entry[0].isValid()]
+            self.arrays = ([entry[1] for entry in entries],
+                           np.array([entry[2] for entry in entries], dtype=np.int32),
+                           np.array([entry[3] for entry in entries], dtype=np.int32))
+        return self.arrays
+
+    def get_controls(self, control_type=FACE_CONTROL_TYPE, location=None):
+        """
+        get the controls of a type, optionally on one side
+        Args:
+            control_type (int): controlType value, 3 for face controls
+            location (str or int): "Left", "Right", "Center" or the controlLocation value
+
+        Returns:
+            list of control names
+        """
+        names, control_types, locations = self.get_arrays()
+        mask = control_types == control_type
+        if location is not None:
+            if isinstance(location, str):
+                location = LOCATIONS.index(location)
+            mask &= locations == location
+        return [names[index] for index in np.nonzero(mask)[0]]
+
+    def get_controls_with_locations(self, control_type=FACE_CONTROL_TYPE):
+        names, control_types, locations = self.get_arrays()
+        indices = np.nonzero(control_types == control_type)[0]
+        return [names[index] for index in indices], locations[indices]
+
+    def node_added_callback(self, node_mobject, clientData):
+        # the flags are added after the node is created, it is checked on the next lookup
+        if self.built:
+            self.pending_nodes.append(om.MObjectHandle(node_mobject))
+
+    def node_removed_callback(self, node_mobject, clientData):
+        if self.built:
+            self.remove_node(node_mobject)
+
+    def attribute_changed_callback(self, msg, plug, otherPlug, clientData):
+        if not msg & (om.MNodeMessage.kAttributeSet | om.MNodeMessage.kAttributeAdded |
+                      om.MNodeMessage.kAttributeRemoved):
+            return
+        if plug.partialName(useLongNames=True) not in (CONTROL_TYPE_ATTRIBUTE, CONTROL_LOCATION_ATTRIBUTE):
+            return
+        node_mobject = plug.node()
+        if msg & om.MNodeMessage.kAttributeRemoved and \
+                plug.partialName(useLongNames=True) == CONTROL_TYPE_ATTRIBUTE:
+            self.remove_node(node_mobject)
+        else:
+            self.add_node(node_mobject)
+
+    def name_changed_callback(self, node_mobject, previous_name, clientData):
+        entry = self.controls.get(om.MObjectHandle(node_mobject).hashCode())
+        if entry is not None:
+            entry[1] = om.MFnDagNode(node_mobject).partialPathName() if node_mobject.hasFn(om.MFn.kDagNode) \
+                else om.MFnDependencyNode(node_mobject).name()
+            self.arrays = None
+
+    def scene_changed_callback(self, clientData):
+        self.invalidate()
+
+    def register_callbacks(self):
+        if self.callback_ids:
+            return
+        # scene level callbacks, they have to survive the registry's teardown on scene new/open
+        self.callback_ids = [
+            cbr.register_callback(lambda callback: om.MDGMessage.addNodeAddedCallback(callback, "transform"),
+                                  self.node_added_callback, name="FaceControlRegistry.node_added",
+                                  persistent=True),
+            cbr.register_callback(lambda callback: om.MDGMessage.addNodeRemovedCallback(callback, "transform"),
+                                  self.node_removed_callback, name="FaceControlRegistry.node_removed",
+                                  persistent=True),
+            cbr.register_callback(
+                lambda callback: om.MSceneMessage.addCallback(om.MSceneMessage.kBeforeNew, callback),
+                self.scene_changed_callback, name="FaceControlRegistry.before_new", persistent=True),
+            cbr.register_callback(
+                lambda callback: om.MSceneMessage.addCallback(om.MSceneMessage.kBeforeOpen, callback),
+                self.scene_changed_callback, name="FaceControlRegistry.before_open", persistent=True),
+        ]
+
+    def remove_callbacks(self):
+        for callback_id in self.callback_ids:
+            cbr.remove_callback(callback_id)
+        self.callback_ids = []
+        self.clear()
+
+
+_registry = None
+
+
+def get_registry():
+    global _registry
+    if _registry is None:
+        _registry = FaceControlRegistry()
+        _registry.register_callbacks()
+    return _registry
+
+
+def get_face_controls(location=None):
+    return get_registry().get_controls(FACE_CONTROL_TYPE, location=location)
+
+
+def add_control(control):
+    """
+    register a control whose flags were just added, without waiting for a rebuild
+    """
+    registry = get_registry()
+    if not registry.built:
+        return
+    selection_list = om.MSelectionList()
+    selection_list.add(control)
+    registry.add_node(selection_list.getDependNode(0))
+
+
+def remove_registry():
+    global _registry
+    if _registry is not None:
+        _registry.remove_callbacks()
+        _registry = None
+        logger.info("Face control registry has been removed")
@@ -115,7 +115,7 @@ class MyWindow(QMainWindow):
 
     def updatePoseList(self):
         poseNames = mc.listAttr(f"{fs.FACS_HUB}", userDefined=True)
-        poseNames = sorted(poseNames)
+        poseNames = sorted(poseName for poseName in poseNames if poseName != fs.fi.INDEX_ATTRIBUTE)
         self.poseListWidget.clear()
         self.poseListWidget.addItems(poseNames)
 
@@ -134,8 +134,7 @@ class MyWindow(QMainWindow):
             return
         controls = fs.getFaceControls()
         fp = os.path.join(self.presetDir, f"preset{presetName.capitalize()}.json")
-        for control in controls:
-            fs.storeTransformationBackToControl(control)
+        fs.storeTransformationsBackToControls(controls)
         pl.export_pose(controls, fp)
         self.updatePresetList()
 
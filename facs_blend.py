@@ -0,0 +1,444 @@
+import logging
+import os
+import numpy as np
+import maya.api.OpenMaya as om
+import maya.api.OpenMayaAnim as oma
+import maya.cmds as mc
+import facs_blend_eval as fbe
+import modifier_undo as mu
+
+"""
+move a FACS_HUB setup from driven key curves onto a single facsPoseBlend node (see facs_blend_node.py)
+
+    extract_pose_table    reads every curve going from a FACS_HUB shape to a blend node channel into a PoseTable
+    create_pose_blend     creates the node holding the table, its weights connected to FACS_HUB
+    verify_pose_blend     drives FACS_HUB through a set of poses and compares the node to the curves
+                          (to the pose table in quaternion mode)
+    migrate_facs_hub      all of the above, then swaps the blend node connections and deletes the curves
+
+usage:
+    import facs_blend as fb
+    node = fb.migrate_facs_hub()
+"""
+
+#initiate logging with module name
+logger = logging.getLogger(__name__)
+
+FACS_HUB = "FACS_HUB"
+FACS_BLEND_PLUGIN = "facs_blend_node.py"
+FACS_BLEND_NODE_TYPE = "facsPoseBlend"
+# multiplyDivide nodes created by FACS_setup.createCorrectivePose before facs_combination, they drive their
+# FACS_HUB attribute, the facsCombination nodes replacing them keep the suffix
+CORRECTIVE_SUFFIX = "_corrective_blend"
+COMBINATION_NODE_TYPE = "facsCombination"
+
+
+def load_facs_blend_plugin():
+    if not mc.pluginInfo(FACS_BLEND_PLUGIN, query=True, loaded=True):
+        plugin_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), FACS_BLEND_PLUGIN)
+        mc.loadPlugin(plugin_path, quiet=True)
+
+
+def get_node(node):
+    selection_list = om.MSelectionList()
+    selection_list.add(node)
+    return selection_list.getDependNode(0)
+
+
+def get_shape_attributes(hub=FACS_HUB):
+    attributes = mc.listAttr(hub, userDefined=True, scalar=True) or []
+    return [attr for attr in attributes if mc.getAttr(f"{hub}.{attr}", type=True) in ("float", "double")]
+
+
+def get_driven_channels(curve_object):
+    """
+    blend node channels a driven key curve ends up on, directly or through a blendWeighted
+
+    Returns:
+        list of (channel MPlug, weight, blendWeighted MObject or None)
+    """
+    channels = []
+    output = om.MFnDependencyNode(curve_object).findPlug("output", False)
+    for destination in output.destinations():
+        mfn_node = om.MFnDependencyNode(destination.node())
+        if mfn_node.typeName == "blendWeighted":
+            input_index = destination.logicalIndex()
+            weight = mfn_node.findPlug("weight", False).elementByLogicalIndex(input_index).asDouble()
+            for blend_destination in mfn_node.findPlug("output", False).destinations():
+                channels.append((blend_destination, weight, destination.node()))
+        else:
+            channels.append((destination, 1.0, None))
+    return [(plug, weight, blend_weighted) for plug, weight, blend_weighted in channels
+            if plug.partialName(useLongNames=True) in fbe.CHANNELS]
+
+
+def extract_pose_table(hub=FACS_HUB):
+    """
+    read the driven key setup of FACS_HUB
+
+    Returns:
+        dict with
+            "table"              PoseTable
+            "shapes"             FACS_HUB attribute of each shape index
+            "outputs"            blend node of each output index
+            "curves", "blend_weighted"   the nodes the table replaces
+            "non_linear"         curves with non linear tangents, the table treats them as linear
+    """
+    shapes = get_shape_attributes(hub)
+    mfn_hub = om.MFnDependencyNode(get_node(hub))
+
+    outputs = []
+    output_indices = {}
+    entries = []
+    curves = {}
+    blend_weighted_nodes = {}
+    non_linear = []
+    for shape_index, shape in enumerate(shapes):
+        for destination in mfn_hub.findPlug(shape, False).destinations():
+            curve_object = destination.node()
+            if not curve_object.hasFn(om.MFn.kAnimCurve):
+                continue
+            mfn_curve = oma.MFnAnimCurve(curve_object)
+            driven_channels = get_driven_channels(curve_object)
+            if not driven_channels:
+                continue
+            curves[om.MObjectHandle(curve_object).hashCode()] = curve_object
+
+            key_count = mfn_curve.numKeys
+            key_inputs = [mfn_curve.unitlessInput(index) for index in range(key_count)]
+            key_values = [mfn_curve.value(index) for index in range(key_count)]
+            if any(mfn_curve.inTangentType(index) != oma.MFnAnimCurve.kTangentLinear or
+                   mfn_curve.outTangentType(index) != oma.MFnAnimCurve.kTangentLinear
+                   for index in range(1, key_count)):
+                non_linear.append(mfn_curve.name())
+
+            for channel_plug, weight, blend_weighted in driven_channels:
+                if blend_weighted is not None:
+                    blend_weighted_nodes[om.MObjectHandle(blend_weighted).hashCode()] = blend_weighted
+                blend_node = om.MFnDependencyNode(channel_plug.node()).name()
+                if blend_node not in output_indices:
+                    output_indices[blend_node] = len(outputs)
+                    outputs.append(blend_node)
+                channel = fbe.CHANNELS.index(channel_plug.partialName(useLongNames=True))
+                entries.append((output_indices[blend_node], channel, shape_index,
+                                key_inputs, [value * weight for value in key_values]))
+
+    # rest values, rotations in radians like the curves
+    rest_values = np.zeros((len(outputs), 9))
+    for output_index, blend_node in enumerate(outputs):
+        mfn_blend = om.MFnDependencyNode(get_node(blend_node))
+        rest_values[output_index] = [mfn_blend.findPlug(channel, False).asDouble() for channel in fbe.CHANNELS]
+
+    key_starts = np.concatenate([[0], np.cumsum([len(entry[3]) for entry in entries])]).astype(np.int64)
+    table = fbe.PoseTable([entry[0] for entry in entries], [entry[1] for entry in entries],
+                          [entry[2] for entry in entries], key_starts,
+                          [key for entry in entries for key in entry[3]],
+                          [value for entry in entries for value in entry[4]],
+                          rest_values, shape_count=len(shapes))
+
+    if non_linear:
+        logger.warning(f"{len(non_linear)} curves have non linear tangents, they are read as linear: {non_linear}")
+
+    return {"table": table, "shapes": shapes, "outputs": outputs,
+            "curves": list(curves.values()), "blend_weighted": list(blend_weighted_nodes.values()),
+            "non_linear": non_linear}
+
+
+def read_pose_blend(node):
+    """
+    read the table held by a facsPoseBlend node, the setup of a FACS_HUB already migrated by migrate_facs_hub
+
+    Returns:
+        dict with "table", "shapes" and "outputs" like extract_pose_table
+    """
+    mfn_node = om.MFnDependencyNode(get_node(node))
+
+    def read_array(attr, data_class):
+        return list(data_class(mfn_node.findPlug(attr, False).asMObject()).array())
+
+    shapes = read_array("shapeNames", om.MFnStringArrayData)
+    table = fbe.PoseTable(read_array("entryOutput", om.MFnIntArrayData),
+                          read_array("entryChannel", om.MFnIntArrayData),
+                          read_array("entryShape", om.MFnIntArrayData),
+                          read_array("keyStart", om.MFnIntArrayData) or [0],
+                          read_array("keyInput", om.MFnDoubleArrayData),
+                          read_array("keyValue", om.MFnDoubleArrayData),
+                          read_array("restValue", om.MFnDoubleArrayData), shape_count=len(shapes))
+    return {"table": table, "shapes": shapes, "outputs": read_array("outputNames", om.MFnStringArrayData)}
+
+
+def get_pose_blend(hub=FACS_HUB):
+    pose_blends = mc.listConnections(hub, source=False, destination=True, type=FACS_BLEND_NODE_TYPE) or []
+    return pose_blends[0] if pose_blends else None
+
+
+def is_corrective_source(node_mobject):
+    """
+    whether a node driving a FACS_HUB attribute makes it a combination shape
+    """
+    mfn_node = om.MFnDependencyNode(node_mobject)
+    return mfn_node.typeName == COMBINATION_NODE_TYPE or \
+        (mfn_node.typeName == "multiplyDivide" and mfn_node.name().endswith(CORRECTIVE_SUFFIX))
+
+
+def get_combination_inputs(node_mobject, hub_mobject):
+    """
+    FACS_HUB shapes combined by a facsCombination node, or by a multiplyDivide and the multiplyDivide nodes
+    chained into it
+
+    Returns:
+        (list of FACS_HUB attributes, operation index, list of the chained multiplyDivide MObjects)
+    """
+    mfn_node = om.MFnDependencyNode(node_mobject)
+    if mfn_node.typeName == COMBINATION_NODE_TYPE:
+        input_array = mfn_node.findPlug("input", False)
+        sources = [input_array.elementByLogicalIndex(index).source()
+                   for index in input_array.getExistingArrayAttributeIndices()]
+        operation = mfn_node.findPlug("operation", False).asShort()
+    else:
+        sources = [mfn_node.findPlug(attr, False).source() for attr in ("input1X", "input2X")]
+        operation = 0
+
+    shapes = []
+    chained = []
+    for source in sources:
+        if source.isNull:
+            continue
+        if source.node() == hub_mobject:
+            shapes.append(source.partialName(useLongNames=True))
+        elif operation == 0 and om.MFnDependencyNode(source.node()).typeName == "multiplyDivide":
+            chained_shapes, _, chained_nodes = get_combination_inputs(source.node(), hub_mobject)
+            shapes.extend(chained_shapes)
+            chained.extend([source.node()] + chained_nodes)
+    return shapes, operation, chained
+
+
+def extract_correctives(shapes, hub=FACS_HUB):
+    """
+    find the combination shapes and the FACS_HUB shapes they combine
+
+    Args:
+        shapes (list): FACS_HUB attribute of each shape index
+
+    Returns:
+        (corrective shape indices, input starts, input shape indices, operations),
+        see facs_preview_eval.CorrectiveTable
+    """
+    hub_mobject = get_node(hub)
+    mfn_hub = om.MFnDependencyNode(hub_mobject)
+    shape_indices = {shape: index for index, shape in enumerate(shapes)}
+    corrective_shapes = []
+    input_starts = [0]
+    input_shapes = []
+    operations = []
+    for shape_index, shape in enumerate(shapes):
+        source = mfn_hub.findPlug(shape, False).source()
+        if source.isNull or not is_corrective_source(source.node()):
+            continue
+        combined, operation, _ = get_combination_inputs(source.node(), hub_mobject)
+        inputs = [shape_indices[input_shape] for input_shape in combined if input_shape in shape_indices]
+        if not inputs:
+            logger.warning(f"Corrective {source.name()} of {shape} has no FACS_HUB input, it is ignored")
+            continue
+        corrective_shapes.append(shape_index)
+        input_shapes.extend(inputs)
+        input_starts.append(len(input_shapes))
+        operations.append(operation)
+    return corrective_shapes, input_starts, input_shapes, operations
+
+
+def set_table_attributes(modifier, node, table, shapes, outputs):
+    mfn_node = om.MFnDependencyNode(node)
+    for attr, values in [("entryOutput", table.entry_outputs), ("entryChannel", table.entry_channels),
+                         ("entryShape", table.entry_shapes), ("keyStart", table.key_starts)]:
+        modifier.newPlugValue(mfn_node.findPlug(attr, False),
+                              om.MFnIntArrayData().create(om.MIntArray([int(value) for value in values])))
+    for attr, values in [("keyInput", table.key_inputs), ("keyValue", table.key_values),
+                         ("restValue", table.rest_values.reshape(-1))]:
+        modifier.newPlugValue(mfn_node.findPlug(attr, False),
+                              om.MFnDoubleArrayData().create(om.MDoubleArray(values.tolist())))
+    modifier.newPlugValue(mfn_node.findPlug("shapeNames", False), om.MFnStringArrayData().create(shapes))
+    modifier.newPlugValue(mfn_node.findPlug("outputNames", False), om.MFnStringArrayData().create(outputs))
+
+
+def create_pose_blend(data, hub=FACS_HUB, name="FACS_poseBlend", rotate_blend="euler"):
+    """
+    create the facsPoseBlend node for an extracted table and connect its weights, the outputs are left free
+
+    Returns:
+        node MObject
+    """
+    load_facs_blend_plugin()
+    mu.load_plugin()
+
+    create_modifier = om.MDGModifier()
+    node = create_modifier.createNode(FACS_BLEND_NODE_TYPE)
+    create_modifier.renameNode(node, name)
+    mu.apply_modifier(create_modifier)
+
+    modifier = om.MDGModifier()
+    set_table_attributes(modifier, node, data["table"], data["shapes"], data["outputs"])
+    mfn_node = om.MFnDependencyNode(node)
+    modifier.newPlugValueShort(mfn_node.findPlug("rotateBlend", False), fbe.ROTATE_BLEND_MODES.index(rotate_blend))
+    mfn_hub = om.MFnDependencyNode(get_node(hub))
+    weights = mfn_node.findPlug("weight", False)
+    for shape_index, shape in enumerate(data["shapes"]):
+        modifier.connect(mfn_hub.findPlug(shape, False), weights.elementByLogicalIndex(shape_index))
+    mu.apply_modifier(modifier)
+    return node
+
+
+def get_test_poses(shape_count, settable, random_poses=20, seed=0):
+    """
+    weight vectors of the verification: rest, every shape alone at 0.5 and 1, and random combinations
+    """
+    poses = [np.zeros(shape_count)]
+    for shape_index in np.nonzero(settable)[0]:
+        for value in (0.5, 1.0):
+            pose = np.zeros(shape_count)
+            pose[shape_index] = value
+            poses.append(pose)
+    random_state = np.random.RandomState(seed)
+    for _ in range(random_poses):
+        poses.append(random_state.uniform(0.0, 1.0, shape_count) * (random_state.uniform(size=shape_count) < 0.3))
+    return np.array(poses) * settable
+
+
+def read_channels(plugs):
+    return np.array([plug.asDouble() for plug in plugs])
+
+
+def verify_pose_blend(node, data, hub=FACS_HUB, random_poses=20, tolerance=1e-4, rotate_blend="euler"):
+    """
+    drive FACS_HUB through test poses and compare the node outputs with the blend node channels
+
+    the shape attributes are set through their plugs and restored afterwards, their inputs (sliders) are
+    disconnected for the time of the test, combination shapes stay driven by their facsCombination / multiplyDivide
+
+    with rotate_blend="quaternion" the node is compared with the extracted table evaluated in quaternion mode,
+    the difference from the euler curves is only logged
+
+    Returns:
+        (max absolute difference, number of poses tested)
+    """
+    mfn_hub = om.MFnDependencyNode(get_node(hub))
+    mfn_node = om.MFnDependencyNode(node)
+    shape_plugs = [mfn_hub.findPlug(shape, False) for shape in data["shapes"]]
+
+    blend_plugs = []
+    node_plugs = []
+    output_array = mfn_node.findPlug("output", False)
+    for output_index, blend_node in enumerate(data["outputs"]):
+        mfn_blend = om.MFnDependencyNode(get_node(blend_node))
+        output_plug = output_array.elementByLogicalIndex(output_index)
+        for channel_index, channel in enumerate(fbe.CHANNELS):
+            blend_plugs.append(mfn_blend.findPlug(channel, False))
+            node_plugs.append(output_plug.child(channel_index // 3).child(channel_index % 3))
+
+    # free the shape attributes, correctives keep their input
+    disconnected = []
+    settable = np.ones(len(shape_plugs), dtype=bool)
+    modifier = om.MDGModifier()
+    for shape_index, plug in enumerate(shape_plugs):
+        source = plug.source()
+        if source.isNull:
+            continue
+        if is_corrective_source(source.node()):
+            settable[shape_index] = False
+            continue
+        modifier.disconnect(source, plug)
+        disconnected.append((source, plug))
+    modifier.doIt()
+
+    original_values = [plug.asDouble() for plug in shape_plugs]
+    max_difference = 0.0
+    curve_difference = 0.0
+    poses = get_test_poses(len(shape_plugs), settable, random_poses=random_poses)
+    try:
+        for pose in poses:
+            for plug, value, can_set in zip(shape_plugs, pose, settable):
+                if can_set:
+                    plug.setDouble(float(value))
+            node_channels = read_channels(node_plugs)
+            curve_channels = read_channels(blend_plugs)
+            if rotate_blend == "quaternion":
+                # the correctives are read back from FACS_HUB as the DG computed them
+                expected = data["table"].evaluate(read_channels(shape_plugs), rotate_blend=rotate_blend).reshape(-1)
+                if len(curve_channels):
+                    curve_difference = max(curve_difference, float(np.abs(curve_channels - node_channels).max()))
+            else:
+                expected = curve_channels
+            difference = np.abs(expected - node_channels)
+            max_difference = max(max_difference, float(difference.max()) if len(difference) else 0.0)
+    finally:
+        for plug, value, can_set in zip(shape_plugs, original_values, settable):
+            if can_set:
+                plug.setDouble(value)
+        modifier.undoIt()
+
+    if rotate_blend == "quaternion":
+        logger.info(f"facsPoseBlend quaternion blending differs from the euler driven keys by {curve_difference} "
+                    f"over {len(poses)} poses")
+    if max_difference > tolerance:
+        reference = "the quaternion pose table" if rotate_blend == "quaternion" else "the driven keys"
+        logger.warning(f"facsPoseBlend differs from {reference} by {max_difference} over {len(poses)} poses")
+    return max_difference, len(poses)
+
+
+def migrate_facs_hub(hub=FACS_HUB, name="FACS_poseBlend", rotate_blend="euler", tolerance=1e-4,
+                     random_poses=20, delete_curves=True):
+    """
+    replace the driven key curves of FACS_HUB with a single facsPoseBlend node
+
+    the node is verified before anything is rewired, with rotate_blend="euler" against the curves it replaces,
+    with "quaternion" against the extracted table evaluated in quaternion mode: composing the rotations of
+    overlapping shapes differs from the curves where they rotate around different axes, that difference is logged
+
+    Args:
+        hub (str): FACS hub node
+        name (str): name of the new node
+        rotate_blend (str): "euler" or "quaternion"
+        tolerance (float): max difference accepted by the verification
+        random_poses (int): random shape combinations added to the verification poses
+        delete_curves (bool): delete the replaced curves and blendWeighted nodes
+
+    Returns:
+        name of the facsPoseBlend node
+    """
+    data = extract_pose_table(hub)
+    if not data["outputs"]:
+        raise RuntimeError(f"Failed to find driven keys from {hub} to any blend node")
+
+    mc.undoInfo(openChunk=True)
+    try:
+        node = create_pose_blend(data, hub=hub, name=name, rotate_blend=rotate_blend)
+        node_name = om.MFnDependencyNode(node).name()
+        max_difference, pose_count = verify_pose_blend(node, data, hub=hub, random_poses=random_poses,
+                                                       tolerance=tolerance, rotate_blend=rotate_blend)
+        if max_difference > tolerance:
+            mc.delete(node_name)
+            raise RuntimeError(f"{node_name} does not match the {rotate_blend} pose table of {hub} "
+                               f"(max difference {max_difference} over {pose_count} poses), nothing was changed")
+
+        # swap the connections of every driven channel and drop the curves in one pass
+        modifier = om.MDGModifier()
+        output_array = om.MFnDependencyNode(node).findPlug("output", False)
+        driven = set(zip(data["table"].entry_outputs.tolist(), data["table"].entry_channels.tolist()))
+        for output_index, channel_index in sorted(driven):
+            mfn_blend = om.MFnDependencyNode(get_node(data["outputs"][output_index]))
+            channel_plug = mfn_blend.findPlug(fbe.CHANNELS[channel_index], False)
+            source = channel_plug.source()
+            if not source.isNull:
+                modifier.disconnect(source, channel_plug)
+            modifier.connect(output_array.elementByLogicalIndex(output_index).child(channel_index // 3)
+                             .child(channel_index % 3), channel_plug)
+        if delete_curves:
+            for curve_object in data["curves"] + data["blend_weighted"]:
+                modifier.deleteNode(curve_object)
+        mu.apply_modifier(modifier)
+    finally:
+        mc.undoInfo(closeChunk=True)
+
+    logger.info(f"{hub} migrated to {node_name}: {len(data['shapes'])} shapes, {len(data['outputs'])} blend nodes, "
+                f"max difference {max_difference} over {pose_count} poses")
+    return node_name
@@ -0,0 +1,201 @@
+import numpy as np
+
+"""
+Maya-free evaluation of a FACS pose table, the data held by the facsPoseBlend node (see facs_blend_node.py)
+
+a pose table describes what the driven key curves of the FACS_HUB shapes do to the blend nodes:
+    one entry per (blend node, channel, shape) curve, channels are tx ty tz rx ry rz sx sy sz
+    the keys of an entry are (driver value, channel value) pairs, linear between keys and constant outside,
+    rotations in radians
+    channels driven by several shapes add their curves like the blendWeighted node does
+    channels without any curve keep their rest value
+
+the curves are evaluated as a sum of clamped ramps, one per key segment,
+    value(w) = v0 + sum((v[i + 1] - v[i]) * clip((w - x[i]) / (x[i + 1] - x[i]), 0, 1))
+which is exact for linear keys and vectorizes over every segment of every curve at once.
+
+with rotate_blend="quaternion" the rotation each shape adds is turned into a quaternion and the shapes are
+composed by quaternion product, in shape order, instead of adding euler angles.
+
+usage:
+    table = PoseTable(entry_outputs, entry_channels, entry_shapes, key_starts, key_inputs, key_values, rest_values)
+    trs = table.evaluate(weights)    # (frames, shapes) -> (frames, blend nodes, 9)
+"""
+
+CHANNELS = ("translateX", "translateY", "translateZ", "rotateX", "rotateY", "rotateZ",
+            "scaleX", "scaleY", "scaleZ")
+ROTATE_CHANNELS = slice(3, 6)
+ROTATE_BLEND_MODES = ("euler", "quaternion")
+
+
+def euler_to_quaternions(rotations):
+    """
+    XYZ euler rotations to quaternions, x applied first like Maya's xyz rotate order
+
+    Args:
+        rotations (array_like): (..., 3) rotations in radians
+
+    Returns:
+        (..., 4) quaternions as (w, x, y, z)
+    """
+    half = np.asarray(rotations, dtype=np.float64) * 0.5
+    cos, sin = np.cos(half), np.sin(half)
+    cx, cy, cz = cos[..., 0], cos[..., 1], cos[..., 2]
+    sx, sy, sz = sin[..., 0], sin[..., 1], sin[..., 2]
+    # qz * qy * qx
+    return np.stack([cx * cy * cz + sx * sy * sz,
+                     sx * cy * cz - cx * sy * sz,
+                     cx * sy * cz + sx * cy * sz,
+                     cx * cy * sz - sx * sy * cz], axis=-1)
+
+
+def quaternions_to_euler(quaternions):
+    """
+    quaternions (w, x, y, z) to XYZ euler rotations in radians
+    """
+    w, x, y, z = [quaternions[..., index] for index in range(4)]
+    sin_y = np.clip(2.0 * (w * y - x * z), -1.0, 1.0)
+    return np.stack([np.arctan2(2.0 * (w * x + y * z), 1.0 - 2.0 * (x * x + y * y)),
+                     np.arcsin(sin_y),
+                     np.arctan2(2.0 * (w * z + x * y), 1.0 - 2.0 * (y * y + z * z))], axis=-1)
+
+
+def multiply_quaternions(first, second):
+    """
+    rotation by first then by second, (..., 4) quaternions as (w, x, y, z)
+    """
+    w1, x1, y1, z1 = [first[..., index] for index in range(4)]
+    w2, x2, y2, z2 = [second[..., index] for index in range(4)]
+    # hamilton product second * first
+    return np.stack([w2 * w1 - x2 * x1 - y2 * y1 - z2 * z1,
+                     w2 * x1 + x2 * w1 + y2 * z1 - z2 * y1,
+                     w2 * y1 - x2 * z1 + y2 * w1 + z2 * x1,
+                     w2 * z1 + x2 * y1 - y2 * x1 + z2 * w1], axis=-1)
+
+
+class PoseTable(object):
+
+    def __init__(self, entry_outputs, entry_channels, entry_shapes, key_starts, key_inputs, key_values,
+                 rest_values, shape_count=None):
+        """
+        Args:
+            entry_outputs (array_like): (E,) blend node index of each entry
+            entry_channels (array_like): (E,) channel index of each entry, 0-8
+            entry_shapes (array_like): (E,) shape (weight) index of each entry
+            key_starts (array_like): (E + 1,) the keys of entry e are key_starts[e]:key_starts[e + 1]
+            key_inputs (array_like): (K,) driver value of each key, increasing within an entry
+            key_values (array_like): (K,) channel value of each key
+            rest_values (array_like): (B, 9) values of the channels no curve drives
+            shape_count (int): number of weights, the highest shape index + 1 if None
+        """
+        self.entry_outputs = np.asarray(entry_outputs, dtype=np.int64)
+        self.entry_channels = np.asarray(entry_channels, dtype=np.int64)
+        self.entry_shapes = np.asarray(entry_shapes, dtype=np.int64)
+        self.key_starts = np.asarray(key_starts, dtype=np.int64)
+        self.key_inputs = np.asarray(key_inputs, dtype=np.float64)
+        self.key_values = np.asarray(key_values, dtype=np.float64)
+        self.rest_values = np.asarray(rest_values, dtype=np.float64).reshape(-1, 9)
+        entry_count = len(self.entry_outputs)
+        if shape_count is None:
+            shape_count = int(self.entry_shapes.max()) + 1 if entry_count else 0
+        self.shape_count = shape_count
+        self.output_count = len(self.rest_values)
+
+        # value of each entry at its first key
+        self.first_values = self.key_values[self.key_starts[:-1]] if entry_count else np.zeros(0)
+
+        # one segment between every pair of consecutive keys of an entry
+        key_entries = np.repeat(np.arange(entry_count), np.diff(self.key_starts))
+        segment_mask = np.zeros(len(self.key_inputs), dtype=bool)
+        if len(self.key_inputs):
+            segment_mask[:-1] = key_entries[:-1] == key_entries[1:]
+        segment_starts = np.nonzero(segment_mask)[0]
+        self.segment_entries = key_entries[segment_starts]
+        self.segment_x0 = self.key_inputs[segment_starts]
+        self.segment_dx = np.maximum(self.key_inputs[segment_starts + 1] - self.segment_x0, 1e-12)
+        self.segment_dv = self.key_values[segment_starts + 1] - self.key_values[segment_starts]
+
+        # flat (output, channel) slot of each entry, and which slots are driven at all
+        self.entry_slots = self.entry_outputs * 9 + self.entry_channels
+        self.driven = np.zeros(self.output_count * 9, dtype=bool)
+        self.driven[self.entry_slots] = True
+
+    def evaluate_entries(self, weights):
+        """
+        value of every entry curve
+
+        Args:
+            weights (array_like): (F, S) weights
+
+        Returns:
+            (F, E) entry values
+        """
+        weights = np.atleast_2d(np.asarray(weights, dtype=np.float64))
+        ramps = np.clip((weights[:, self.entry_shapes[self.segment_entries]] - self.segment_x0) / self.segment_dx,
+                        0.0, 1.0) * self.segment_dv
+        values = np.broadcast_to(self.first_values, (len(weights), len(self.first_values))).copy()
+        np.add.at(values, (slice(None), self.segment_entries), ramps)
+        return values
+
+    def evaluate(self, weights, rotate_blend="euler"):
+        """
+        blend node channels for every weight vector
+
+        Args:
+            weights (array_like): (F, S) or (S,) weights, one column per shape index
+            rotate_blend (str): "euler" adds the rotation curves like blendWeighted, "quaternion" composes them
+
+        Returns:
+            (F, B, 9) or (B, 9) channel values, rotations in radians
+        """
+        if rotate_blend not in ROTATE_BLEND_MODES:
+            raise ValueError(f"Invalid rotate blend mode: {rotate_blend}")
+        single = np.ndim(weights) == 1
+        weights = np.atleast_2d(np.asarray(weights, dtype=np.float64))
+        if weights.shape[1] < self.shape_count:
+            weights = np.pad(weights, ((0, 0), (0, self.shape_count - weights.shape[1])))
+        frame_count = len(weights)
+
+        entry_values = self.evaluate_entries(weights)
+        slots = np.zeros((frame_count, self.output_count * 9))
+        np.add.at(slots, (slice(None), self.entry_slots), entry_values)
+        rest = np.broadcast_to(self.rest_values.reshape(-1), slots.shape)
+        slots = np.where(self.driven, slots, rest).reshape(frame_count, self.output_count, 9)
+
+        if rotate_blend == "quaternion":
+            slots[:, :, ROTATE_CHANNELS] = self.compose_rotations(entry_values, slots[:, :, ROTATE_CHANNELS])
+
+        return slots[0] if single else slots
+
+    def compose_rotations(self, entry_values, summed_rotations):
+        """
+        compose the rotation of each (blend node, shape) pair by quaternion product instead of adding the angles
+        """
+        frame_count = len(entry_values)
+        rotate_entries = np.nonzero((self.entry_channels >= 3) & (self.entry_channels < 6))[0]
+        if not len(rotate_entries):
+            return summed_rotations
+
+        # euler rotation each shape adds to each blend node
+        pairs = self.entry_outputs[rotate_entries] * max(self.shape_count, 1) + self.entry_shapes[rotate_entries]
+        unique_pairs, pair_index = np.unique(pairs, return_inverse=True)
+        pair_rotations = np.zeros((frame_count, len(unique_pairs), 3))
+        np.add.at(pair_rotations, (slice(None), pair_index, self.entry_channels[rotate_entries] - 3),
+                  entry_values[:, rotate_entries])
+        pair_quaternions = euler_to_quaternions(pair_rotations)
+        pair_outputs = unique_pairs // max(self.shape_count, 1)
+
+        # pairs are sorted by output then shape, compose them rank by rank within each output
+        output_starts = np.searchsorted(pair_outputs, pair_outputs)
+        ranks = np.arange(len(unique_pairs)) - output_starts
+        quaternions = np.zeros((frame_count, self.output_count, 4))
+        quaternions[..., 0] = 1.0
+        for rank in range(int(ranks.max()) + 1):
+            current = ranks == rank
+            outputs = pair_outputs[current]
+            quaternions[:, outputs] = multiply_quaternions(quaternions[:, outputs], pair_quaternions[:, current])
+
+        rotations = summed_rotations.copy()
+        driven_outputs = np.unique(pair_outputs)
+        rotations[:, driven_outputs] = quaternions_to_euler(quaternions[:, driven_outputs])
+        return rotations
@@ -0,0 +1,184 @@
+import maya.api.OpenMaya as om
+import facs_blend_eval as fbe
+
+"""
+facsPoseBlend DG node replacing the driven key curves and blendWeighted nodes between FACS_HUB and the blend nodes
+
+load with:
+    mc.loadPlugin("path/to/facs_blend_node.py")
+
+inputs:
+    weight[s]           FACS_HUB shape attributes, one element per shape index
+    rotateBlend         0 euler: add the rotation curves like blendWeighted, 1 quaternion: compose them
+    pose table          entryOutput, entryChannel, entryShape, keyStart, keyInput, keyValue, restValue,
+                        see facs_blend_eval.PoseTable
+    shapeNames, outputNames  the FACS_HUB attribute and blend node of each index, for bookkeeping
+outputs:
+    output[b].outputTranslate / outputRotate / outputScale of every blend node
+
+the table is read into a PoseTable when one of its attributes changes, every evaluation after that is
+a single vectorized PoseTable.evaluate call for all the blend nodes.
+"""
+
+
+def maya_useNewAPI():
+    pass
+
+
+class FacsPoseBlendNode(om.MPxNode):
+
+    kNodeName = "facsPoseBlend"
+    # id from the range reserved for local development, next to coneReader
+    kNodeId = om.MTypeId(0x0007F101)
+
+    weight = None
+    rotateBlend = None
+    entryOutput = None
+    entryChannel = None
+    entryShape = None
+    keyStart = None
+    keyInput = None
+    keyValue = None
+    restValue = None
+    shapeNames = None
+    outputNames = None
+
+    output = None
+    outputTranslate = None
+    outputRotate = None
+    outputScale = None
+    outputRotateChildren = []
+
+    table_attributes = []
+    output_attributes = []
+
+    def __init__(self):
+        om.MPxNode.__init__(self)
+        self.table = None
+
+    @classmethod
+    def creator(cls):
+        return cls()
+
+    @classmethod
+    def initialize(cls):
+        numeric_attr = om.MFnNumericAttribute()
+        typed_attr = om.MFnTypedAttribute()
+        enum_attr = om.MFnEnumAttribute()
+        unit_attr = om.MFnUnitAttribute()
+        compound_attr = om.MFnCompoundAttribute()
+
+        cls.weight = numeric_attr.create("weight", "w", om.MFnNumericData.kDouble, 0.0)
+        numeric_attr.array = True
+        numeric_attr.keyable = True
+
+        cls.rotateBlend = enum_attr.create("rotateBlend", "rb", 0)
+        for index, mode in enumerate(fbe.ROTATE_BLEND_MODES):
+            enum_attr.addField(mode, index)
+        enum_attr.keyable = True
+
+        cls.entryOutput = typed_attr.create("entryOutput", "eo", om.MFnData.kIntArray)
+        cls.entryChannel = typed_attr.create("entryChannel", "ec", om.MFnData.kIntArray)
+        cls.entryShape = typed_attr.create("entryShape", "es", om.MFnData.kIntArray)
+        cls.keyStart = typed_attr.create("keyStart", "ks", om.MFnData.kIntArray)
+        cls.keyInput = typed_attr.create("keyInput", "ki", om.MFnData.kDoubleArray)
+        cls.keyValue = typed_attr.create("keyValue", "kv", om.MFnData.kDoubleArray)
+        cls.restValue = typed_attr.create("restValue", "rv", om.MFnData.kDoubleArray)
+        cls.shapeNames = typed_attr.create("shapeNames", "sn", om.MFnData.kStringArray)
+        cls.outputNames = typed_attr.create("outputNames", "on", om.MFnData.kStringArray)
+
+        translate_children = [numeric_attr.create(f"outputTranslate{axis}", f"ot{axis.lower()}",
+                                                  om.MFnNumericData.kDouble, 0.0) for axis in "XYZ"]
+        cls.outputTranslate = numeric_attr.create("outputTranslate", "ot", *translate_children)
+        rotate_children = [unit_attr.create(f"outputRotate{axis}", f"or{axis.lower()}",
+                                            om.MFnUnitAttribute.kAngle, 0.0) for axis in "XYZ"]
+        cls.outputRotate = numeric_attr.create("outputRotate", "or", *rotate_children)
+        cls.outputRotateChildren = rotate_children
+        scale_children = [numeric_attr.create(f"outputScale{axis}", f"os{axis.lower()}",
+                                              om.MFnNumericData.kDouble, 1.0) for axis in "XYZ"]
+        cls.outputScale = numeric_attr.create("outputScale", "os", *scale_children)
+
+        cls.output = compound_attr.create("output", "out")
+        compound_attr.addChild(cls.outputTranslate)
+        compound_attr.addChild(cls.outputRotate)
+        compound_attr.addChild(cls.outputScale)
+        compound_attr.array = True
+        compound_attr.usesArrayDataBuilder = True
+        compound_attr.writable = False
+        compound_attr.storable = False
+
+        cls.table_attributes = [cls.entryOutput, cls.entryChannel, cls.entryShape, cls.keyStart, cls.keyInput,
+                                cls.keyValue, cls.restValue]
+        inputs = [cls.weight, cls.rotateBlend] + cls.table_attributes
+        cls.output_attributes = [cls.output, cls.outputTranslate, cls.outputRotate, cls.outputScale] + \
+            translate_children + rotate_children + scale_children
+
+        for attr in inputs + [cls.shapeNames, cls.outputNames, cls.output]:
+            cls.addAttribute(attr)
+
+        for input_attr in inputs:
+            cls.attributeAffects(input_attr, cls.output)
+
+    def setDependentsDirty(self, plug, affected_plugs):
+        if plug.attribute() in FacsPoseBlendNode.table_attributes:
+            self.table = None
+
+    def read_table(self, data_block):
+        def int_array(attr):
+            return list(om.MFnIntArrayData(data_block.inputValue(attr).data()).array())
+
+        def double_array(attr):
+            return list(om.MFnDoubleArrayData(data_block.inputValue(attr).data()).array())
+
+        return fbe.PoseTable(int_array(FacsPoseBlendNode.entryOutput), int_array(FacsPoseBlendNode.entryChannel),
+                             int_array(FacsPoseBlendNode.entryShape), int_array(FacsPoseBlendNode.keyStart) or [0],
+                             double_array(FacsPoseBlendNode.keyInput), double_array(FacsPoseBlendNode.keyValue),
+                             double_array(FacsPoseBlendNode.restValue))
+
+    def compute(self, plug, data_block):
+        if plug.attribute() not in FacsPoseBlendNode.output_attributes:
+            return None
+
+        if self.table is None:
+            self.table = self.read_table(data_block)
+
+        weight_handle = data_block.inputArrayValue(FacsPoseBlendNode.weight)
+        weights = [0.0] * self.table.shape_count
+        for index in range(len(weight_handle)):
+            weight_handle.jumpToPhysicalElement(index)
+            logical_index = weight_handle.elementLogicalIndex()
+            if logical_index < len(weights):
+                weights[logical_index] = weight_handle.inputValue().asDouble()
+
+        rotate_blend = fbe.ROTATE_BLEND_MODES[data_block.inputValue(FacsPoseBlendNode.rotateBlend).asShort()]
+        values = self.table.evaluate(weights, rotate_blend=rotate_blend)
+
+        output_handle = data_block.outputArrayValue(FacsPoseBlendNode.output)
+        builder = output_handle.builder()
+        for index, channels in enumerate(values.tolist()):
+            element = builder.addElement(index)
+            element.child(FacsPoseBlendNode.outputTranslate).set3Double(*channels[0:3])
+            for child, value in zip(FacsPoseBlendNode.outputRotateChildren, channels[3:6]):
+                element.child(FacsPoseBlendNode.outputRotate).child(child).setMAngle(om.MAngle(value))
+            element.child(FacsPoseBlendNode.outputScale).set3Double(*channels[6:9])
+        output_handle.set(builder)
+        output_handle.setAllClean()
+
+
+def initializePlugin(plugin):
+    plugin_fn = om.MFnPlugin(plugin, "Character-Rig", "1.0")
+    try:
+        plugin_fn.registerNode(FacsPoseBlendNode.kNodeName, FacsPoseBlendNode.kNodeId,
+                               FacsPoseBlendNode.creator, FacsPoseBlendNode.initialize)
+    except:
+        om.MGlobal.displayError(f"Failed to register node: {FacsPoseBlendNode.kNodeName}")
+        raise
+
+
+def uninitializePlugin(plugin):
+    plugin_fn = om.MFnPlugin(plugin)
+    try:
+        plugin_fn.deregisterNode(FacsPoseBlendNode.kNodeId)
+    except:
+        om.MGlobal.displayError(f"Failed to deregister node: {FacsPoseBlendNode.kNodeName}")
+        raise
@@ -0,0 +1,210 @@
+import logging
+import os
+import numpy as np
+import maya.api.OpenMaya as om
+import maya.cmds as mc
+import facs_blend as fb
+import facs_driven_keys as fdk
+import facs_preview as fp
+import facs_preview_eval as fpe
+import modifier_undo as mu
+
+"""
+combination (corrective) shapes of any number of FACS_HUB shapes, e.g. "JawOpen_LipFunnel_LeftSmile"
+
+    create_combination          one facsCombination node (see facs_combination_node.py) computing the product or
+                                the min of the combined shapes into the FACS_HUB attribute of the combination
+    convert_corrective_blends   replace the multiplyDivide nodes, and their chains, of older setups
+    get_combination_values      blend node values to key for the current pose, every lower order shape (the
+                                combined shapes and their own combinations) taken off
+    key_combination             all of the above for FACS_setup.createCorrectivePose
+
+usage:
+    import facs_combination as fc
+    fc.create_combination("JawOpen_LipFunnel_LeftSmile", operation="min")
+    fc.key_combination("JawOpen_LipFunnel_LeftSmile", controls)
+"""
+
+#initiate logging with module name
+logger = logging.getLogger(__name__)
+
+FACS_HUB = "FACS_HUB"
+FACS_COMBINATION_PLUGIN = "facs_combination_node.py"
+SHAPE_SEPARATOR = "_"
+
+
+def load_combination_plugin():
+    if not mc.pluginInfo(FACS_COMBINATION_PLUGIN, query=True, loaded=True):
+        plugin_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), FACS_COMBINATION_PLUGIN)
+        mc.loadPlugin(plugin_path, quiet=True)
+
+
+def get_combined_shapes(shape):
+    return shape.split(SHAPE_SEPARATOR)
+
+
+def add_shape_attribute(shape, hub=FACS_HUB):
+    if not mc.attributeQuery(shape, node=hub, exists=True):
+        mc.addAttr(hub, longName=shape, attributeType='float', minValue=0.0, maxValue=1.0, defaultValue=0.0,
+                   keyable=True)
+
+
+def build_combinations(combinations, hub=FACS_HUB):
+    """
+    create the facsCombination nodes of several shapes in two modifier passes, whatever drives their FACS_HUB
+    attribute is disconnected, or deleted when it is a corrective multiplyDivide chain
+
+    Args:
+        combinations (list): (shape, combined shapes, operation index) tuples
+
+    Returns:
+        list of the node names
+    """
+    load_combination_plugin()
+    mu.load_plugin()
+    hub_mobject = fb.get_node(hub)
+    mfn_hub = om.MFnDependencyNode(hub_mobject)
+
+    create_modifier = om.MDGModifier()
+    nodes = []
+    for shape, combined, operation in combinations:
+        shape_plug = mfn_hub.findPlug(shape, False)
+        source = shape_plug.source()
+        if not source.isNull:
+            if fb.is_corrective_source(source.node()):
+                _, _, chained = fb.get_combination_inputs(source.node(), hub_mobject)
+                for node_mobject in [source.node()] + chained:
+                    create_modifier.deleteNode(node_mobject)
+            else:
+                create_modifier.disconnect(source, shape_plug)
+        node = create_modifier.createNode(fb.COMBINATION_NODE_TYPE)
+        create_modifier.renameNode(node, shape + fb.CORRECTIVE_SUFFIX)
+        nodes.append(node)
+    mu.apply_modifier(create_modifier)
+
+    connect_modifier = om.MDGModifier()
+    for node, (shape, combined, operation) in zip(nodes, combinations):
+        mfn_node = om.MFnDependencyNode(node)
+        connect_modifier.newPlugValueShort(mfn_node.findPlug("operation", False), operation)
+        input_array = mfn_node.findPlug("input", False)
+        for index, combined_shape in enumerate(combined):
+            connect_modifier.connect(mfn_hub.findPlug(combined_shape, False), input_array.elementByLogicalIndex(index))
+        connect_modifier.connect(mfn_node.findPlug("output", False), mfn_hub.findPlug(shape, False))
+    mu.apply_modifier(connect_modifier)
+    return [om.MFnDependencyNode(node).name() for node in nodes]
+
+
+def create_combination(shape, combined=None, operation="product", hub=FACS_HUB):
+    """
+    drive the FACS_HUB attribute of a combination shape by one facsCombination node
+
+    Args:
+        shape (str): combination shape, created on FACS_HUB if missing
+        combined (list): shapes it combines, the parts of its name if None
+        operation (str): "product" or "min" of the combined weights
+
+    Returns:
+        name of the facsCombination node
+    """
+    if operation not in fpe.COMBINATION_OPERATIONS:
+        raise ValueError(f"Invalid combination operation: {operation}")
+    if combined is None:
+        combined = get_combined_shapes(shape)
+    for combined_shape in combined:
+        if not mc.attributeQuery(combined_shape, node=hub, exists=True):
+            raise RuntimeError(f"Failed to find {combined_shape} in registered poses")
+    add_shape_attribute(shape, hub)
+    return build_combinations([(shape, combined, fpe.COMBINATION_OPERATIONS.index(operation))], hub=hub)[0]
+
+
+def convert_corrective_blends(hub=FACS_HUB):
+    """
+    replace the multiplyDivide correctives of FACS_HUB (chains included) with facsCombination nodes
+
+    Returns:
+        list of the converted shapes
+    """
+    hub_mobject = fb.get_node(hub)
+    mfn_hub = om.MFnDependencyNode(hub_mobject)
+    combinations = []
+    for shape in fb.get_shape_attributes(hub):
+        source = mfn_hub.findPlug(shape, False).source()
+        if source.isNull or not fb.is_corrective_source(source.node()) or \
+                om.MFnDependencyNode(source.node()).typeName == fb.COMBINATION_NODE_TYPE:
+            continue
+        combined, operation, _ = fb.get_combination_inputs(source.node(), hub_mobject)
+        combinations.append((shape, combined, operation))
+
+    if combinations:
+        build_combinations(combinations, hub=hub)
+        logger.info(f"Converted {len(combinations)} corrective multiplyDivide setups on {hub} to "
+                    f"{fb.COMBINATION_NODE_TYPE} nodes")
+    return [combination[0] for combination in combinations]
+
+
+def get_combination_values(shape, controls, hub=FACS_HUB, preview=None):
+    """
+    blend node values keying the current pose of the controls on a combination shape
+
+    the pose is what the lower order shapes do at the current FACS_HUB weights (the combination itself left out)
+    plus the keyed delta, so the delta is the pose of the controls minus that evaluation
+
+    Args:
+        shape (str): combination shape, driven by its facsCombination node
+        controls (list): posed controls
+        preview (facs_preview_eval.FacsPreview): setup of the hub, extracted if None
+
+    Returns:
+        (dict blend node -> 9 values with rotations in degrees, driver value of the keys)
+    """
+    if preview is None:
+        preview = fp.extract_preview(hub)
+    if shape not in preview.shape_indices:
+        raise RuntimeError(f"Failed to find {shape} in the setup of {hub}")
+    shape_index = preview.shape_indices[shape]
+    if shape_index not in preview.correctives.corrective_shapes:
+        raise RuntimeError(f"{hub}.{shape} is not driven by a combination node")
+
+    mfn_hub = om.MFnDependencyNode(fb.get_node(hub))
+    weights = preview.get_weights([mfn_hub.findPlug(name, False).asDouble() for name in preview.shapes])
+    driver_value = float(weights[0, shape_index])
+    if driver_value <= 0.0:
+        raise RuntimeError(f"Set the shapes combined by {shape} before keying it, its weight is 0")
+
+    blend_nodes = [preview.outputs[preview.controls.index(control)] if control in preview.controls else
+                   control.replace("Control", "BlendNode") for control in controls]
+    targets = fdk.get_blend_node_values(controls, blend_nodes)
+    target_nodes = list(targets)
+    target_values = np.array([targets[blend_node] for blend_node in target_nodes], dtype=np.float64).reshape(-1, 9)
+    target_values[:, 3:6] = np.radians(target_values[:, 3:6])
+    output_indices = [preview.outputs.index(blend_node) if blend_node in preview.outputs else -1
+                      for blend_node in target_nodes]
+
+    values = fpe.get_combination_deltas(preview.table, weights[0], shape_index, target_values, output_indices)
+    values[:, 3:6] = np.degrees(values[:, 3:6])
+    key_values = {blend_node: tuple(node_values) for blend_node, node_values in zip(target_nodes, values.tolist())}
+    return key_values, driver_value
+
+
+def key_combination(shape, controls, hub=FACS_HUB):
+    """
+    key the current pose of the controls on a combination shape, neutral keys at 0 are added on the blend nodes
+    the shape did not drive yet
+
+    Returns:
+        number of keys written
+    """
+    preview = fp.extract_preview(hub)
+    key_values, driver_value = get_combination_values(shape, controls, hub=hub, preview=preview)
+
+    shape_index = preview.shape_indices[shape]
+    keyed_outputs = {preview.outputs[index] for index in
+                     np.unique(preview.table.entry_outputs[preview.table.entry_shapes == shape_index])}
+    driver_attr = f"{hub}.{shape}"
+    new_blend_nodes = [blend_node for blend_node in key_values if blend_node not in keyed_outputs]
+    key_count = 0
+    if new_blend_nodes:
+        key_count += fdk.write_driven_keys(driver_attr, {blend_node: fdk.NEUTRAL_VALUES
+                                                         for blend_node in new_blend_nodes}, driver_value=0.0)
+    key_count += fdk.write_driven_keys(driver_attr, key_values, driver_value=driver_value)
+    return key_count
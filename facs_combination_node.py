@@ -0,0 +1,109 @@
+import maya.api.OpenMaya as om
+
+"""
+facsCombination DG node, the weight of a corrective combination shape from any number of FACS_HUB shapes
+
+load with:
+    mc.loadPlugin("path/to/facs_combination_node.py")
+
+inputs:
+    input[]      FACS_HUB weights of the combined shapes
+    operation    0 product, 1 min, see facs_preview_eval.COMBINATION_OPERATIONS
+outputs:
+    output       the combination weight, connected to the FACS_HUB attribute of the combination shape
+
+one node replaces the chain of multiplyDivide nodes a combination of more than two shapes would need.
+"""
+
+
+def maya_useNewAPI():
+    pass
+
+
+def combine(values, operation):
+    """
+    scalar version of facs_preview_eval.CorrectiveTable.apply for one combination
+    """
+    if not values:
+        return 0.0
+    if operation == 1:
+        return min(values)
+    result = 1.0
+    for value in values:
+        result *= value
+    return result
+
+
+class FacsCombinationNode(om.MPxNode):
+
+    kNodeName = "facsCombination"
+    # id from the range reserved for local development, next to facsPoseBlend
+    kNodeId = om.MTypeId(0x0007F102)
+
+    input = None
+    operation = None
+    output = None
+
+    def __init__(self):
+        om.MPxNode.__init__(self)
+
+    @classmethod
+    def creator(cls):
+        return cls()
+
+    @classmethod
+    def initialize(cls):
+        numeric_attr = om.MFnNumericAttribute()
+        enum_attr = om.MFnEnumAttribute()
+
+        cls.input = numeric_attr.create("input", "i", om.MFnNumericData.kDouble, 0.0)
+        numeric_attr.array = True
+        numeric_attr.keyable = True
+
+        cls.operation = enum_attr.create("operation", "op", 0)
+        enum_attr.addField("product", 0)
+        enum_attr.addField("min", 1)
+        enum_attr.keyable = True
+
+        cls.output = numeric_attr.create("output", "out", om.MFnNumericData.kDouble, 0.0)
+        numeric_attr.writable = False
+        numeric_attr.storable = False
+
+        for attr in [cls.input, cls.operation, cls.output]:
+            cls.addAttribute(attr)
+
+        cls.attributeAffects(cls.input, cls.output)
+        cls.attributeAffects(cls.operation, cls.output)
+
+    def compute(self, plug, data_block):
+        if plug != FacsCombinationNode.output:
+            return None
+
+        input_handle = data_block.inputArrayValue(FacsCombinationNode.input)
+        values = []
+        for index in range(len(input_handle)):
+            input_handle.jumpToPhysicalElement(index)
+            values.append(input_handle.inputValue().asDouble())
+
+        operation = data_block.inputValue(FacsCombinationNode.operation).asShort()
+        data_block.outputValue(FacsCombinationNode.output).setDouble(combine(values, operation))
+        data_block.setClean(FacsCombinationNode.output)
+
+
+def initializePlugin(plugin):
+    plugin_fn = om.MFnPlugin(plugin, "Character-Rig", "1.0")
+    try:
+        plugin_fn.registerNode(FacsCombinationNode.kNodeName, FacsCombinationNode.kNodeId,
+                               FacsCombinationNode.creator, FacsCombinationNode.initialize)
+    except:
+        om.MGlobal.displayError(f"Failed to register node: {FacsCombinationNode.kNodeName}")
+        raise
+
+
+def uninitializePlugin(plugin):
+    plugin_fn = om.MFnPlugin(plugin)
+    try:
+        plugin_fn.deregisterNode(FacsCombinationNode.kNodeId)
+    except:
+        om.MGlobal.displayError(f"Failed to deregister node: {FacsCombinationNode.kNodeName}")
+        raise
@@ -0,0 +1,236 @@
+import logging
+import math
+import numpy as np
+import maya.api.OpenMaya as om
+import maya.api.OpenMayaAnim as oma
+import facs_transfer as ft
+import modifier_undo as mu
+
+"""
+bulk driven key writer for the FACS blend nodes
+
+setDrivenKeyframe resolves the plugs, looks for the curve and pushes an undo step for every attribute.
+here the key values of every blend node are computed first, then in three undoable passes:
+    1. create the missing animCurveUL/UA/UU curves (and blendWeighted nodes for attributes with several drivers)
+    2. make every connection in one modifier
+    3. add or update the keys with MFnAnimCurve
+the result is the same network setDrivenKeyframe builds:
+    driver -> animCurve -> blend node attribute                    one driver
+    driver -> animCurve -> blendWeighted.input[n] -> attribute     several drivers
+
+usage:
+    import facs_driven_keys as fdk
+    values = fdk.get_blend_node_values(controls, blend_nodes)
+    fdk.write_driven_keys("FACS_HUB.LeftBrowRaiser", values, driver_value=1.0)
+"""
+
+#initiate logging with module name
+logger = logging.getLogger(__name__)
+
+DRIVEN_ATTRIBUTES = ("translateX", "translateY", "translateZ", "rotateX", "rotateY", "rotateZ",
+                     "scaleX", "scaleY", "scaleZ")
+ANIM_CURVE_TYPES = {"translate": "animCurveUL", "rotate": "animCurveUA", "scale": "animCurveUU"}
+# translate, rotate (degrees), scale of a blend node at rest
+NEUTRAL_VALUES = (0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 1.0, 1.0, 1.0)
+
+
+def get_plug(attr):
+    selection_list = om.MSelectionList()
+    selection_list.add(attr)
+    return selection_list.getPlug(0)
+
+
+def get_dag_path(node):
+    selection_list = om.MSelectionList()
+    selection_list.add(node)
+    return selection_list.getDagPath(0)
+
+
+def get_blend_node_values(controls, blend_nodes):
+    """
+    translate/rotate/scale each blend node needs to hold its control's current world transform,
+    what FACS_setup.transferFromControlToBlendNode sets on the blend node
+
+    Args:
+        controls (list): controls
+        blend_nodes (list): blend node of each control
+
+    Returns:
+        dict of blend node -> 9 values, rotation in degrees
+    """
+    # every matrix read in one pass and decomposed at once
+    channels, _ = ft.get_blend_node_channels(controls, blend_nodes)
+    channels[:, 3:6] = np.degrees(channels[:, 3:6])
+    return {blend_node: tuple(values) for blend_node, values in zip(blend_nodes, channels.tolist())}
+
+
+def is_driven_by(curve_object, driver_plug):
+    input_plug = om.MFnDependencyNode(curve_object).findPlug("input", False)
+    source = input_plug.source()
+    return not source.isNull and source == driver_plug
+
+
+def find_driven_curve(driven_plug, driver_plug):
+    """
+    look for the curve linking the driver to the driven attribute
+
+    Returns:
+        (curve MObject or None, blendWeighted MObject or None, MPlug of the current direct source or None)
+        when the driven attribute is driven by something that is neither a curve nor a blendWeighted,
+        the curve is None and the source plug is returned so that the caller can skip it
+    """
+    source = driven_plug.source()
+    if source.isNull:
+        return None, None, None
+
+    source_node = source.node()
+    if source_node.hasFn(om.MFn.kAnimCurve):
+        return (source_node if is_driven_by(source_node, driver_plug) else None), None, source
+
+    if om.MFnDependencyNode(source_node).typeName == "blendWeighted":
+        inputs = om.MFnDependencyNode(source_node).findPlug("input", False)
+        for index in range(inputs.numConnectedElements()):
+            element_source = inputs.connectionByPhysicalIndex(index).source()
+            if not element_source.isNull and element_source.node().hasFn(om.MFn.kAnimCurve) and \
+                    is_driven_by(element_source.node(), driver_plug):
+                return element_source.node(), source_node, None
+        return None, source_node, None
+
+    return None, None, source
+
+
+def get_next_input_index(blend_weighted):
+    inputs = om.MFnDependencyNode(blend_weighted).findPlug("input", False)
+    indices = inputs.getExistingArrayAttributeIndices()
+    return max(indices) + 1 if indices else 0
+
+
+class AnimCurveKeys(object):
+    '''
+    key edits run through modifier_undo like a modifier, the MAnimCurveChange makes them undoable
+    '''
+
+    def __init__(self):
+        # (curve MObject, driver value, key value)
+        self.keys = []
+        # (curve MObject, MTimeArray or driver values, key values), whole curves keyed at once
+        self.batches = []
+        self.change = None
+
+    def add(self, curve_object, driver_value, value):
+        self.keys.append((curve_object, driver_value, value))
+
+    def add_keys(self, curve_object, inputs, values):
+        """
+        key a whole curve, an MTimeArray with an MDoubleArray of values goes through a single addKeys call
+        that replaces the keys in its range, driver values of a driven key curve are added key by key
+        """
+        self.batches.append((curve_object, inputs, values))
+
+    def doIt(self):
+        self.change = oma.MAnimCurveChange()
+        for curve_object, driver_value, value in self.keys:
+            mfn_curve = oma.MFnAnimCurve(curve_object)
+            index = mfn_curve.find(driver_value)
+            if index is None:
+                mfn_curve.addKey(driver_value, value, oma.MFnAnimCurve.kTangentLinear,
+                                 oma.MFnAnimCurve.kTangentLinear, self.change)
+            else:
+                mfn_curve.setValue(index, value, self.change)
+                mfn_curve.setInTangentType(index, oma.MFnAnimCurve.kTangentLinear, self.change)
+                mfn_curve.setOutTangentType(index, oma.MFnAnimCurve.kTangentLinear, self.change)
+        for curve_object, inputs, values in self.batches:
+            mfn_curve = oma.MFnAnimCurve(curve_object)
+            if isinstance(inputs, om.MTimeArray):
+                mfn_curve.addKeys(inputs, values, oma.MFnAnimCurve.kTangentLinear,
+                                  oma.MFnAnimCurve.kTangentLinear, False, self.change)
+                continue
+            for driver_value, value in zip(inputs, values):
+                mfn_curve.addKey(driver_value, value, oma.MFnAnimCurve.kTangentLinear,
+                                 oma.MFnAnimCurve.kTangentLinear, self.change)
+
+    def undoIt(self):
+        if self.change:
+            self.change.undoIt()
+
+
+def write_driven_keys(driver_attr, key_values, driver_value=1.0):
+    """
+    key every blend node attribute at the driver value, creating and connecting the curves that are missing
+
+    Args:
+        driver_attr (str): driver attribute, e.g. "FACS_HUB.LeftBrowRaiser"
+        key_values (dict): blend node -> 9 values (translate, rotate in degrees, scale)
+        driver_value (float): driver value of the keys
+
+    Returns:
+        number of keys written
+    """
+    mu.load_plugin()
+    driver_plug = get_plug(driver_attr)
+
+    # resolve what exists and what has to be created
+    create_modifier = om.MDGModifier()
+    targets = []
+    for blend_node, values in key_values.items():
+        mfn_blend = om.MFnDependencyNode(get_dag_path(blend_node).node())
+        for attr, value in zip(DRIVEN_ATTRIBUTES, values):
+            driven_plug = mfn_blend.findPlug(attr, False)
+            curve, blend_weighted, direct_source = find_driven_curve(driven_plug, driver_plug)
+            if curve is None and blend_weighted is None and direct_source is not None and \
+                    not direct_source.node().hasFn(om.MFn.kAnimCurve):
+                logger.warning(f"Skipped {blend_node}.{attr}, it is driven by {direct_source.name()}")
+                continue
+
+            target = {"plug": driven_plug, "curve": curve, "blend_weighted": blend_weighted,
+                      "direct_source": direct_source, "new_curve": False, "new_blend_weighted": False}
+            if curve is None:
+                curve_type = ANIM_CURVE_TYPES[attr[:-1]]
+                target["curve"] = create_modifier.createNode(curve_type)
+                create_modifier.renameNode(target["curve"], f"{blend_node}_{attr}")
+                target["new_curve"] = True
+                if blend_weighted is None and direct_source is not None:
+                    # second driver on this attribute, the curves get mixed by a blendWeighted like Maya does
+                    target["blend_weighted"] = create_modifier.createNode("blendWeighted")
+                    target["new_blend_weighted"] = True
+
+            key_value = math.radians(value) if attr.startswith("rotate") else value
+            targets.append((target, key_value))
+
+    mu.apply_modifier(create_modifier)
+
+    # single connection pass
+    connect_modifier = om.MDGModifier()
+    # blendWeighted -> next free input, shared by every attribute going through the same node in this call
+    next_indices = {}
+    for target, key_value in targets:
+        if not target["new_curve"]:
+            continue
+        mfn_curve = om.MFnDependencyNode(target["curve"])
+        connect_modifier.connect(driver_plug, mfn_curve.findPlug("input", False))
+        curve_output = mfn_curve.findPlug("output", False)
+
+        if target["blend_weighted"] is None:
+            connect_modifier.connect(curve_output, target["plug"])
+            continue
+
+        mfn_blend_weighted = om.MFnDependencyNode(target["blend_weighted"])
+        inputs = mfn_blend_weighted.findPlug("input", False)
+        if target["new_blend_weighted"]:
+            connect_modifier.disconnect(target["direct_source"], target["plug"])
+            connect_modifier.connect(target["direct_source"], inputs.elementByLogicalIndex(0))
+            connect_modifier.connect(mfn_blend_weighted.findPlug("output", False), target["plug"])
+            index = 1
+        else:
+            hash_code = om.MObjectHandle(target["blend_weighted"]).hashCode()
+            index = next_indices.get(hash_code, get_next_input_index(target["blend_weighted"]))
+            next_indices[hash_code] = index + 1
+        connect_modifier.connect(curve_output, inputs.elementByLogicalIndex(index))
+
+    mu.apply_modifier(connect_modifier)
+
+    keys = AnimCurveKeys()
+    for target, key_value in targets:
+        keys.add(target["curve"], driver_value, key_value)
+    mu.apply_modifier(keys)
+    return len(keys.keys)
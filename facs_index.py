@@ -0,0 +1,273 @@
+import json
+import logging
+import maya.api.OpenMaya as om
+import maya.cmds as mc
+import callback_registry as cbr
+
+"""
+bidirectional index between the FACS shapes and their controls, saved on FACS_HUB
+
+    FACS_HUB.shapeControlIndex    json string {shape: [controls]}
+
+the string is parsed once and kept with the reverse control -> shapes mapping, a lookup returns the cached index
+without reading the attribute. an attribute changed callback on the hub (setAttr, undo, redo, attribute removal)
+drops the cached index, the next lookup parses the string again. FACS_setup keeps it current when it keys shapes,
+and rebuild_index/verify_index recreate or check it from the driven key network for scenes made before the index.
+
+usage:
+    import facs_index as fi
+    fi.get_controls("LeftBrowRaiser")
+    fi.get_shapes("LeftBrowControl1")
+    fi.verify_index()
+"""
+
+#initiate logging with module name
+logger = logging.getLogger(__name__)
+
+FACS_HUB = "FACS_HUB"
+INDEX_ATTRIBUTE = "shapeControlIndex"
+
+
+class ShapeControlIndex(object):
+
+    def __init__(self, shape_controls=None):
+        # shape -> list of controls, in the order they were added
+        self.shape_controls = {}
+        # control -> set of shapes
+        self.control_shapes = {}
+        for shape, controls in (shape_controls or {}).items():
+            self.add(shape, controls)
+
+    def add(self, shape, controls):
+        shape_controls = self.shape_controls.setdefault(shape, [])
+        for control in controls:
+            self.control_shapes.setdefault(control, set()).add(shape)
+            if control not in shape_controls:
+                shape_controls.append(control)
+
+    def remove_shape(self, shape):
+        for control in self.shape_controls.pop(shape, []):
+            shapes = self.control_shapes.get(control)
+            if shapes is not None:
+                shapes.discard(shape)
+                if not shapes:
+                    del self.control_shapes[control]
+
+    def get_controls(self, shape):
+        return list(self.shape_controls.get(shape, []))
+
+    def get_shapes(self, control):
+        return sorted(self.control_shapes.get(control, []))
+
+    def has_shape(self, shape):
+        return shape in self.shape_controls
+
+    def to_string(self):
+        return json.dumps(self.shape_controls, sort_keys=True)
+
+
+# hub -> (MObjectHandle of the hub, ShapeControlIndex)
+_cache = {}
+# hash code of a hub -> (MObjectHandle of the hub, attribute changed callback id)
+_hub_callbacks = {}
+
+
+def get_hub_object(hub):
+    selection_list = om.MSelectionList()
+    selection_list.add(hub)
+    return selection_list.getDependNode(0)
+
+
+def get_cached_index(hub):
+    cached = _cache.get(hub)
+    if cached is None:
+        return None
+    # a new scene or a renamed hub leaves the handle on another node
+    handle, index = cached
+    if handle.isValid() and om.MFnDependencyNode(handle.object()).name() == hub:
+        return index
+    del _cache[hub]
+    return None
+
+
+def index_changed_callback(message, plug, other_plug, clientData):
+    if om.MFnAttribute(plug.attribute()).name != INDEX_ATTRIBUTE:
+        return
+    node = plug.node()
+    for hub in [hub for hub, (handle, index) in _cache.items() if handle.isValid() and handle.object() == node]:
+        del _cache[hub]
+
+
+def watch_hub(hub_object):
+    # one callback per hub, the registry removes it with the scene so it is installed again on the next lookup
+    handle = om.MObjectHandle(hub_object)
+    watched = _hub_callbacks.get(handle.hashCode())
+    if watched and watched[0].isValid() and watched[0].object() == hub_object and \
+            watched[1] in cbr.get_callbacks_on_node(hub_object):
+        return
+    _hub_callbacks[handle.hashCode()] = (handle, cbr.register_callback(
+        lambda callback: om.MNodeMessage.addAttributeChangedCallback(hub_object, callback),
+        index_changed_callback, name="facs_index.index_changed", node=hub_object))
+
+
+def cache_index(index, hub):
+    hub_object = get_hub_object(hub)
+    watch_hub(hub_object)
+    _cache[hub] = (om.MObjectHandle(hub_object), index)
+
+
+def read_index_string(hub=FACS_HUB):
+    if not mc.attributeQuery(INDEX_ATTRIBUTE, node=hub, exists=True):
+        return None
+    return mc.getAttr(f"{hub}.{INDEX_ATTRIBUTE}") or ""
+
+
+def get_index(hub=FACS_HUB):
+    """
+    the index stored on the hub, rebuilt from the driven key network when the hub has none yet
+
+    Returns:
+        ShapeControlIndex
+    """
+    index = get_cached_index(hub)
+    if index is not None:
+        return index
+
+    stored = read_index_string(hub)
+    if stored is None:
+        logger.info(f"{hub} has no shape control index, building it from the driven keys")
+        return rebuild_index(hub)
+
+    index = ShapeControlIndex(json.loads(stored) if stored else {})
+    cache_index(index, hub)
+    return index
+
+
+def save_index(index, hub=FACS_HUB):
+    if not mc.attributeQuery(INDEX_ATTRIBUTE, node=hub, exists=True):
+        mc.addAttr(hub, longName=INDEX_ATTRIBUTE, dataType="string")
+    mc.setAttr(f"{hub}.{INDEX_ATTRIBUTE}", index.to_string(), type="string")
+    # after the setAttr, its attribute changed callback drops the previous index
+    cache_index(index, hub)
+
+
+def clear_cache():
+    _cache.clear()
+
+
+def get_controls(shape, hub=FACS_HUB):
+    return get_index(hub).get_controls(shape)
+
+
+def get_shapes(control, hub=FACS_HUB):
+    return get_index(hub).get_shapes(control)
+
+
+def add_controls(shape, controls, hub=FACS_HUB):
+    index = get_index(hub)
+    index.add(shape, controls)
+    save_index(index, hub)
+
+
+def remove_shape(shape, hub=FACS_HUB):
+    index = get_index(hub)
+    index.remove_shape(shape)
+    save_index(index, hub)
+
+
+def get_blend_node_control(blend_node):
+    # the control is the transform child of its blend node, see FACS_setup.createBlendNode
+    children = mc.listRelatives(blend_node, children=True, type="transform") or []
+    return children[0] if children else None
+
+
+def traverse_shape_controls(hub=FACS_HUB):
+    """
+    find the controls of every shape by walking the driven key network,
+    FACS_HUB.shape -> animCurve -> (blendWeighted) -> blend node -> control, or the facsPoseBlend table
+
+    Returns:
+        dict shape -> list of controls
+    """
+    selection_list = om.MSelectionList()
+    selection_list.add(hub)
+    mfn_hub = om.MFnDependencyNode(selection_list.getDependNode(0))
+    shapes = [shape for shape in mc.listAttr(hub, userDefined=True, scalar=True) or [] if shape != INDEX_ATTRIBUTE]
+
+    shape_blend_nodes = {}
+    for shape in shapes:
+        if not mfn_hub.hasAttribute(shape):
+            continue
+        blend_nodes = shape_blend_nodes.setdefault(shape, [])
+        for destination in mfn_hub.findPlug(shape, False).destinations():
+            curve_object = destination.node()
+            if not curve_object.hasFn(om.MFn.kAnimCurve):
+                continue
+            for curve_destination in om.MFnDependencyNode(curve_object).findPlug("output", False).destinations():
+                driven_node = curve_destination.node()
+                if om.MFnDependencyNode(driven_node).typeName == "blendWeighted":
+                    driven_nodes = [plug.node() for plug in
+                                    om.MFnDependencyNode(driven_node).findPlug("output", False).destinations()]
+                else:
+                    driven_nodes = [driven_node]
+                for node in driven_nodes:
+                    if node.hasFn(om.MFn.kTransform):
+                        name = om.MFnDagNode(node).partialPathName()
+                        if name not in blend_nodes:
+                            blend_nodes.append(name)
+
+    # shapes moved to a facsPoseBlend node, see facs_blend.migrate_facs_hub
+    for pose_blend in mc.listConnections(hub, source=False, destination=True, type="facsPoseBlend") or []:
+        table_shapes = mc.getAttr(f"{pose_blend}.shapeNames") or []
+        outputs = mc.getAttr(f"{pose_blend}.outputNames") or []
+        entry_outputs = mc.getAttr(f"{pose_blend}.entryOutput") or []
+        entry_shapes = mc.getAttr(f"{pose_blend}.entryShape") or []
+        for output_index, shape_index in zip(entry_outputs, entry_shapes):
+            blend_nodes = shape_blend_nodes.setdefault(table_shapes[shape_index], [])
+            if outputs[output_index] not in blend_nodes:
+                blend_nodes.append(outputs[output_index])
+
+    shape_controls = {}
+    for shape, blend_nodes in shape_blend_nodes.items():
+        controls = [get_blend_node_control(blend_node) for blend_node in blend_nodes]
+        shape_controls[shape] = [control for control in controls if control]
+    return shape_controls
+
+
+def rebuild_index(hub=FACS_HUB):
+    """
+    recreate the index of the hub from the driven key network
+
+    Returns:
+        ShapeControlIndex
+    """
+    index = ShapeControlIndex(traverse_shape_controls(hub))
+    save_index(index, hub)
+    return index
+
+
+def verify_index(hub=FACS_HUB, fix=False):
+    """
+    compare the stored index with the driven key network
+
+    Args:
+        hub (str): FACS hub node
+        fix (bool): rebuild the index when they differ
+
+    Returns:
+        dict shape -> {"missing": controls not in the index, "extra": controls the network does not drive}
+    """
+    index = get_index(hub)
+    traversed = traverse_shape_controls(hub)
+    report = {}
+    for shape in set(index.shape_controls) | set(traversed):
+        stored = set(index.get_controls(shape))
+        found = set(traversed.get(shape, []))
+        if stored != found:
+            report[shape] = {"missing": sorted(found - stored), "extra": sorted(stored - found)}
+
+    if report:
+        logger.warning(f"Shape control index of {hub} differs from the network on {len(report)} shapes")
+        if fix:
+            rebuild_index(hub)
+    return report
@@ -0,0 +1,118 @@
+import logging
+import time
+import numpy as np
+import maya.api.OpenMaya as om
+import facs_blend as fb
+import facs_blend_eval as fbe
+import facs_index as fi
+import facs_preview_eval as fpe
+
+"""
+extract a FACS setup once and evaluate it outside the DG, see facs_preview_eval.py
+
+    extract_preview     reads the driven keys (or the facsPoseBlend table), the correctives and the blend node /
+                        control matrices into a FacsPreview
+    verify_preview      drives FACS_HUB through test poses and compares the preview with the DG
+
+usage:
+    import facs_preview as fp
+    preview = fp.extract_preview()
+    fp.verify_preview(preview)
+    matrices = preview.evaluate_matrices(weights)    # (frames, shapes) weights, no DG evaluation
+    fp.fpe.save_preview("face_preview.npz", preview)
+"""
+
+#initiate logging with module name
+logger = logging.getLogger(__name__)
+
+FACS_HUB = "FACS_HUB"
+
+
+def get_matrices(blend_nodes, controls):
+    """
+    Returns:
+        ((B, 4, 4) blend node parent world matrices, (B, 4, 4) control local matrices)
+    """
+    parent_matrices = np.tile(np.identity(4), (len(blend_nodes), 1, 1))
+    control_matrices = np.tile(np.identity(4), (len(blend_nodes), 1, 1))
+    for index, (blend_node, control) in enumerate(zip(blend_nodes, controls)):
+        selection_list = om.MSelectionList()
+        selection_list.add(blend_node)
+        parent_matrices[index] = np.array(selection_list.getDagPath(0).exclusiveMatrix()).reshape(4, 4)
+        if control:
+            selection_list.add(control)
+            control_matrices[index] = np.array(
+                om.MFnDagNode(selection_list.getDagPath(1)).transformationMatrix()).reshape(4, 4)
+    return parent_matrices, control_matrices
+
+
+def extract_preview(hub=FACS_HUB):
+    """
+    read everything the preview needs in one pass over the FACS setup
+
+    Returns:
+        facs_preview_eval.FacsPreview
+    """
+    start_time = time.perf_counter()
+    pose_blend = fb.get_pose_blend(hub)
+    data = fb.read_pose_blend(pose_blend) if pose_blend else fb.extract_pose_table(hub)
+    if not data["outputs"]:
+        raise RuntimeError(f"Failed to find driven keys from {hub} to any blend node")
+
+    correctives = fpe.CorrectiveTable(*fb.extract_correctives(data["shapes"], hub=hub))
+    controls = [fi.get_blend_node_control(blend_node) or "" for blend_node in data["outputs"]]
+    parent_matrices, control_matrices = get_matrices(data["outputs"], controls)
+
+    preview = fpe.FacsPreview(data["table"], data["shapes"], data["outputs"], controls, correctives,
+                              parent_matrices, control_matrices)
+    logger.info(f"Extracted {len(preview.shapes)} shapes ({len(correctives)} correctives), "
+                f"{len(preview.outputs)} blend nodes from {hub} in {time.perf_counter() - start_time:.3f}s")
+    return preview
+
+
+def verify_preview(preview, hub=FACS_HUB, rotate_blend="euler", random_poses=20, tolerance=1e-4):
+    """
+    drive FACS_HUB through test poses and compare the preview with the blend node channels
+
+    the non corrective shape attributes are set through their plugs and restored afterwards, their inputs
+    are disconnected for the time of the test, the correctives are computed by the DG and by the preview
+
+    Returns:
+        (max absolute difference, number of poses tested)
+    """
+    mfn_hub = om.MFnDependencyNode(fb.get_node(hub))
+    shape_plugs = [mfn_hub.findPlug(shape, False) for shape in preview.shapes]
+    blend_plugs = []
+    for blend_node in preview.outputs:
+        mfn_blend = om.MFnDependencyNode(fb.get_node(blend_node))
+        blend_plugs.extend(mfn_blend.findPlug(channel, False) for channel in fbe.CHANNELS)
+
+    settable = np.ones(len(shape_plugs), dtype=bool)
+    settable[preview.correctives.corrective_shapes] = False
+    modifier = om.MDGModifier()
+    for plug, can_set in zip(shape_plugs, settable):
+        source = plug.source()
+        if can_set and not source.isNull:
+            modifier.disconnect(source, plug)
+    modifier.doIt()
+
+    original_values = [plug.asDouble() for plug in shape_plugs]
+    poses = fb.get_test_poses(len(shape_plugs), settable, random_poses=random_poses)
+    expected = preview.evaluate_channels(poses, rotate_blend=rotate_blend).reshape(len(poses), -1)
+    max_difference = 0.0
+    try:
+        for pose, pose_expected in zip(poses, expected):
+            for plug, value, can_set in zip(shape_plugs, pose, settable):
+                if can_set:
+                    plug.setDouble(float(value))
+            difference = np.abs(fb.read_channels(blend_plugs) - pose_expected)
+            max_difference = max(max_difference, float(difference.max()) if len(difference) else 0.0)
+    finally:
+        for plug, value, can_set in zip(shape_plugs, original_values, settable):
+            if can_set:
+                plug.setDouble(value)
+        modifier.undoIt()
+
+    if max_difference > tolerance:
+        logger.warning(f"Preview differs from {hub} by {max_difference} over {len(poses)} poses")
+    return max_difference, len(poses)
@@ -0,0 +1,314 @@
+import numpy as np
+import facs_blend_eval as fbe
+
+"""
+Maya-free preview of a whole FACS setup, extracted once by facs_preview.extract_preview
+
+    FACS_HUB weights -> corrective weights -> blend node channels -> control matrices
+
+correctives are the FACS_HUB combination shapes driven by the product or the min of other shapes (see
+facs_combination.py), their columns of the weight matrix are recomputed from their inputs the way the
+facsCombination / multiplyDivide nodes do.
+the blend node channels come from the PoseTable (see facs_blend_eval.py), the controls are children of their
+blend node so their matrices are the control local matrix, the blend node matrix and the blend node parent matrix.
+
+usage:
+    preview = facs_preview_eval.load_preview("face_preview.npz")
+    channels = preview.evaluate_channels(weights)    # (frames, shapes) -> (frames, blend nodes, 9)
+    matrices = preview.evaluate_matrices(weights)    # (frames, shapes) -> (frames, controls, 4, 4) world matrices
+"""
+
+MATRIX_SPACES = ("world", "local")
+# facsCombination.operation, see facs_combination_node.py
+COMBINATION_OPERATIONS = ("product", "min")
+COMBINATION_UFUNCS = (np.multiply, np.minimum)
+# blend node channels at rest, the first key of the curves a shape adds (facs_driven_keys.NEUTRAL_VALUES)
+NEUTRAL_CHANNELS = (0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 1.0, 1.0, 1.0)
+
+
+def compose_matrices(channels):
+    """
+    transform matrices of translate / rotate / scale channels, xyz rotate order, no pivots or shear
+
+    Args:
+        channels (array_like): (..., 9) tx ty tz rx ry rz sx sy sz, rotations in radians
+
+    Returns:
+        (..., 4, 4) matrices, row vectors like MMatrix
+    """
+    channels = np.asarray(channels, dtype=np.float64)
+    cos, sin = np.cos(channels[..., 3:6]), np.sin(channels[..., 3:6])
+    cx, cy, cz = cos[..., 0], cos[..., 1], cos[..., 2]
+    sx, sy, sz = sin[..., 0], sin[..., 1], sin[..., 2]
+
+    # Rx * Ry * Rz, x applied first
+    matrices = np.zeros(channels.shape[:-1] + (4, 4))
+    matrices[..., 0, 0] = cy * cz
+    matrices[..., 0, 1] = cy * sz
+    matrices[..., 0, 2] = -sy
+    matrices[..., 1, 0] = sx * sy * cz - cx * sz
+    matrices[..., 1, 1] = sx * sy * sz + cx * cz
+    matrices[..., 1, 2] = sx * cy
+    matrices[..., 2, 0] = cx * sy * cz + sx * sz
+    matrices[..., 2, 1] = cx * sy * sz - sx * cz
+    matrices[..., 2, 2] = cx * cy
+    matrices[..., :3, :3] *= channels[..., 6:9, np.newaxis]
+    matrices[..., 3, :3] = channels[..., 0:3]
+    matrices[..., 3, 3] = 1.0
+    return matrices
+
+
+def decompose_matrices(matrices):
+    """
+    translate / rotate / scale channels of transform matrices, the inverse of compose_matrices
+
+    Args:
+        matrices (array_like): (..., 4, 4) matrices without shear, row vectors like MMatrix
+
+    Returns:
+        (..., 9) tx ty tz rx ry rz sx sy sz, rotations in radians
+    """
+    matrices = np.asarray(matrices, dtype=np.float64)
+    scale = np.linalg.norm(matrices[..., :3, :3], axis=-1)
+    rotation = matrices[..., :3, :3] / np.maximum(scale[..., np.newaxis], 1e-12)
+    # negative determinant, the flip goes on the x scale like MTransformationMatrix
+    flipped = np.linalg.det(rotation) < 0.0
+    scale[..., 0] = np.where(flipped, -scale[..., 0], scale[..., 0])
+    rotation[..., 0, :] = np.where(flipped[..., np.newaxis], -rotation[..., 0, :], rotation[..., 0, :])
+
+    channels = np.empty(matrices.shape[:-2] + (9,))
+    channels[..., 0:3] = matrices[..., 3, :3]
+    channels[..., 3] = np.arctan2(rotation[..., 1, 2], rotation[..., 2, 2])
+    channels[..., 4] = np.arcsin(np.clip(-rotation[..., 0, 2], -1.0, 1.0))
+    channels[..., 5] = np.arctan2(rotation[..., 0, 1], rotation[..., 0, 0])
+    # gimbal lock, y at +-90 degrees: put the whole rotation on x
+    locked = np.abs(rotation[..., 0, 2]) > 1.0 - 1e-9
+    if np.any(locked):
+        channels[..., 3] = np.where(locked, np.arctan2(-rotation[..., 2, 1], rotation[..., 1, 1]), channels[..., 3])
+        channels[..., 5] = np.where(locked, 0.0, channels[..., 5])
+    channels[..., 6:9] = scale
+    return channels
+
+
+class CorrectiveTable(object):
+
+    def __init__(self, corrective_shapes, input_starts, input_shapes, operations=None):
+        """
+        Args:
+            corrective_shapes (array_like): (C,) shape index of each corrective
+            input_starts (array_like): (C + 1,) the inputs of corrective c are input_starts[c]:input_starts[c + 1]
+            input_shapes (array_like): (I,) shape index of each input, every corrective has at least one
+            operations (array_like): (C,) COMBINATION_OPERATIONS index of each corrective, all products if None
+        """
+        self.corrective_shapes = np.asarray(corrective_shapes, dtype=np.int64)
+        self.input_starts = np.asarray(input_starts, dtype=np.int64)
+        self.input_shapes = np.asarray(input_shapes, dtype=np.int64)
+        if operations is None:
+            operations = np.zeros(len(self.corrective_shapes))
+        self.operations = np.asarray(operations, dtype=np.int64)
+
+        # correctives of correctives are evaluated after their inputs, one level and operation at a time
+        corrective_count = len(self.corrective_shapes)
+        corrective_indices = {shape: index for index, shape in enumerate(self.corrective_shapes.tolist())}
+        depths = [None] * corrective_count
+
+        def get_depth(index, visiting):
+            if depths[index] is None:
+                if index in visiting:
+                    raise ValueError(f"Corrective shape {self.corrective_shapes[index]} depends on itself")
+                visiting.add(index)
+                inputs = self.input_shapes[self.input_starts[index]:self.input_starts[index + 1]].tolist()
+                depths[index] = 1 + max([get_depth(corrective_indices[shape], visiting)
+                                         for shape in inputs if shape in corrective_indices] or [-1])
+            return depths[index]
+
+        self.levels = []
+        if corrective_count:
+            depths = np.array([get_depth(index, set()) for index in range(corrective_count)])
+            for depth in range(int(depths.max()) + 1):
+                for operation in np.unique(self.operations[depths == depth]):
+                    indices = np.nonzero((depths == depth) & (self.operations == operation))[0]
+                    inputs = np.concatenate([self.input_shapes[self.input_starts[index]:
+                                                               self.input_starts[index + 1]] for index in indices])
+                    counts = self.input_starts[indices + 1] - self.input_starts[indices]
+                    starts = np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int64)
+                    self.levels.append((self.corrective_shapes[indices], inputs, starts,
+                                        COMBINATION_UFUNCS[operation]))
+
+    def __len__(self):
+        return len(self.corrective_shapes)
+
+    def apply(self, weights):
+        """
+        recompute the corrective columns from their inputs
+
+        Args:
+            weights (array_like): (F, S) weights
+
+        Returns:
+            (F, S) weights, a copy
+        """
+        weights = np.array(weights, dtype=np.float64, ndmin=2)
+        for shapes, inputs, starts, ufunc in self.levels:
+            weights[:, shapes] = ufunc.reduceat(weights[:, inputs], starts, axis=1)
+        return weights
+
+
+class FacsPreview(object):
+
+    def __init__(self, table, shapes, outputs, controls, correctives, parent_matrices, control_matrices):
+        """
+        Args:
+            table (fbe.PoseTable): FACS_HUB shapes to blend node channels
+            shapes (list): FACS_HUB attribute of each shape index
+            outputs (list): blend node of each output index
+            controls (list): control of each output index, child of the blend node
+            correctives (CorrectiveTable): corrective shapes and their inputs
+            parent_matrices (array_like): (B, 4, 4) world matrix of the parent of each blend node
+            control_matrices (array_like): (B, 4, 4) local matrix of each control
+        """
+        self.table = table
+        self.shapes = list(shapes)
+        self.outputs = list(outputs)
+        self.controls = list(controls)
+        self.correctives = correctives
+        self.parent_matrices = np.asarray(parent_matrices, dtype=np.float64).reshape(-1, 4, 4)
+        self.control_matrices = np.asarray(control_matrices, dtype=np.float64).reshape(-1, 4, 4)
+        self.shape_indices = {shape: index for index, shape in enumerate(self.shapes)}
+
+    def get_weights(self, weights, shapes=None):
+        """
+        full weight matrix with the correctives resolved
+
+        Args:
+            weights (array_like): (F, N) or (N,) weights
+            shapes (list): FACS_HUB attribute of each column, every shape in shape index order if None
+
+        Returns:
+            (F, S) weights
+        """
+        weights = np.array(weights, dtype=np.float64, ndmin=2)
+        if shapes is not None:
+            columns = [self.shape_indices[shape] for shape in shapes]
+            full_weights = np.zeros((len(weights), len(self.shapes)))
+            full_weights[:, columns] = weights
+            weights = full_weights
+        elif weights.shape[1] != len(self.shapes):
+            raise ValueError(f"Expected {len(self.shapes)} weight columns, got {weights.shape[1]}")
+        return self.correctives.apply(weights)
+
+    def evaluate_channels(self, weights, shapes=None, rotate_blend="euler"):
+        """
+        blend node channels for every frame
+
+        Returns:
+            (F, B, 9) or (B, 9) channel values, rotations in radians
+        """
+        single = np.ndim(weights) == 1
+        channels = self.table.evaluate(self.get_weights(weights, shapes), rotate_blend=rotate_blend)
+        return channels[0] if single else channels
+
+    def evaluate_matrices(self, weights, shapes=None, rotate_blend="euler", space="world"):
+        """
+        control matrices for every frame
+
+        Args:
+            weights (array_like): (F, N) or (N,) weights
+            shapes (list): FACS_HUB attribute of each column, every shape if None
+            rotate_blend (str): "euler" or "quaternion", see facs_blend_eval.PoseTable.evaluate
+            space (str): "world", or "local" to the parent of the blend node
+
+        Returns:
+            (F, B, 4, 4) or (B, 4, 4) matrices
+        """
+        if space not in MATRIX_SPACES:
+            raise ValueError(f"Invalid space: {space}")
+        single = np.ndim(weights) == 1
+        channels = self.table.evaluate(self.get_weights(weights, shapes), rotate_blend=rotate_blend)
+        matrices = self.control_matrices @ compose_matrices(channels)
+        if space == "world":
+            matrices = matrices @ self.parent_matrices
+        return matrices[0] if single else matrices
+
+    def evaluate_positions(self, weights, shapes=None, rotate_blend="euler"):
+        """
+        world position of every control, (F, B, 3) or (B, 3)
+        """
+        return self.evaluate_matrices(weights, shapes=shapes, rotate_blend=rotate_blend)[..., 3, :3]
+
+
+def get_combination_deltas(table, weights, shape_index, targets, output_indices):
+    """
+    channel values to key on a combination shape so the blend nodes reach the targets at the current weights
+
+    the lower order shapes are evaluated with the combination at 0, the curves it keys start from their first key
+    (the neutral channels for new curves) so the value is the target minus the evaluation plus that first key
+
+    Args:
+        table (facs_blend_eval.PoseTable): pose table of the setup
+        weights (array_like): (S,) weights, correctives applied
+        shape_index (int): shape index of the combination
+        targets (array_like): (N, 9) blend node channels to reach, rotations in radians
+        output_indices (array_like): (N,) table output of each target, -1 for blend nodes nothing drives yet
+
+    Returns:
+        (N, 9) values, rotations in radians
+    """
+    weights = np.array(weights, dtype=np.float64, ndmin=2)[:1]
+    weights[0, shape_index] = 0.0
+    base = table.evaluate(weights)[0]
+    entries = np.nonzero(table.entry_shapes == shape_index)[0]
+    offsets = np.where(table.driven.reshape(-1, 9), np.asarray(NEUTRAL_CHANNELS), base)
+    offsets[table.entry_outputs[entries], table.entry_channels[entries]] = \
+        table.evaluate_entries(np.zeros((1, table.shape_count)))[0, entries]
+
+    targets = np.array(targets, dtype=np.float64).reshape(-1, 9)
+    output_indices = np.asarray(output_indices, dtype=np.int64)
+    # nothing drives the blend node yet, the new curves hold the whole pose
+    known = output_indices >= 0
+    targets[known] += offsets[output_indices[known]] - base[output_indices[known]]
+    return targets
+
+
+def pack_preview(preview):
+    table = preview.table
+    correctives = preview.correctives
+    return {"shapes": np.array(preview.shapes, dtype=str),
+            "outputs": np.array(preview.outputs, dtype=str),
+            "controls": np.array(preview.controls, dtype=str),
+            "entry_outputs": table.entry_outputs, "entry_channels": table.entry_channels,
+            "entry_shapes": table.entry_shapes, "key_starts": table.key_starts,
+            "key_inputs": table.key_inputs, "key_values": table.key_values, "rest_values": table.rest_values,
+            "corrective_shapes": correctives.corrective_shapes, "corrective_starts": correctives.input_starts,
+            "corrective_inputs": correctives.input_shapes, "corrective_operations": correctives.operations,
+            "parent_matrices": preview.parent_matrices, "control_matrices": preview.control_matrices}
+
+
+def unpack_preview(packed):
+    shapes = [str(shape) for shape in packed["shapes"]]
+    table = fbe.PoseTable(packed["entry_outputs"], packed["entry_channels"], packed["entry_shapes"],
+                          packed["key_starts"], packed["key_inputs"], packed["key_values"], packed["rest_values"],
+                          shape_count=len(shapes))
+    # previews saved before the min operation have products only
+    operations = packed["corrective_operations"] if "corrective_operations" in packed else None
+    correctives = CorrectiveTable(packed["corrective_shapes"], packed["corrective_starts"],
+                                  packed["corrective_inputs"], operations)
+    return FacsPreview(table, shapes, [str(output) for output in packed["outputs"]],
+                       [str(control) for control in packed["controls"]], correctives,
+                       packed["parent_matrices"], packed["control_matrices"])
+
+
+def save_preview(filepath, preview):
+    """
+    save an extracted preview to a .npz file, it loads without Maya
+    """
+    np.savez_compressed(filepath, **pack_preview(preview))
+
+
+def load_preview(filepath):
+    """
+    Returns:
+        FacsPreview
+    """
+    with np.load(filepath) as packed:
+        return unpack_preview(packed)
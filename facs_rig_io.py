@@ -0,0 +1,332 @@
+import logging
+import time
+import numpy as np
+import maya.api.OpenMaya as om
+import maya.cmds as mc
+import facs_blend as fb
+import facs_blend_eval as fbe
+import facs_combination as fc
+import facs_driven_keys as fdk
+import facs_index as fi
+import modifier_undo as mu
+
+"""
+export a whole FACS setup into one columnar .npz file and rebuild it in batched modifier passes
+
+the file holds flat arrays, no per shape records:
+    shapes                           FACS_HUB attributes
+    outputs, output_controls         blend nodes and their controls
+    entry_* / key_* / rest_values    the driven keys as a facs_blend_eval.PoseTable
+    corrective_*                     combination shapes, see facs_preview_eval.CorrectiveTable
+    index_starts, index_controls     the shape control index, see facs_index.py
+
+import_facs_rig rebuilds FACS_HUB from it:
+    1. one modifier adds the missing shape attributes, deletes the old network and creates every curve,
+       blendWeighted and facsCombination node
+    2. one modifier makes every connection
+    3. the keys of every curve in one undoable MAnimCurveChange
+or, with network="pose_blend", a facsPoseBlend node (see facs_blend.py) instead of the curves.
+
+usage:
+    import facs_rig_io as fio
+    fio.export_facs_rig("face_rig.npz")
+    fio.import_facs_rig("face_rig.npz")
+"""
+
+#initiate logging with module name
+logger = logging.getLogger(__name__)
+
+FACS_HUB = "FACS_HUB"
+FORMAT_VERSION = 1
+NETWORK_TYPES = ("curves", "pose_blend")
+
+
+def pack_rig(data, corrective_data, shape_controls):
+    """
+    columnar arrays of a FACS setup
+
+    Args:
+        data (dict): "table", "shapes" and "outputs", see facs_blend.extract_pose_table
+        corrective_data (tuple): see facs_blend.extract_correctives
+        shape_controls (dict): shape -> list of controls
+
+    Returns:
+        dict of arrays for np.savez_compressed
+    """
+    table = data["table"]
+    corrective_shapes, corrective_starts, corrective_inputs, corrective_operations = corrective_data
+    index_controls = [shape_controls.get(shape, []) for shape in data["shapes"]]
+    return {"version": np.array(FORMAT_VERSION),
+            "shapes": np.array(data["shapes"], dtype=str),
+            "outputs": np.array(data["outputs"], dtype=str),
+            "output_controls": np.array([fi.get_blend_node_control(output) or "" for output in data["outputs"]],
+                                        dtype=str),
+            "entry_outputs": table.entry_outputs, "entry_channels": table.entry_channels,
+            "entry_shapes": table.entry_shapes, "key_starts": table.key_starts,
+            "key_inputs": table.key_inputs, "key_values": table.key_values, "rest_values": table.rest_values,
+            "corrective_shapes": np.array(corrective_shapes, dtype=np.int64),
+            "corrective_starts": np.array(corrective_starts, dtype=np.int64),
+            "corrective_inputs": np.array(corrective_inputs, dtype=np.int64),
+            "corrective_operations": np.array(corrective_operations, dtype=np.int64),
+            "index_starts": np.concatenate([[0], np.cumsum([len(controls) for controls in index_controls])])
+            .astype(np.int64),
+            "index_controls": np.array([control for controls in index_controls for control in controls], dtype=str)}
+
+
+def unpack_rig(packed):
+    version = int(packed["version"])
+    if version > FORMAT_VERSION:
+        raise RuntimeError(f"FACS rig file version {version} is newer than the supported {FORMAT_VERSION}")
+    rig = {key: packed[key] for key in packed.files}
+    for key in ("shapes", "outputs", "output_controls", "index_controls"):
+        rig[key] = [str(value) for value in rig[key]]
+    rig["table"] = fbe.PoseTable(rig["entry_outputs"], rig["entry_channels"], rig["entry_shapes"],
+                                 rig["key_starts"], rig["key_inputs"], rig["key_values"], rig["rest_values"],
+                                 shape_count=len(rig["shapes"]))
+    starts = rig["index_starts"]
+    rig["shape_controls"] = {shape: rig["index_controls"][starts[index]:starts[index + 1]]
+                             for index, shape in enumerate(rig["shapes"]) if starts[index + 1] > starts[index]}
+    return rig
+
+
+def export_facs_rig(filepath, hub=FACS_HUB):
+    """
+    save every shape of FACS_HUB, its driven keys, controls and combinations in one file
+
+    Args:
+        filepath (str): .npz path
+
+    Returns:
+        number of exported shapes
+    """
+    pose_blend = fb.get_pose_blend(hub)
+    data = fb.read_pose_blend(pose_blend) if pose_blend else fb.extract_pose_table(hub)
+    packed = pack_rig(data, fb.extract_correctives(data["shapes"], hub=hub), fi.get_index(hub).shape_controls)
+    np.savez_compressed(filepath, **packed)
+    print(f"{len(data['shapes'])} FACS shapes exported to {filepath} successfully")
+    return len(data["shapes"])
+
+
+def load_facs_rig(filepath):
+    """
+    Returns:
+        dict of the file columns, plus "table" (PoseTable) and "shape_controls" (dict shape -> controls)
+    """
+    with np.load(filepath) as packed:
+        return unpack_rig(packed)
+
+
+def get_shape_attribute(attr_name):
+    numeric_attr = om.MFnNumericAttribute()
+    attr = numeric_attr.create(attr_name, attr_name, om.MFnNumericData.kFloat, 0.0)
+    numeric_attr.setMin(0.0)
+    numeric_attr.setMax(1.0)
+    numeric_attr.keyable = True
+    return attr
+
+
+def disconnect_source(modifier, plug):
+    # inputs left by replace=False or made outside the FACS setup
+    source = plug.source()
+    if not source.isNull:
+        modifier.disconnect(source, plug)
+
+
+def get_old_network(hub, shapes):
+    """
+    nodes of the current setup of the hub that the import replaces
+
+    Returns:
+        list of MObjects
+    """
+    nodes = []
+    pose_blend = fb.get_pose_blend(hub)
+    if pose_blend:
+        nodes.append(fb.get_node(pose_blend))
+    data = fb.extract_pose_table(hub)
+    nodes += data["curves"] + data["blend_weighted"]
+
+    hub_mobject = fb.get_node(hub)
+    mfn_hub = om.MFnDependencyNode(hub_mobject)
+    for shape in shapes:
+        if not mfn_hub.hasAttribute(shape):
+            continue
+        source = mfn_hub.findPlug(shape, False).source()
+        if not source.isNull and fb.is_corrective_source(source.node()):
+            nodes += [source.node()] + fb.get_combination_inputs(source.node(), hub_mobject)[2]
+    return nodes
+
+
+def import_facs_rig(filepath, hub=FACS_HUB, network="curves", replace=True):
+    """
+    rebuild the FACS_HUB network of an exported rig, the blend nodes and controls must exist in the scene
+
+    Args:
+        filepath (str): file written by export_facs_rig
+        hub (str): FACS hub node, created as a network node if missing
+        network (str): "curves" for the driven keys network, "pose_blend" for a facsPoseBlend node
+        replace (bool): delete the current curves, blendWeighted, combination and facsPoseBlend nodes of the hub
+
+    Returns:
+        dict with "shapes", "curves" and "keys" counts and the "missing" blend nodes
+    """
+    if network not in NETWORK_TYPES:
+        raise ValueError(f"Invalid network type: {network}")
+    start_time = time.perf_counter()
+    rig = load_facs_rig(filepath)
+    shapes = rig["shapes"]
+    table = rig["table"]
+
+    mu.load_plugin()
+    fc.load_combination_plugin()
+    if not mc.objExists(hub):
+        mc.createNode("network", name=hub)
+    hub_mobject = fb.get_node(hub)
+    mfn_hub = om.MFnDependencyNode(hub_mobject)
+
+    # blend nodes of the file missing from the scene, their entries are skipped
+    selection_list = om.MSelectionList()
+    blend_objects = []
+    missing = []
+    for output in rig["outputs"]:
+        try:
+            selection_list.add(output)
+            blend_objects.append(selection_list.getDependNode(selection_list.length() - 1))
+        except RuntimeError:
+            blend_objects.append(None)
+            missing.append(output)
+    if missing:
+        logger.warning(f"{len(missing)} blend nodes are missing, their keys are skipped: {missing}")
+
+    mc.undoInfo(openChunk=True)
+    try:
+        # 1. attributes, old network and new nodes
+        create_modifier = om.MDGModifier()
+        for shape in shapes:
+            if not mfn_hub.hasAttribute(shape):
+                create_modifier.addAttribute(hub_mobject, get_shape_attribute(shape))
+        if replace:
+            for node_mobject in get_old_network(hub, shapes):
+                create_modifier.deleteNode(node_mobject)
+
+        curves = []
+        if network == "curves":
+            for entry_index in range(len(table.entry_outputs)):
+                output_index = table.entry_outputs[entry_index]
+                if blend_objects[output_index] is None:
+                    curves.append(None)
+                    continue
+                channel = fbe.CHANNELS[table.entry_channels[entry_index]]
+                curve_object = create_modifier.createNode(fdk.ANIM_CURVE_TYPES[channel[:-1]])
+                create_modifier.renameNode(curve_object, f"{rig['outputs'][output_index]}_{channel}")
+                curves.append(curve_object)
+
+            # channels driven by several shapes go through a blendWeighted
+            slots, slot_counts = np.unique(table.entry_slots, return_counts=True)
+            blend_weighted_nodes = {}
+            for slot in slots[slot_counts > 1].tolist():
+                if blend_objects[slot // 9] is not None:
+                    blend_weighted_nodes[slot] = create_modifier.createNode("blendWeighted")
+
+        combinations = []
+        corrective_starts = rig["corrective_starts"]
+        for index, shape_index in enumerate(rig["corrective_shapes"].tolist()):
+            node = create_modifier.createNode(fb.COMBINATION_NODE_TYPE)
+            create_modifier.renameNode(node, shapes[shape_index] + fb.CORRECTIVE_SUFFIX)
+            combinations.append((node, shape_index,
+                                 rig["corrective_inputs"][corrective_starts[index]:corrective_starts[index + 1]],
+                                 int(rig["corrective_operations"][index])))
+        mu.apply_modifier(create_modifier)
+
+        # 2. connections
+        connect_modifier = om.MDGModifier()
+        shape_plugs = [mfn_hub.findPlug(shape, False) for shape in shapes]
+        for node, shape_index, inputs, operation in combinations:
+            mfn_node = om.MFnDependencyNode(node)
+            connect_modifier.newPlugValueShort(mfn_node.findPlug("operation", False), operation)
+            input_array = mfn_node.findPlug("input", False)
+            for input_index, input_shape in enumerate(inputs.tolist()):
+                connect_modifier.connect(shape_plugs[input_shape], input_array.elementByLogicalIndex(input_index))
+            disconnect_source(connect_modifier, shape_plugs[shape_index])
+            connect_modifier.connect(mfn_node.findPlug("output", False), shape_plugs[shape_index])
+
+        keys = fdk.AnimCurveKeys()
+        if network == "curves":
+            blend_weighted_indices = {}
+            for entry_index, curve_object in enumerate(curves):
+                if curve_object is None:
+                    continue
+                mfn_curve = om.MFnDependencyNode(curve_object)
+                connect_modifier.connect(shape_plugs[table.entry_shapes[entry_index]],
+                                         mfn_curve.findPlug("input", False))
+                slot = int(table.entry_slots[entry_index])
+                if slot in blend_weighted_nodes:
+                    input_index = blend_weighted_indices.get(slot, 0)
+                    blend_weighted_indices[slot] = input_index + 1
+                    mfn_blend_weighted = om.MFnDependencyNode(blend_weighted_nodes[slot])
+                    connect_modifier.connect(mfn_curve.findPlug("output", False),
+                                             mfn_blend_weighted.findPlug("input", False)
+                                             .elementByLogicalIndex(input_index))
+                else:
+                    channel_plug = om.MFnDependencyNode(blend_objects[slot // 9]).findPlug(
+                        fbe.CHANNELS[slot % 9], False)
+                    disconnect_source(connect_modifier, channel_plug)
+                    connect_modifier.connect(mfn_curve.findPlug("output", False), channel_plug)
+                key_start, key_end = table.key_starts[entry_index], table.key_starts[entry_index + 1]
+                keys.add_keys(curve_object, table.key_inputs[key_start:key_end].tolist(),
+                              table.key_values[key_start:key_end].tolist())
+            for slot, blend_weighted in blend_weighted_nodes.items():
+                channel_plug = om.MFnDependencyNode(blend_objects[slot // 9]).findPlug(fbe.CHANNELS[slot % 9], False)
+                disconnect_source(connect_modifier, channel_plug)
+                connect_modifier.connect(om.MFnDependencyNode(blend_weighted).findPlug("output", False),
+                                         channel_plug)
+
+        # undriven channels back to their exported values
+        driven = table.driven.reshape(-1, 9)
+        for output_index, blend_object in enumerate(blend_objects):
+            if blend_object is None:
+                continue
+            mfn_blend = om.MFnDependencyNode(blend_object)
+            for channel_index in np.nonzero(~driven[output_index])[0].tolist():
+                channel_plug = mfn_blend.findPlug(fbe.CHANNELS[channel_index], False)
+                if channel_plug.source().isNull:
+                    connect_modifier.newPlugValueDouble(channel_plug,
+                                                        float(table.rest_values[output_index, channel_index]))
+        mu.apply_modifier(connect_modifier)
+
+        # 3. keys
+        if keys.keys:
+            mu.apply_modifier(keys)
+
+        if network == "pose_blend":
+            import_pose_blend(rig, blend_objects, hub)
+
+        fi.save_index(fi.ShapeControlIndex(rig["shape_controls"]), hub)
+    finally:
+        mc.undoInfo(closeChunk=True)
+
+    key_count = sum(len(inputs) for _, inputs, _ in keys.keys)
+    logger.info(f"Rebuilt {len(shapes)} shapes ({len(combinations)} combinations) on {hub}: "
+                f"{len(keys.keys)} curves, {key_count} keys in {time.perf_counter() - start_time:.3f}s")
+    return {"shapes": len(shapes), "curves": len(keys.keys), "keys": key_count, "missing": missing}
+
+
+def import_pose_blend(rig, blend_objects, hub=FACS_HUB):
+    """
+    drive the blend nodes of an imported rig by a facsPoseBlend node
+    """
+    fb.load_facs_blend_plugin()
+    table = rig["table"]
+    node = fb.create_pose_blend({"table": table, "shapes": rig["shapes"], "outputs": rig["outputs"]}, hub=hub)
+    output_array = om.MFnDependencyNode(node).findPlug("output", False)
+    modifier = om.MDGModifier()
+    for slot in np.unique(table.entry_slots).tolist():
+        output_index, channel_index = divmod(slot, 9)
+        if blend_objects[output_index] is None:
+            continue
+        channel_plug = om.MFnDependencyNode(blend_objects[output_index]).findPlug(fbe.CHANNELS[channel_index], False)
+        disconnect_source(modifier, channel_plug)
+        modifier.connect(output_array.elementByLogicalIndex(output_index).child(channel_index // 3)
+                         .child(channel_index % 3), channel_plug)
+    mu.apply_modifier(modifier)
+    return node
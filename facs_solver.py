@@ -0,0 +1,180 @@
+import logging
+import time
+import numpy as np
+import maya.api.OpenMaya as om
+import facs_blend as fb
+import facs_driven_keys as fdk
+import facs_preview_eval as fpe
+import modifier_undo as mu
+
+"""
+express hand posed face controls as FACS_HUB weights, see facs_solver_eval.py for the solve
+
+    read_blend_channels   blend node channels matching the current control pose, for the current time or a range
+    solve_current_pose    weights of the current pose, optionally keyed on FACS_HUB
+    solve_animation       weights of every frame in one batched solve, keyed on FACS_HUB as weight curves
+
+the controls keep their pose, zero them (FACS_setup.resetAllControls) once the weights are keyed.
+
+usage:
+    import facs_preview as fp
+    import facs_solver as fs
+    import facs_solver_eval as fse
+    solver = fse.WeightSolver(fp.extract_preview())
+    weights = fs.solve_current_pose(solver)
+    fs.solve_animation(solver, 1, 120)
+"""
+
+#initiate logging with module name
+logger = logging.getLogger(__name__)
+
+FACS_HUB = "FACS_HUB"
+
+
+def get_matrix_plugs(preview):
+    """
+    world matrix of each control (of the blend node when it has none) and parent inverse matrix of its blend node
+    """
+    world_plugs = []
+    parent_inverse_plugs = []
+    for blend_node, control in zip(preview.outputs, preview.controls):
+        mfn_blend = om.MFnDependencyNode(fb.get_node(blend_node))
+        mfn_world = om.MFnDependencyNode(fb.get_node(control)) if control else mfn_blend
+        world_plugs.append(mfn_world.findPlug("worldMatrix", False).elementByLogicalIndex(0))
+        parent_inverse_plugs.append(mfn_blend.findPlug("parentInverseMatrix", False).elementByLogicalIndex(0))
+    return world_plugs, parent_inverse_plugs
+
+
+def read_matrices(plugs):
+    return np.array([om.MFnMatrixData(plug.asMObject()).matrix() for plug in plugs]).reshape(-1, 4, 4)
+
+
+def read_blend_channels(preview, frames=None):
+    """
+    blend node channels that put every control where it is, with its local transform back at rest
+
+    Args:
+        preview (facs_preview_eval.FacsPreview): extracted FACS setup
+        frames (list): frames to read through a DG context each, the current time if None
+
+    Returns:
+        (F, B, 9) channels, rotations in radians, or (B, 9) for the current time
+    """
+    world_plugs, parent_inverse_plugs = get_matrix_plugs(preview)
+    # controls without a control read their blend node, whose local matrix is already the blend node one
+    rest_inverse = np.linalg.inv(np.array([matrix if control else np.identity(4) for matrix, control in
+                                           zip(preview.control_matrices, preview.controls)]))
+
+    if frames is None:
+        world_matrices = read_matrices(world_plugs)[np.newaxis]
+        parent_inverse_matrices = read_matrices(parent_inverse_plugs)[np.newaxis]
+    else:
+        world_matrices = np.empty((len(frames), len(world_plugs), 4, 4))
+        parent_inverse_matrices = np.empty_like(world_matrices)
+        time_unit = om.MTime.uiUnit()
+        for frame_index, frame in enumerate(frames):
+            context = om.MDGContext(om.MTime(frame, time_unit))
+            previous_context = context.makeCurrent()
+            try:
+                world_matrices[frame_index] = read_matrices(world_plugs)
+                parent_inverse_matrices[frame_index] = read_matrices(parent_inverse_plugs)
+            finally:
+                previous_context.makeCurrent()
+
+    channels = fpe.decompose_matrices(rest_inverse @ world_matrices @ parent_inverse_matrices)
+    return channels[0] if frames is None else channels
+
+
+def write_weight_curves(shapes, frames, weights, hub=FACS_HUB):
+    """
+    key the weights on the FACS_HUB shape attributes, keys already in the frame range are replaced
+
+    attributes driven by anything but a weight curve (sliders, correctives) are skipped
+
+    Args:
+        shapes (list): FACS_HUB attribute of each weight column
+        frames (list): frame of each weight row
+        weights (array_like): (F, S) weights
+
+    Returns:
+        list of the keyed shapes
+    """
+    mu.load_plugin()
+    weights = np.asarray(weights, dtype=np.float64).reshape(len(frames), len(shapes))
+    mfn_hub = om.MFnDependencyNode(fb.get_node(hub))
+
+    create_modifier = om.MDGModifier()
+    targets = []
+    for shape_index, shape in enumerate(shapes):
+        plug = mfn_hub.findPlug(shape, False)
+        source = plug.source()
+        if source.isNull:
+            curve_object = create_modifier.createNode("animCurveTU")
+            create_modifier.renameNode(curve_object, f"{hub}_{shape}")
+            targets.append((shape_index, plug, curve_object, True))
+        elif om.MFnDependencyNode(source.node()).typeName == "animCurveTU":
+            targets.append((shape_index, plug, source.node(), False))
+        else:
+            logger.warning(f"Skipped {hub}.{shape}, it is driven by {source.name()}")
+    mu.apply_modifier(create_modifier)
+
+    connect_modifier = om.MDGModifier()
+    for shape_index, plug, curve_object, new_curve in targets:
+        if new_curve:
+            connect_modifier.connect(om.MFnDependencyNode(curve_object).findPlug("output", False), plug)
+    mu.apply_modifier(connect_modifier)
+
+    time_unit = om.MTime.uiUnit()
+    times = om.MTimeArray([om.MTime(float(frame), time_unit) for frame in frames])
+    keys = fdk.AnimCurveKeys()
+    for shape_index, plug, curve_object, new_curve in targets:
+        keys.add_keys(curve_object, times, om.MDoubleArray(weights[:, shape_index].tolist()))
+    mu.apply_modifier(keys)
+    return [shapes[target[0]] for target in targets]
+
+
+def solve_current_pose(solver, hub=FACS_HUB, key=False):
+    """
+    FACS_HUB weights of the current control pose
+
+    Args:
+        solver (facs_solver_eval.WeightSolver): solver of the FACS setup
+        key (bool): key the weights at the current time
+
+    Returns:
+        dict shape -> weight
+    """
+    weights = solver.solve(read_blend_channels(solver.preview))
+    if key:
+        frame = om.MAnimControl.currentTime().asUnits(om.MTime.uiUnit())
+        write_weight_curves(solver.shapes, [frame], weights[np.newaxis], hub=hub)
+    return dict(zip(solver.shapes, weights.tolist()))
+
+
+def solve_animation(solver, start, end, step=1.0, hub=FACS_HUB, key=True):
+    """
+    FACS_HUB weights of every frame of the control animation in one batched solve
+
+    Args:
+        solver (facs_solver_eval.WeightSolver): solver of the FACS setup
+        start (float): first frame
+        end (float): last frame, included
+        step (float): frame step
+        key (bool): key the weights as FACS_HUB weight curves
+
+    Returns:
+        (frames, (F, S) weights), the columns are solver.shapes
+    """
+    frames = np.arange(start, end + step * 0.5, step, dtype=np.float64)
+    start_time = time.perf_counter()
+    channels = read_blend_channels(solver.preview, frames)
+    read_time = time.perf_counter()
+    weights = solver.solve(channels)
+    solve_time = time.perf_counter()
+    if key:
+        write_weight_curves(solver.shapes, frames, weights, hub=hub)
+
+    residual = float(np.abs(solver.get_residuals(channels, weights)).max()) if len(frames) else 0.0
+    logger.info(f"Solved {len(frames)} frames x {len(solver.shapes)} shapes: read {read_time - start_time:.3f}s, "
+                f"solve {solve_time - read_time:.3f}s, max channel residual {residual:.5f}")
+    return frames, weights
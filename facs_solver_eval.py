@@ -0,0 +1,138 @@
+import numpy as np
+
+"""
+Maya-free solver of FACS_HUB weights from blend node channels, the inverse of facs_preview_eval.FacsPreview
+
+each solved shape is a column of the basis, what the shape adds to every driven blend node channel at weight 1.
+a pose is the weighted least squares combination of the columns with every weight bounded to [0, 1]:
+
+    min |W (basis x - (channels - rest))|^2 + regularization |x|^2    0 <= x <= 1
+
+the normal matrix of the basis is inverted once, a pose starts from the clipped unconstrained solution and is
+refined by projected gradient steps (FISTA) on every frame at once. the correctives are not solved, they follow
+their inputs: their contribution is taken off the target and the base shapes solved again.
+
+curves with intermediate keys are linearized between weight 0 and 1.
+
+usage:
+    solver = WeightSolver(preview)
+    weights = solver.solve(channels)    # (frames, blend nodes, 9) -> (frames, solved shapes)
+"""
+
+# channel weights of the least squares, translate in scene units, rotate in radians, scale
+DEFAULT_CHANNEL_WEIGHTS = (1.0, 1.0, 1.0, 10.0, 10.0, 10.0, 1.0, 1.0, 1.0)
+
+
+class WeightSolver(object):
+
+    def __init__(self, preview, shapes=None, channel_weights=DEFAULT_CHANNEL_WEIGHTS, regularization=1e-6):
+        """
+        Args:
+            preview (facs_preview_eval.FacsPreview): extracted FACS setup
+            shapes (list): FACS_HUB shapes to solve, every shape but the correctives if None
+            channel_weights (tuple): weight of each of the 9 channels in the least squares
+            regularization (float): damping of the weights, keeps shapes with the same effect apart
+        """
+        self.preview = preview
+        corrective_shapes = set(preview.correctives.corrective_shapes.tolist())
+        if shapes is None:
+            self.shape_indices = np.array([index for index in range(len(preview.shapes))
+                                           if index not in corrective_shapes], dtype=np.int64)
+        else:
+            self.shape_indices = np.array([preview.shape_indices[shape] for shape in shapes], dtype=np.int64)
+        self.shapes = [preview.shapes[index] for index in self.shape_indices]
+        self.has_correctives = bool(len(preview.correctives))
+
+        # rest channels and one basis column per shape, without correctives
+        table = preview.table
+        shape_count = len(preview.shapes)
+        self.rest = table.evaluate(np.zeros(shape_count)).reshape(-1)
+        unit_weights = np.zeros((len(self.shape_indices), shape_count))
+        unit_weights[np.arange(len(self.shape_indices)), self.shape_indices] = 1.0
+        basis = table.evaluate(unit_weights).reshape(len(self.shape_indices), -1) - self.rest
+
+        # only the channels some shape moves take part in the solve
+        self.rows = np.nonzero(np.any(np.abs(basis) > 1e-12, axis=0))[0]
+        self.row_weights = np.sqrt(np.tile(np.asarray(channel_weights, dtype=np.float64),
+                                           table.output_count)[self.rows])
+        self.basis = basis[:, self.rows].T * self.row_weights[:, np.newaxis]
+
+        gram = self.basis.T @ self.basis + regularization * np.identity(len(self.shape_indices))
+        self.inverse = np.linalg.inv(gram)
+        self.gram = gram
+        # step of the projected gradient, 1 / largest eigenvalue of the normal matrix
+        self.step = 1.0 / max(float(np.linalg.eigvalsh(gram)[-1]), 1e-12) if len(gram) else 1.0
+
+    def get_targets(self, channels):
+        """
+        weighted channel offsets from rest, (F, R)
+        """
+        channels = np.asarray(channels, dtype=np.float64).reshape(len(channels), -1)
+        return (channels[:, self.rows] - self.rest[self.rows]) * self.row_weights
+
+    def solve_bounded(self, targets, iterations=200, tolerance=1e-7):
+        """
+        Args:
+            targets (array_like): (F, R) weighted channel offsets
+
+        Returns:
+            (F, S) weights in [0, 1]
+        """
+        projected = targets @ self.basis
+        weights = np.clip(projected @ self.inverse, 0.0, 1.0)
+        momentum_weights = weights.copy()
+        momentum = 1.0
+        for _ in range(iterations):
+            gradient = momentum_weights @ self.gram - projected
+            next_weights = np.clip(momentum_weights - self.step * gradient, 0.0, 1.0)
+            next_momentum = (1.0 + np.sqrt(1.0 + 4.0 * momentum * momentum)) * 0.5
+            momentum_weights = next_weights + ((momentum - 1.0) / next_momentum) * (next_weights - weights)
+            change = np.abs(next_weights - weights).max() if next_weights.size else 0.0
+            weights, momentum = next_weights, next_momentum
+            if change < tolerance:
+                break
+        return weights
+
+    def get_full_weights(self, weights):
+        full_weights = np.zeros((len(weights), len(self.preview.shapes)))
+        full_weights[:, self.shape_indices] = weights
+        return full_weights
+
+    def solve(self, channels, iterations=200, tolerance=1e-7, corrective_passes=4):
+        """
+        weights of the solved shapes reproducing blend node channels
+
+        Args:
+            channels (array_like): (F, B, 9) or (B, 9) blend node channels, rotations in radians
+            iterations (int): max projected gradient iterations
+            tolerance (float): stop when no weight moves more than this
+            corrective_passes (int): solves after taking the corrective contribution off the target
+
+        Returns:
+            (F, S) or (S,) weights, one column per solver shape
+        """
+        single = np.ndim(channels) == 2
+        channels = np.asarray(channels, dtype=np.float64).reshape(-1, self.preview.table.output_count, 9)
+        targets = self.get_targets(channels)
+        weights = self.solve_bounded(targets, iterations=iterations, tolerance=tolerance)
+
+        if self.has_correctives:
+            table = self.preview.table
+            for _ in range(corrective_passes):
+                full_weights = self.get_full_weights(weights)
+                corrected = self.preview.correctives.apply(full_weights)
+                contribution = (table.evaluate(corrected) - table.evaluate(full_weights)).reshape(len(weights), -1)
+                weights = self.solve_bounded(targets - contribution[:, self.rows] * self.row_weights,
+                                             iterations=iterations, tolerance=tolerance)
+        return weights[0] if single else weights
+
+    def get_residuals(self, channels, weights):
+        """
+        channel differences between the target and the solved weights, correctives included
+
+        Returns:
+            (F, B, 9) differences
+        """
+        channels = np.asarray(channels, dtype=np.float64).reshape(-1, self.preview.table.output_count, 9)
+        weights = np.atleast_2d(weights)
+        return self.preview.evaluate_channels(self.get_full_weights(weights)) - channels
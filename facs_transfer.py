@@ -0,0 +1,152 @@
+import numpy as np
+import maya.api.OpenMaya as om
+import facs_preview_eval as fpe
+import modifier_undo as mu
+
+"""
+batched transform transfers between the face controls and their blend nodes, see FACS_setup
+
+    control -> BlendNode -> CON -> zero group
+
+every function reads all the matrices it needs in one pass, decomposes them with
+facs_preview_eval.decompose_matrices and writes every channel through a single undoable modifier,
+instead of an xform / getAttr / MTransformationMatrix / setAttr round trip per node.
+translate and rotate are written in internal units (centimeters, radians) like the matrices hold them.
+
+usage:
+    import facs_transfer as ft
+    ft.transfer_to_blend_nodes(controls, blend_nodes)
+    ft.store_back_to_controls(controls, blend_nodes, constrain_nodes)
+"""
+
+CHANNELS = ("translateX", "translateY", "translateZ", "rotateX", "rotateY", "rotateZ",
+            "scaleX", "scaleY", "scaleZ")
+# translate, rotate, scale of a zeroed transform
+ZERO_CHANNELS = (0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 1.0, 1.0, 1.0)
+
+
+def get_dag_paths(nodes):
+    """
+    Returns:
+        list of MDagPath, None for the nodes that do not exist or are None
+    """
+    dag_paths = []
+    for node in nodes:
+        if not node:
+            dag_paths.append(None)
+            continue
+        # one list per node, MSelectionList.add merges a node already in the list
+        selection_list = om.MSelectionList()
+        try:
+            selection_list.add(node)
+        except RuntimeError:
+            dag_paths.append(None)
+            continue
+        dag_paths.append(selection_list.getDagPath(0))
+    return dag_paths
+
+
+def to_array(matrices):
+    return np.array([list(matrix) for matrix in matrices], dtype=np.float64).reshape(-1, 4, 4)
+
+
+def set_channels(modifier, dag_paths, channels):
+    """
+    queue the 9 channel values of every node on the modifier
+
+    Args:
+        modifier (om.MDGModifier): modifier to add the values to
+        dag_paths (list): MDagPath of each node
+        channels (array_like): (N, 9) values, internal units
+    """
+    for dag_path, values in zip(dag_paths, np.asarray(channels, dtype=np.float64).tolist()):
+        mfn_node = om.MFnDependencyNode(dag_path.node())
+        for channel, value in zip(CHANNELS, values):
+            modifier.newPlugValueDouble(mfn_node.findPlug(channel, False), value)
+
+
+def zero_transformations(nodes, modifier=None):
+    """
+    zero translate / rotate and reset scale of every node in one modifier
+
+    Args:
+        nodes (list): nodes, missing ones are skipped
+        modifier (om.MDGModifier): add to this modifier instead of applying a new one
+    """
+    dag_paths = [dag_path for dag_path in get_dag_paths(nodes) if dag_path is not None]
+    apply = modifier is None
+    if apply:
+        modifier = om.MDGModifier()
+    set_channels(modifier, dag_paths, np.tile(ZERO_CHANNELS, (len(dag_paths), 1)))
+    if apply:
+        mu.load_plugin()
+        mu.apply_modifier(modifier)
+
+
+def get_blend_node_channels(controls, blend_nodes):
+    """
+    channels each blend node needs to hold its control's current world transform
+
+    Returns:
+        (N, 9) channels, internal units, and the MDagPath of every blend node
+    """
+    control_paths = get_dag_paths(controls)
+    blend_paths = get_dag_paths(blend_nodes)
+    for node, dag_path in zip(list(controls) + list(blend_nodes), control_paths + blend_paths):
+        if dag_path is None:
+            raise RuntimeError(f"Failed to find {node}")
+    world_matrices = to_array([dag_path.inclusiveMatrix() for dag_path in control_paths])
+    parent_inverse_matrices = to_array([dag_path.exclusiveMatrixInverse() for dag_path in blend_paths])
+    return fpe.decompose_matrices(world_matrices @ parent_inverse_matrices), blend_paths
+
+
+def transfer_to_blend_nodes(controls, blend_nodes):
+    """
+    batched FACS_setup.transferFromControlToBlendNode, the blend nodes take the world transform of their
+    control and the controls are zeroed, in one modifier
+    """
+    channels, blend_paths = get_blend_node_channels(controls, blend_nodes)
+    modifier = om.MDGModifier()
+    set_channels(modifier, blend_paths, channels)
+    zero_transformations(controls, modifier=modifier)
+    mu.load_plugin()
+    mu.apply_modifier(modifier)
+
+
+def store_back_to_controls(controls, blend_nodes, constrain_nodes):
+    """
+    batched FACS_setup.storeTransformationBackToControl, the blend and constrain nodes are zeroed and
+    the controls keep their world transform, in one modifier
+
+    the parent of each control once its blend / constrain nodes are zeroed is computed instead of read back:
+    the zeroed nodes are its direct ancestors, so it is the parent of the highest zeroed one
+
+    Args:
+        controls (list): controls
+        blend_nodes (list): blend node of each control, None or missing nodes are not zeroed
+        constrain_nodes (list): constrain node of each control, same
+    """
+    control_paths = get_dag_paths(controls)
+    for control, dag_path in zip(controls, control_paths):
+        if dag_path is None:
+            raise RuntimeError(f"Failed to find {control}")
+    blend_paths = get_dag_paths(blend_nodes)
+    constrain_paths = get_dag_paths(constrain_nodes)
+
+    world_matrices = to_array([dag_path.inclusiveMatrix() for dag_path in control_paths])
+    parent_inverse_matrices = []
+    for control_path, blend_path, constrain_path in zip(control_paths, blend_paths, constrain_paths):
+        # highest zeroed node in the parent chain of the control, control -> BlendNode -> CON
+        top_path = control_path
+        for zeroed_path in (blend_path, constrain_path):
+            if zeroed_path is not None and om.MFnDagNode(zeroed_path).isParentOf(top_path.node()):
+                top_path = zeroed_path
+        parent_inverse_matrices.append(top_path.exclusiveMatrixInverse())
+    channels = fpe.decompose_matrices(world_matrices @ to_array(parent_inverse_matrices))
+
+    modifier = om.MDGModifier()
+    zeroed_paths = [dag_path for dag_path in blend_paths + constrain_paths if dag_path is not None]
+    set_channels(modifier, zeroed_paths, np.tile(ZERO_CHANNELS, (len(zeroed_paths), 1)))
+    set_channels(modifier, control_paths, channels)
+    mu.load_plugin()
+    mu.apply_modifier(modifier)
@@ -0,0 +1,328 @@
+import time
+import maya.api.OpenMaya as om
+import maya.cmds as mc
+import maya.mel as mel
+import control_shape_library as csl
+import modifier_undo as mu
+import rigging_utils as ru
+
+"""
+build the FK controls of many joint chains at once
+
+produces the same hierarchy as rigging_utils.create_fkchain, per joint:
+    <name>ControlGroup<n>   zero group (hidden joint) placed on the joint, parented under the previous control
+    <name>Control<n>        control (hidden joint) holding the curve shapes of the prototype
+and the joint follows its control through a parentConstraint or a multMatrix/decomposeMatrix network.
+
+the zero group transforms are computed from the joint world matrices and the curves are stamped from the cached
+prototype (control_shape_library) as nurbsCurve data. Everything goes through two modifier passes inside one
+undo chunk: the first creates the nodes, the second sets values and makes the connections.
+the constraints are wired directly, they carry no weight alias attribute.
+
+usage:
+    import fk_builder as fkb
+    fkb.build_fk_chains([("JOLeftThumb1", "JOLeftThumb3"), ("JOLeftIndex1", "JOLeftIndex4")])
+    fkb.benchmark(chain_counts=(5, 20, 50), chain_length=4)
+"""
+
+CONNECTION_TYPES = ("constraint", "matrix")
+
+
+def get_control_names(joint):
+    # same naming as rigging_utils.create_control_on_node / create_zero_group
+    control_name = joint.replace("JO", "")[: -1] + "Control" + joint[-1]
+    return control_name.replace("Control", "ControlGroup"), control_name
+
+
+def get_chains(chains):
+    """
+    resolve chains given as (start, end) pairs or as joint lists
+
+    Returns:
+        list of joint lists
+    """
+    joint_chains = []
+    for chain in chains:
+        if isinstance(chain, tuple) and len(chain) == 2:
+            joint_chain = ru.get_joint_chain(*chain)
+            if not joint_chain:
+                raise ValueError(f"{chain[1]} is not a joint below {chain[0]}")
+            joint_chains.append(joint_chain)
+        else:
+            joint_chains.append(list(chain))
+    return joint_chains
+
+
+def get_curve_data_object(data):
+    # nurbsCurve data for the cached attribute of a shape, set through the modifier instead of MFnNurbsCurve.create
+    data_object = om.MFnNurbsCurveData().create()
+    csl.create_curve(data, data_object)
+    return data_object
+
+
+def set_transform_values(modifier, mfn_node, matrix):
+    transformation = om.MTransformationMatrix(matrix)
+    translation = transformation.translation(om.MSpace.kTransform)
+    rotation = transformation.rotation()
+    scale = transformation.scale(om.MSpace.kTransform)
+    for index, axis in enumerate("XYZ"):
+        modifier.newPlugValueDouble(mfn_node.findPlug(f"translate{axis}", False), translation[index])
+        modifier.newPlugValueMAngle(mfn_node.findPlug(f"rotate{axis}", False), om.MAngle(rotation[index]))
+        modifier.newPlugValueDouble(mfn_node.findPlug(f"scale{axis}", False), scale[index])
+
+
+def connect_constraint(modifier, mfn_control, mfn_joint, mfn_constraint):
+    """
+    queue the connections of a parentConstraint without offset, the way mc.parentConstraint wires it
+    """
+    target = mfn_constraint.findPlug("target", False).elementByLogicalIndex(0)
+
+    def target_plug(attr):
+        return target.child(mfn_constraint.attribute(attr))
+
+    for source, destination in [("translate", "targetTranslate"), ("rotate", "targetRotate"),
+                                ("scale", "targetScale"), ("rotateOrder", "targetRotateOrder"),
+                                ("rotatePivot", "targetRotatePivot"),
+                                ("rotatePivotTranslate", "targetRotatePivotTranslate"),
+                                ("jointOrient", "targetJointOrient")]:
+        modifier.connect(mfn_control.findPlug(source, False), target_plug(destination))
+    modifier.connect(mfn_control.findPlug("parentMatrix", False).elementByLogicalIndex(0),
+                     target_plug("targetParentMatrix"))
+    modifier.newPlugValueDouble(target_plug("targetWeight"), 1.0)
+
+    modifier.connect(mfn_joint.findPlug("parentInverseMatrix", False).elementByLogicalIndex(0),
+                     mfn_constraint.findPlug("constraintParentInverseMatrix", False))
+    for source, destination in [("rotateOrder", "constraintRotateOrder"), ("jointOrient", "constraintJointOrient"),
+                                ("rotatePivot", "constraintRotatePivot"),
+                                ("rotatePivotTranslate", "constraintRotateTranslate")]:
+        modifier.connect(mfn_joint.findPlug(source, False), mfn_constraint.findPlug(destination, False))
+
+    for source, destination in [("constraintTranslate", "translate"), ("constraintRotate", "rotate")]:
+        modifier.connect(mfn_constraint.findPlug(source, False), mfn_joint.findPlug(destination, False))
+
+
+def create_matrix_nodes(modifier, name):
+    nodes = []
+    for node_type, suffix in [("multMatrix", "localMultMatrix"), ("multMatrix", "orientMultMatrix"),
+                              ("decomposeMatrix", "translateDecomposeMatrix"),
+                              ("decomposeMatrix", "rotateDecomposeMatrix")]:
+        node = modifier.createNode(node_type)
+        modifier.renameNode(node, f"{name}_{suffix}")
+        nodes.append(node)
+    return nodes
+
+
+def connect_matrix(modifier, mfn_control, mfn_joint, joint_orient, nodes):
+    """
+    queue the connections of a multMatrix/decomposeMatrix network driving the joint from the control,
+    the rotation is decomposed after removing the joint orient so that rotate + jointOrient matches the control
+    """
+    mfn_local, mfn_orient, mfn_translate, mfn_rotate = [om.MFnDependencyNode(node) for node in nodes]
+
+    local_inputs = mfn_local.findPlug("matrixIn", False)
+    modifier.connect(mfn_control.findPlug("worldMatrix", False).elementByLogicalIndex(0),
+                     local_inputs.elementByLogicalIndex(0))
+    modifier.connect(mfn_joint.findPlug("parentInverseMatrix", False).elementByLogicalIndex(0),
+                     local_inputs.elementByLogicalIndex(1))
+
+    orient_inputs = mfn_orient.findPlug("matrixIn", False)
+    modifier.connect(mfn_local.findPlug("matrixSum", False), orient_inputs.elementByLogicalIndex(0))
+    modifier.newPlugValue(orient_inputs.elementByLogicalIndex(1),
+                          om.MFnMatrixData().create(joint_orient.asMatrix().inverse()))
+
+    modifier.connect(mfn_local.findPlug("matrixSum", False), mfn_translate.findPlug("inputMatrix", False))
+    modifier.connect(mfn_orient.findPlug("matrixSum", False), mfn_rotate.findPlug("inputMatrix", False))
+    modifier.connect(mfn_translate.findPlug("outputTranslate", False), mfn_joint.findPlug("translate", False))
+    modifier.connect(mfn_rotate.findPlug("outputRotate", False), mfn_joint.findPlug("rotate", False))
+
+
+def build_fk_chains(chains, shape_name="octagonPoint", connection="constraint"):
+    """
+    build the FK controls of every chain in a single undo chunk
+
+    Args:
+        chains (list): (start joint, end joint) pairs or joint lists
+        shape_name (str): control shape prototype
+        connection (str): "constraint" for parentConstraints, "matrix" for multMatrix/decomposeMatrix networks
+
+    Returns:
+        list of control lists, one per chain
+    """
+    if connection not in CONNECTION_TYPES:
+        raise ValueError(f"Invalid connection type: {connection}")
+    joint_chains = get_chains(chains)
+    if not joint_chains:
+        return []
+
+    mu.load_plugin()
+    curve_data = [get_curve_data_object(data) for data in csl.get_prototype(shape_name)]
+
+    selection_list = om.MSelectionList()
+    for joint_chain in joint_chains:
+        for joint in joint_chain:
+            selection_list.add(joint)
+
+    mc.undoInfo(openChunk=True)
+    try:
+        # first pass: create the zero groups, controls, shapes and constraint nodes
+        dag_modifier = om.MDagModifier()
+        dg_modifier = om.MDGModifier()
+        chains_built = []
+        selection_index = 0
+        for joint_chain in joint_chains:
+            parent_control = om.MObject.kNullObj
+            parent_matrix = om.MMatrix()
+            chain_built = []
+            for joint in joint_chain:
+                joint_path = selection_list.getDagPath(selection_index)
+                selection_index += 1
+                world_matrix = joint_path.inclusiveMatrix()
+                group_name, control_name = get_control_names(joint)
+
+                zero_group = dag_modifier.createNode("joint", parent_control)
+                dag_modifier.renameNode(zero_group, group_name)
+                control = dag_modifier.createNode("joint", zero_group)
+                dag_modifier.renameNode(control, control_name)
+
+                shape_name_base = ru.add_shape_between_string_and_suffix(control_name)
+                shapes = []
+                for index in range(len(curve_data)):
+                    shape = dag_modifier.createNode("nurbsCurve", control)
+                    dag_modifier.renameNode(shape, shape_name_base if not index else f"{shape_name_base}_{index}")
+                    shapes.append(shape)
+
+                if connection == "constraint":
+                    driver = dag_modifier.createNode("parentConstraint", joint_path.node())
+                    dag_modifier.renameNode(driver, joint + "_parentConstraint1")
+                    joint_orient = None
+                else:
+                    driver = create_matrix_nodes(dg_modifier, joint)
+                    joint_orient = om.MFnIkJoint(joint_path).orientation()
+
+                chain_built.append({"joint": joint_path.node(), "zero_group": zero_group, "control": control,
+                                    "shapes": shapes, "driver": driver, "joint_orient": joint_orient,
+                                    # the control sits at the origin of its zero group, the parent space of the
+                                    # zero group is the previous joint
+                                    "local_matrix": world_matrix * parent_matrix.inverse()})
+                parent_control = control
+                parent_matrix = world_matrix
+            chains_built.append(chain_built)
+
+        mu.apply_modifier(dag_modifier)
+        mu.apply_modifier(dg_modifier)
+
+        # second pass: values and connections
+        connect_modifier = om.MDGModifier()
+        for chain_built in chains_built:
+            for entry in chain_built:
+                mfn_group = om.MFnDependencyNode(entry["zero_group"])
+                mfn_control = om.MFnDependencyNode(entry["control"])
+                mfn_joint = om.MFnDependencyNode(entry["joint"])
+
+                set_transform_values(connect_modifier, mfn_group, entry["local_matrix"])
+                connect_modifier.newPlugValueInt(mfn_group.findPlug("drawStyle", False), 2)
+                connect_modifier.newPlugValueInt(mfn_control.findPlug("drawStyle", False), 2)
+                for shape, data_object in zip(entry["shapes"], curve_data):
+                    connect_modifier.newPlugValue(om.MFnDependencyNode(shape).findPlug("cached", False),
+                                                  data_object)
+
+                if connection == "constraint":
+                    connect_constraint(connect_modifier, mfn_control, mfn_joint,
+                                       om.MFnDependencyNode(entry["driver"]))
+                else:
+                    connect_matrix(connect_modifier, mfn_control, mfn_joint, entry["joint_orient"], entry["driver"])
+
+        mu.apply_modifier(connect_modifier)
+    finally:
+        mc.undoInfo(closeChunk=True)
+
+    return [[om.MFnDagNode(entry["control"]).partialPathName() for entry in chain_built]
+            for chain_built in chains_built]
+
+
+class CallCounter(object):
+    '''
+    count the maya.cmds and mel.eval calls made inside the with block
+    '''
+
+    def __init__(self):
+        self.count = 0
+        self.originals = {}
+
+    def wrap(self, function):
+        def counted(*args, **kwargs):
+            self.count += 1
+            return function(*args, **kwargs)
+        return counted
+
+    def __enter__(self):
+        self.count = 0
+        for name in dir(mc):
+            function = getattr(mc, name)
+            if callable(function) and not name.startswith("_"):
+                self.originals[(mc, name)] = function
+                setattr(mc, name, self.wrap(function))
+        self.originals[(mel, "eval")] = mel.eval
+        mel.eval = self.wrap(mel.eval)
+        return self
+
+    def __exit__(self, *args):
+        for (module, name), function in self.originals.items():
+            setattr(module, name, function)
+        self.originals = {}
+
+
+def create_test_chains(chain_count, chain_length):
+    chains = []
+    for chain_index in range(chain_count):
+        mc.select(clear=True)
+        joints = [mc.joint(name=f"JOBench{chain_index}Finger{index + 1}", position=(chain_index, index, 0))
+                  for index in range(chain_length)]
+        mc.joint(joints[0], edit=True, orientJoint="xyz", children=True, zeroScaleOrient=True)
+        chains.append((joints[0], joints[-1]))
+    mc.select(clear=True)
+    return chains
+
+
+def benchmark(chain_counts=(5, 20, 50), chain_length=4, connection="constraint"):
+    """
+    compare rigging_utils.create_fkchain chain by chain with build_fk_chains, each run in a new scene
+
+    Args:
+        chain_counts (sequence): number of chains per run
+        chain_length (int): joints per chain
+        connection (str): connection type of the bulk builder
+
+    Returns:
+        dict of joint count -> {"per_chain": (seconds, calls), "bulk": (seconds, calls)}
+    """
+    # build the prototype before timing, both paths stamp from it
+    csl.get_prototype("octagonPoint")
+    report = {}
+    for chain_count in chain_counts:
+        timings = {}
+        for label in ["per_chain", "bulk"]:
+            mc.file(new=True, force=True)
+            chains = create_test_chains(chain_count, chain_length)
+            with CallCounter() as counter:
+                start = time.perf_counter()
+                if label == "per_chain":
+                    for start_joint, end_joint in chains:
+                        ru.create_fkchain(start_joint, end_joint)
+                else:
+                    build_fk_chains(chains, connection=connection)
+                elapsed = time.perf_counter() - start
+            timings[label] = (elapsed, counter.count)
+        report[chain_count * chain_length] = timings
+
+    mc.file(new=True, force=True)
+
+    print(f"{'joints':>8} {'per chain ms/joint':>19} {'calls/joint':>12} {'bulk ms/joint':>14} "
+          f"{'calls/joint':>12} {'speedup':>8}")
+    for joint_count, timings in report.items():
+        (per_chain_time, per_chain_calls), (bulk_time, bulk_calls) = timings["per_chain"], timings["bulk"]
+        speedup = per_chain_time / bulk_time if bulk_time else float("inf")
+        print(f"{joint_count:>8} {per_chain_time * 1000 / joint_count:>19.3f} {per_chain_calls / joint_count:>12.1f} "
+              f"{bulk_time * 1000 / joint_count:>14.3f} {bulk_calls / joint_count:>12.2f} {speedup:>7.1f}x")
+
+    return report
@@ -0,0 +1,178 @@
+import maya.api.OpenMaya as om
+import callback_registry as cbr
+
+"""
+snapshot of the transform hierarchy of the scene, built in one MItDag pass
+
+the nodes are stored in depth first order with parent and depth arrays, so that
+    chain(start, end)          walks parents from end up to start, O(depth)
+    descendants(node)          is a contiguous slice of the depth first order
+    common_ancestor(a, b)      climbs both nodes to the same depth, O(depth)
+never call back into the scene. The snapshot is marked dirty by DAG change and rename callbacks and rebuilt
+lazily on the next query.
+
+usage:
+    import hierarchy_snapshot as hs
+    hs.get_snapshot().chain("JOLeftUpperArm1", "JOLeftWrist1", node_type="joint")
+"""
+
+
+class HierarchySnapshot(object):
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.names = []
+        self.full_paths = []
+        self.node_types = []
+        self.parents = []
+        self.depths = []
+        # index of the last descendant in depth first order
+        self.subtree_ends = []
+        # partial and full path names -> index
+        self.indices = {}
+
+    def build(self):
+        self.reset()
+        dag_iterator = om.MItDag(om.MItDag.kDepthFirst, om.MFn.kTransform)
+        while not dag_iterator.isDone():
+            dag_path = dag_iterator.getPath()
+            full_path = dag_path.fullPathName()
+            parent_path = full_path.rpartition("|")[0]
+
+            index = len(self.names)
+            self.names.append(dag_path.partialPathName())
+            self.full_paths.append(full_path)
+            self.node_types.append(om.MFnDagNode(dag_path).typeName)
+            parent = self.indices.get(parent_path, -1)
+            self.parents.append(parent)
+            self.depths.append(self.depths[parent] + 1 if parent >= 0 else 0)
+            self.subtree_ends.append(index)
+            self.indices[full_path] = index
+            self.indices.setdefault(self.names[index], index)
+
+            dag_iterator.next()
+
+        # children always come after their parent in depth first order, one backward pass closes every subtree
+        for index in range(len(self.names) - 1, -1, -1):
+            parent = self.parents[index]
+            if parent >= 0 and self.subtree_ends[index] > self.subtree_ends[parent]:
+                self.subtree_ends[parent] = self.subtree_ends[index]
+        return self
+
+    def index(self, node):
+        index = self.indices.get(node)
+        if index is None:
+            raise KeyError(f"Failed to find {node} in the hierarchy snapshot")
+        return index
+
+    def exists(self, node):
+        return node in self.indices
+
+    def parent(self, node):
+        parent = self.parents[self.index(node)]
+        return self.names[parent] if parent >= 0 else None
+
+    def depth(self, node):
+        return self.depths[self.index(node)]
+
+    def chain(self, start, end, node_type=None):
+        """
+        Finds the chain between a start node and an end node.
+
+        Args:
+            start(str): the name of the start node.
+            end(str): the name of the end node.
+            node_type(str): if given every node of the chain must be of this type, e.g. "joint"
+
+        Returns:
+            A list of node names, from the start node to the end node, or None if end is not below start.
+        """
+        if not (self.exists(start) and self.exists(end)):
+            return None
+        start_index = self.index(start)
+        index = self.index(end)
+
+        chain = []
+        while index >= 0 and self.depths[index] >= self.depths[start_index]:
+            if node_type and self.node_types[index] != node_type:
+                return None
+            chain.append(self.names[index])
+            if index == start_index:
+                chain.reverse()
+                return chain
+            index = self.parents[index]
+        return None
+
+    def descendants(self, node, node_type=None):
+        index = self.index(node)
+        names = self.names[index + 1:self.subtree_ends[index] + 1]
+        if node_type:
+            types = self.node_types[index + 1:self.subtree_ends[index] + 1]
+            names = [name for name, current_type in zip(names, types) if current_type == node_type]
+        return names
+
+    def is_descendant(self, node, ancestor):
+        index = self.index(node)
+        ancestor_index = self.index(ancestor)
+        return ancestor_index < index <= self.subtree_ends[ancestor_index]
+
+    def common_ancestor(self, node_a, node_b):
+        index_a = self.index(node_a)
+        index_b = self.index(node_b)
+        while self.depths[index_a] > self.depths[index_b]:
+            index_a = self.parents[index_a]
+        while self.depths[index_b] > self.depths[index_a]:
+            index_b = self.parents[index_b]
+        while index_a != index_b:
+            index_a = self.parents[index_a]
+            index_b = self.parents[index_b]
+            if index_a < 0 or index_b < 0:
+                return None
+        return self.names[index_a]
+
+
+_snapshot = None
+_dirty = True
+_callback_ids = []
+
+
+def invalidate(*args):
+    global _dirty
+    _dirty = True
+
+
+def register_callbacks():
+    if _callback_ids:
+        return
+    _callback_ids.extend([
+        cbr.register_callback(lambda callback: om.MDagMessage.addAllDagChangesCallback(callback),
+                              invalidate, name="HierarchySnapshot.dag_changed", persistent=True),
+        cbr.register_callback(lambda callback: om.MNodeMessage.addNameChangedCallback(om.MObject.kNullObj, callback),
+                              invalidate, name="HierarchySnapshot.name_changed", persistent=True),
+        cbr.register_callback(lambda callback: om.MSceneMessage.addCallback(om.MSceneMessage.kAfterNew, callback),
+                              invalidate, name="HierarchySnapshot.after_new", persistent=True),
+        cbr.register_callback(lambda callback: om.MSceneMessage.addCallback(om.MSceneMessage.kAfterOpen, callback),
+                              invalidate, name="HierarchySnapshot.after_open", persistent=True),
+    ])
+
+
+def remove_callbacks():
+    for callback_id in _callback_ids:
+        cbr.remove_callback(callback_id)
+    del _callback_ids[:]
+    invalidate()
+
+
+def get_snapshot():
+    """
+    Returns:
+        the current HierarchySnapshot, rebuilt if the DAG changed since the last query
+    """
+    global _snapshot, _dirty
+    register_callbacks()
+    if _snapshot is None or _dirty:
+        _snapshot = HierarchySnapshot().build()
+        _dirty = False
+    return _snapshot
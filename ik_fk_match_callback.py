@@ -1,6 +1,7 @@
 import logging
 import maya.api.OpenMaya as om
 import IKFKSwitchMatch as ifm
+import callback_registry as cbr
 
 #initiate logging with module name
 logger = logging.getLogger(__name__)
@@ -40,23 +41,20 @@ def registerAttributeChangeCallback(nodeName: str):
     selectionList.add(nodeName)
     nodeMObject = selectionList.getDependNode(0)
 
-    #bind the callback function and return the id as reference
-    id = om.MNodeMessage.addAttributeChangedCallback(nodeMObject, ikfkMatchingCallback)
+    #bind the callback function through the registry and return the id as reference
+    id = cbr.register_callback(lambda callback: om.MNodeMessage.addAttributeChangedCallback(nodeMObject, callback),
+                               ikfkMatchingCallback, name="ikfkMatchingCallback", node=nodeMObject)
     return id
 
 def removeCallback(identifier):
-    om.MMessage.removeCallback(identifier)
-    logger.info(f"Callback with ID {identifier} has been removed")
+    if cbr.remove_callback(identifier):
+        logger.info(f"Callback with ID {identifier} has been removed")
 
 def getCallbacks(nodeName):
-    selectionList = om.MSelectionList()
-    selectionList.add(nodeName)
-    nodeMObject = selectionList.getDependNode(0)
-    #collect all callback identifiers on that node (cast to list not callback array)
-    identifiers = list(om.MMessage.nodeCallbacks(nodeMObject))
-    return identifiers
+    #only the callbacks installed by the toolkit, foreign callbacks on the node are left alone
+    return cbr.get_callbacks_on_node(nodeName)
 
 def removeCallbacksOnNode(nodeName):
     identifiers = getCallbacks(nodeName)
     for identifier in identifiers:
-        removeCallback(identifier)
\ No newline at end of file
+        removeCallback(identifier)
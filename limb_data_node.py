@@ -1,4 +1,5 @@
 import maya.cmds as mc
+import metadata_index as mdi
 
 #Create meta data node for limbs
 def create_limb_node(node_name, node_type, node_side):
@@ -63,14 +64,7 @@ def connect_limb_node(data_node, driven_joints, fk_controls, ik_controls, switch
     mc.connectAttr(f"{data_node}.end_marker", f"{end_marker}.dataParent", force=True)
 
 def get_limb_nodes():
-    limb_nodes = []
-    data_nodes = mc.ls(type="network")
-    for dn in data_nodes:
-        if mc.attributeQuery("node_type", node=dn, exists=True):
-            if mc.getAttr(f"{dn}.node_type") in ["Arm", "Leg"]:
-                limb_nodes.append(dn)
-
-    return limb_nodes
+    return mdi.get_metadata_nodes(["Arm", "Leg"])
 
 """
 import limb_data_node as ldn
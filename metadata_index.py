@@ -0,0 +1,203 @@
+import logging
+import maya.api.OpenMaya as om
+import maya.cmds as mc
+import callback_registry as cbr
+
+#initiate logging with module name
+logger = logging.getLogger(__name__)
+
+# attributes holding the type of a metadata network node, muscle data nodes use "type"
+TYPE_ATTRIBUTES = ("node_type", "type")
+
+
+def get_node_type(node_mobject):
+    mfn_node = om.MFnDependencyNode(node_mobject)
+    for attr in TYPE_ATTRIBUTES:
+        if mfn_node.hasAttribute(attr):
+            plug = mfn_node.findPlug(attr, False)
+            try:
+                return plug.asString()
+            except RuntimeError:
+                # not a string attribute, not one of ours
+                return None
+    return None
+
+
+class MetadataIndex(object):
+    '''
+    index of the rig metadata network nodes (coneReader, Arm, Leg, muscleJointGroup...) keyed by their type
+
+    the index is built once with a single ls call and kept current by callbacks:
+        node added / removed on network nodes
+        attribute changed on every network node, to follow node_type being added or set after creation
+        scene new / open, to rebuild lazily on the next lookup
+    '''
+
+    def __init__(self):
+        # node_type -> {hash code: MObjectHandle}, insertion ordered
+        self.nodes_by_type = {}
+        # hash code -> node_type
+        self.type_by_node = {}
+        # hash code -> attribute changed callback id
+        self.node_callbacks = {}
+        self.callback_ids = []
+        self.built = False
+
+    def build(self):
+        self.clear()
+        network_nodes = mc.ls(type="network")
+        if network_nodes:
+            selection_list = om.MSelectionList()
+            for node in network_nodes:
+                selection_list.add(node)
+            for index in range(selection_list.length()):
+                self.add_node(selection_list.getDependNode(index))
+        self.built = True
+
+    def clear(self):
+        for callback_id in self.node_callbacks.values():
+            cbr.remove_callback(callback_id)
+        self.nodes_by_type = {}
+        self.type_by_node = {}
+        self.node_callbacks = {}
+        self.built = False
+
+    def invalidate(self):
+        self.clear()
+
+    def add_node(self, node_mobject):
+        handle = om.MObjectHandle(node_mobject)
+        hash_code = handle.hashCode()
+        if hash_code not in self.node_callbacks:
+            self.node_callbacks[hash_code] = cbr.register_callback(
+                lambda callback: om.MNodeMessage.addAttributeChangedCallback(node_mobject, callback),
+                self.attribute_changed_callback, name="MetadataIndex.attribute_changed", node=node_mobject)
+        self.update_node(node_mobject)
+
+    def remove_node(self, node_mobject):
+        hash_code = om.MObjectHandle(node_mobject).hashCode()
+        self.discard(hash_code)
+        callback_id = self.node_callbacks.pop(hash_code, None)
+        if callback_id is not None:
+            cbr.remove_callback(callback_id)
+
+    def update_node(self, node_mobject):
+        handle = om.MObjectHandle(node_mobject)
+        hash_code = handle.hashCode()
+        node_type = get_node_type(node_mobject)
+        if self.type_by_node.get(hash_code) == node_type:
+            return
+        self.discard(hash_code)
+        if node_type:
+            self.nodes_by_type.setdefault(node_type, {})[hash_code] = handle
+            self.type_by_node[hash_code] = node_type
+
+    def discard(self, hash_code):
+        old_type = self.type_by_node.pop(hash_code, None)
+        if old_type is not None:
+            self.nodes_by_type.get(old_type, {}).pop(hash_code, None)
+
+    def get_nodes(self, node_types):
+        """
+        get the metadata nodes of the given types
+        Args:
+            node_types (str or list): node_type value(s) to look up, e.g. "coneReader" or ["Arm", "Leg"]
+
+        Returns:
+            list of node names
+        """
+        if not self.built:
+            self.build()
+
+        if isinstance(node_types, str):
+            node_types = [node_types]
+
+        nodes = []
+        for node_type in node_types:
+            for handle in self.nodes_by_type.get(node_type, {}).values():
+                if handle.isValid():
+                    nodes.append(om.MFnDependencyNode(handle.object()).name())
+        return nodes
+
+    def is_type(self, node, node_types):
+        if not self.built:
+            self.build()
+
+        if isinstance(node_types, str):
+            node_types = [node_types]
+
+        selection_list = om.MSelectionList()
+        try:
+            selection_list.add(node)
+        except RuntimeError:
+            return False
+        hash_code = om.MObjectHandle(selection_list.getDependNode(0)).hashCode()
+        return self.type_by_node.get(hash_code) in node_types
+
+    def node_added_callback(self, node_mobject, clientData):
+        if self.built:
+            self.add_node(node_mobject)
+
+    def node_removed_callback(self, node_mobject, clientData):
+        if self.built:
+            self.remove_node(node_mobject)
+
+    def attribute_changed_callback(self, msg, plug, otherPlug, clientData):
+        if not msg & (om.MNodeMessage.kAttributeSet | om.MNodeMessage.kAttributeAdded |
+                      om.MNodeMessage.kAttributeRemoved):
+            return
+        if plug.partialName(useLongNames=True) in TYPE_ATTRIBUTES:
+            self.update_node(plug.node())
+
+    def scene_changed_callback(self, clientData):
+        self.invalidate()
+
+    def register_callbacks(self):
+        if self.callback_ids:
+            return
+        # scene level callbacks, they have to survive the registry's teardown on scene new/open
+        self.callback_ids = [
+            cbr.register_callback(lambda callback: om.MDGMessage.addNodeAddedCallback(callback, "network"),
+                                  self.node_added_callback, name="MetadataIndex.node_added", persistent=True),
+            cbr.register_callback(lambda callback: om.MDGMessage.addNodeRemovedCallback(callback, "network"),
+                                  self.node_removed_callback, name="MetadataIndex.node_removed", persistent=True),
+            cbr.register_callback(
+                lambda callback: om.MSceneMessage.addCallback(om.MSceneMessage.kBeforeNew, callback),
+                self.scene_changed_callback, name="MetadataIndex.before_new", persistent=True),
+            cbr.register_callback(
+                lambda callback: om.MSceneMessage.addCallback(om.MSceneMessage.kBeforeOpen, callback),
+                self.scene_changed_callback, name="MetadataIndex.before_open", persistent=True),
+        ]
+
+    def remove_callbacks(self):
+        for callback_id in self.callback_ids:
+            cbr.remove_callback(callback_id)
+        self.callback_ids = []
+        self.clear()
+
+
+_index = None
+
+
+def get_index():
+    global _index
+    if _index is None:
+        _index = MetadataIndex()
+        _index.register_callbacks()
+    return _index
+
+
+def get_metadata_nodes(node_types):
+    return get_index().get_nodes(node_types)
+
+
+def is_metadata_node(node, node_types):
+    return get_index().is_type(node, node_types)
+
+
+def remove_index():
+    global _index
+    if _index is not None:
+        _index.remove_callbacks()
+        _index = None
+        logger.info("Metadata index has been removed")
@@ -0,0 +1,98 @@
+import os
+import maya.api.OpenMaya as om
+import maya.cmds as mc
+
+"""
+make MDGModifier/MDagModifier edits part of Maya's undo queue
+
+modifiers executed from a script are not recorded by undo, so the toolkit runs them through a small
+undoable command registered by this file (which doubles as the plugin):
+
+    import modifier_undo as mu
+    dag_modifier = om.MDagModifier()
+    ...
+    mu.apply_modifier(dag_modifier)
+"""
+
+COMMAND_NAME = "rigApplyModifier"
+PLUGIN_NAME = "modifier_undo.py"
+
+# modifiers waiting for the command to pick them up
+pending_modifiers = []
+
+
+def maya_useNewAPI():
+    pass
+
+
+class ApplyModifierCommand(om.MPxCommand):
+
+    def __init__(self):
+        om.MPxCommand.__init__(self)
+        self.modifier = None
+
+    @classmethod
+    def creator(cls):
+        return cls()
+
+    def doIt(self, args):
+        # the plugin can be registered under another module name, always read the queue of the imported module
+        import modifier_undo
+        if not modifier_undo.pending_modifiers:
+            raise RuntimeError("No modifier to apply")
+        self.modifier = modifier_undo.pending_modifiers.pop(0)
+        self.modifier.doIt()
+
+    def redoIt(self):
+        self.modifier.doIt()
+
+    def undoIt(self):
+        self.modifier.undoIt()
+
+    def isUndoable(self):
+        return True
+
+
+def load_plugin():
+    if not mc.pluginInfo(PLUGIN_NAME, query=True, loaded=True):
+        plugin_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), PLUGIN_NAME)
+        mc.loadPlugin(plugin_path, quiet=True)
+
+
+def apply_modifier(modifier):
+    """
+    execute the modifier through the undoable command
+
+    Args:
+        modifier (MDGModifier): modifier holding the queued operations, or any object with doIt/undoIt
+
+    Returns:
+        the modifier
+    """
+    load_plugin()
+    pending_modifiers.append(modifier)
+    try:
+        getattr(mc, COMMAND_NAME)()
+    except:
+        if modifier in pending_modifiers:
+            pending_modifiers.remove(modifier)
+        raise
+    return modifier
+
+
+def initializePlugin(plugin):
+    plugin_fn = om.MFnPlugin(plugin, "Character-Rig", "1.0")
+    try:
+        plugin_fn.registerCommand(COMMAND_NAME, ApplyModifierCommand.creator)
+    except:
+        om.MGlobal.displayError(f"Failed to register command: {COMMAND_NAME}")
+        raise
+
+
+def uninitializePlugin(plugin):
+    plugin_fn = om.MFnPlugin(plugin)
+    try:
+        plugin_fn.deregisterCommand(COMMAND_NAME)
+    except:
+        om.MGlobal.displayError(f"Failed to deregister command: {COMMAND_NAME}")
+        raise
@@ -1,7 +1,11 @@
 import maya.cmds as mc
-import maya.mel as mel
 import maya.api.OpenMaya as om
 import re
+import control_shape_library as csl
+import control_shapes as cs
+import face_control_registry as fcr
+import hierarchy_snapshot as hs
+import uv_index as uvi
 
 
 def add_shape_between_string_and_suffix(input_string, shape="Shape"):
@@ -30,20 +34,8 @@ def get_joint_chain(start_joint, end_joint):
     Returns:
         A list of joint names, from the start joint to the end joint.
     """
-    children_joints = mc.listRelatives(start_joint, allDescendents=True, type='joint')
-
-    if end_joint not in children_joints:
-        return
-
-    joint_chain = [end_joint]
-    parentJoint = mc.listRelatives(end_joint, parent=True, type='joint')[0]
-    joint_chain.append(parentJoint)
-    while parentJoint != start_joint:
-        parentJoint = mc.listRelatives(parentJoint, parent=True, type='joint')[0]
-        joint_chain.append(parentJoint)
-
-    joint_chain.reverse()
-    return joint_chain
+    # walk the cached hierarchy instead of querying the scene once per joint
+    return hs.get_snapshot().chain(start_joint, end_joint, node_type='joint')
 
 
 def create_zero_group(node, group_name=None, group_type="transform"):
@@ -92,12 +84,12 @@ def get_shape(obj, shapeTypes=None, longNames=False):
 
 
 def create_control(shape_name="octagonPoint", control_name="FKControl1"):
-    control = mel.eval('createControlShapes("' + shape_name + '");')
-    control_transform = create_zero_group(control, group_name=control_name, group_type="joint")
-    control_shape = get_shape(control)
-    mc.parent(control_shape, control_transform, relative=True, shape=True)
-    mc.delete(control)
-    mc.rename(control_shape, add_shape_between_string_and_suffix(control_name))
+    mc.select(clear=True)
+    control_transform = mc.joint(name=control_name)
+    # the prototype is built once per session, every control stamps its curves from the cached data
+    control_shapes = csl.create_shapes(shape_name, control_transform)
+    for control_shape in control_shapes:
+        mc.rename(control_shape, add_shape_between_string_and_suffix(control_name))
     mc.setAttr("{0}.drawStyle".format(control_transform), 2)
     return control_transform
 
@@ -106,69 +98,32 @@ def mirrorControlShapes(side="Left"):
     """
     Mirrors control shapes. Default parameter is "Left" for left to right.
     Provide "Right" as parameter for mirring right to left.
+    Shapes with a different topology on the other side are skipped and listed in the returned report.
     """
-    if side == "Left":
-        otherSide = "Right"
-    else:
-        otherSide = "Left"
-
-    selectedNodes = mc.ls(sl=True, type='transform')
-    if not len(selectedNodes):
-        selectedNodes = mc.ls(side + '*Control*', type='transform')
-
-    for s in selectedNodes:
-        shapes = mc.listRelatives(s, shapes=True)
-        if shapes:
-            leftShape = shapes[0]
-            rightShape = mc.ls(str(leftShape).replace(side, otherSide))
-            if len(rightShape):
-                rightShape = rightShape[0]
-            else:
-                continue
-
-            spans = mc.getAttr(f'{leftShape}.spans')
-            degrees = mc.getAttr(f'{leftShape}.degree')
-            print(leftShape)
-            numCVs = spans + degrees
-            print(spans, degrees)
-            print(numCVs)
-            for i in range(numCVs):
-                cv = mc.pointPosition(f'{leftShape}.cv[{i}]', local=True)
-                cv[0] = cv[0] * -1
-                mc.xform(f'{rightShape}.cv[{i}]', objectSpace=True, translation=cv)
+    report = cs.mirror_curve_shapes(side=side)
+    for shape, other_shape, reason in report["mismatched"]:
+        mc.warning(f"Skipped mirroring {shape} to {other_shape}: {reason}")
+    return report
 
 
 def scaleControlShape(controls=None, scaleValue=None):
     ''' Takes a list of controls and a float scale value.
-        Scales the cvs and vtxs of a controls shapes.
+        Scales the cvs and vtxs of a controls shapes, without touching the selection.
     '''
 
-    if not controls:
-        controls = mc.ls(selection=True)
-
     if scaleValue is None:
         scaleValue = .6
 
-    if isinstance(controls, str) or isinstance(controls, str):
-        controls = [controls]
-
-    originalSelection = mc.ls(selection=True)
-    for control in controls:
-        shapes = mc.listRelatives(control, children=True, shapes=True, path=True) or []
-
-        for shape in shapes:
-            cvs = mc.ls(shape + '.cv[:]', flatten=True)
-            vtx = mc.ls(shape + '.vtx[:]', flatten=True)
+    # mc.scale on the selected components pivoted on their bounding box center
+    return cs.transform_control_shapes(controls, scale=scaleValue, pivot="center")
 
-            mc.select(cvs + vtx, replace=True)
 
-            mc.scale(scaleValue, scaleValue, scaleValue, relative=True)
-
-    mc.select(originalSelection, replace=True)
-
-
-def exportControlShape():
-    pass
+def exportControlShape(filepath, controls=None):
+    """
+    Exports the curve shapes of the controls, all controls of the rig by default, to one library file.
+    Reapply them with control_shape_library.apply_rig_shapes(filepath).
+    """
+    return csl.export_rig_shapes(filepath, controls=controls)
 
 
 def create_control_on_node(node, shape_name="octagonPoint"):
@@ -199,59 +154,19 @@ def create_fkchain(start_joint, end_joint):
 
 def mirrorNrubsSurface(side="Left"):
     """
-    Mirrors control shapes. Default parameter is "Left" for left to right.
+    Mirrors nurbs surfaces. Default parameter is "Left" for left to right.
     Provide "Right" as parameter for mirring right to left.
+    The CVs are reversed along U so the mirrored surface keeps its orientation.
     """
-    if side == "Left":
-        otherSide = "Right"
-    else:
-        otherSide = "Left"
-
-    selectedNodes = mc.ls(sl=True, type='transform')
-
-    for s in selectedNodes:
-        shapes = mc.listRelatives(s, shapes=True)
-        if shapes:
-            leftShape = shapes[0]
-            rightShape = mc.ls(str(leftShape).replace(side, otherSide))
-            if len(rightShape):
-                rightShape = rightShape[0]
-            else:
-                continue
-
-            spans = mc.getAttr(f'{leftShape}.spansUV')[0]
-            degrees = mc.getAttr(f'{leftShape}.degreeUV')[0]
-            numCVs_U = spans[0] + degrees[0]
-            numCVs_V = spans[1] + degrees[1]
-            for u in range(numCVs_U):
-                for v in range(numCVs_V):
-                    cv = mc.pointPosition(f'{leftShape}.cv[{u}][{v}]', local=True)
-                    print(f'{leftShape}.cv[{u}{v}]')
-                    print(f'{rightShape}.cv[{numCVs_U - u - 1}{v}]')
-                    cv[0] = cv[0] * -1
-                    mc.xform(f'{rightShape}.cv[{numCVs_U - u - 1}][{v}]', worldSpace=True, translation=cv)
+    report = cs.mirror_surface_shapes(side=side, reverse="u")
+    for shape, other_shape, reason in report["mismatched"]:
+        mc.warning(f"Skipped mirroring {shape} to {other_shape}: {reason}")
+    return report
 
 
 def mirrorNurbsSurfaceInOne():
-    #mirror within one single NurbsSurface
-    selectedNodes = mc.ls(sl=True, type='transform')
-
-    for s in selectedNodes:
-        shapes = mc.listRelatives(s, shapes=True)
-        if shapes:
-            Shape = shapes[0]
-            spans = mc.getAttr(f'{Shape}.spansUV')[0]
-            degrees = mc.getAttr(f'{Shape}.degreeUV')[0]
-            numCVs_U = spans[0] + degrees[0]
-            numCVs_V = spans[1] + degrees[1]
-            num_midpoint = numCVs_U / 2
-            for u in range(int(num_midpoint)):
-                for v in range(numCVs_V):
-                    cv = mc.pointPosition(f'{Shape}.cv[{u}][{v}]', local=True)
-                    print(f'{Shape}.cv[{u}{v}]')
-                    print(f'{Shape}.cv[{numCVs_U- 1}{v}]')
-                    cv[0] = cv[0] * -1
-                    mc.xform(f'{Shape}.cv[{numCVs_U - 1}][{v}]', objectSpace=True, translation=cv)
+    #mirror within one single NurbsSurface, the first half along U is mirrored onto the second half
+    return cs.mirror_surface_shapes_in_place(reverse="u")
 
 def addFlagsToControl(control):
     if not mc.attributeQuery("controlLocation", node=control, exists=True):
@@ -260,6 +175,7 @@ def addFlagsToControl(control):
     if not mc.attributeQuery("controlType", node=control, exists=True):
         mc.addAttr(control, longName="controlType", attributeType="enum",
                          enumName="UpperBody:LowerBody:Main:Face:Hand:Slider",keyable=False)
+    fcr.add_control(control)
 
 
 
@@ -267,14 +183,15 @@ def getClosestUVAtPoint(point, geometry, uvSet=None):
     point = om.MPoint(point)
     mSelectionList = om.MSelectionList()
     mSelectionList.add(geometry)
-    mDagPath = mselection.getDagPath(0)
+    mDagPath = mSelectionList.getDagPath(0)
+    mDagPath.extendToShape()
 
     if mDagPath.apiType() == om.MFn.kMesh:
         mfnMesh = om.MFnMesh(mDagPath)
         u, v, polyID = mfnMesh.getUVAtPoint(point, space=om.MSpace.kWorld, uvSet=uvSet)
         return u, v
 
-    elif nDagPath.apiType() == om.MFn.kNurbSurface:
+    elif mDagPath.apiType() == om.MFn.kNurbsSurface:
         mfnNurbs = om.MFnNurbsSurface(mDagPath)
         point, u, v = mfnNurbs.closestPoint(point, space=om.MSpace.kWorld)
         return u, v
@@ -284,28 +201,52 @@ def getClosestUVAtPoint(point, geometry, uvSet=None):
 
 
 def getPointAtUv(uv, mesh, uvSet=None):
-    mSelectionList = om.MSelectionList()
-    mSelectionList.add(mesh)
-    mDagPath = mselection.getDagPath(0)
-    mItMeshPolygon = om.MItMeshPolygon(mDagPath)
+    """
+    world position on a mesh at a UV, looked up in the cached UV index of the mesh instead of trying every polygon
 
-    while not mItMeshPolygon.isDone():
-        try:
-            point = mItMeshPolygon.getPointAtUV(uv, space=om.MSpace.kWorld, uvSet=uvSet)
-        except:
-            pass
-        mItMeshPolygon.next()
+    Args:
+        uv (list): [u, v]
+        mesh (str): mesh shape or transform
+        uvSet (str): uv set, the current one if None
+
+    Returns:
+        MPoint
+    """
+    index = uvi.get_uv_index(mesh, uv_set=uvSet)
+    closest, triangle_ids = index.closest_uvs([uv])
+    return om.MPoint(*index.points_at_uvs(closest)[0])
 
-    return point
 
 def mirrorJoint(jnt, geo):
-    mc.xform(jnt, translation=True, worldSpace=True, query=True)
-    u, v = getClosestUvAtPoint(jnt, geo, uvSet="map1")
+    position = mc.xform(jnt, translation=True, worldSpace=True, query=True)
+    u, v = getClosestUVAtPoint(position, geo, uvSet="map1")
     mirrorPoint = getPointAtUv([1-u, v], geo, uvSet="map1")
     mirrorJoint = jnt.replace("Left", "Right")
     mc.xform(mirrorJoint, translation=(mirrorPoint.x, mirrorPoint.y, mirrorPoint.z), worldSpace=True)
 
 
+def mirrorJoints(joints, geo, uvSet="map1"):
+    """
+    mirror many joints across the U = 0.5 line of a mesh with one UV index lookup for the whole batch
+
+    Args:
+        joints (list): left joints, their "Right" counterparts are moved
+        geo (str): mesh the joints sit on
+        uvSet (str): uv set
+    """
+    mfnMesh = om.MFnMesh(cs.get_dag_path(geo))
+    uvs = []
+    for jnt in joints:
+        position = mc.xform(jnt, translation=True, worldSpace=True, query=True)
+        u, v, polyID = mfnMesh.getUVAtPoint(om.MPoint(position), space=om.MSpace.kWorld, uvSet=uvSet)
+        uvs.append([1 - u, v])
+
+    index = uvi.get_uv_index(geo, uv_set=uvSet)
+    closest, triangle_ids = index.closest_uvs(uvs)
+    for jnt, mirrorPoint in zip(joints, index.points_at_uvs(closest)):
+        mc.xform(jnt.replace("Left", "Right"), translation=mirrorPoint.tolist(), worldSpace=True)
+
+
 
 
 
@@ -0,0 +1,273 @@
+import hashlib
+import logging
+import os
+import numpy as np
+import maya.api.OpenMaya as om
+import maya.cmds as mc
+import control_shapes as cs
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+"""
+vertex to vertex symmetry map of a mesh
+
+the map is built once per topology:
+    1. every vertex is mirrored across the plane and matched to the nearest vertex with a KD-tree
+       (chunked brute force when scipy is not available), matches further than the tolerance are rejected
+    2. the vertices left over (asymmetric sculpt) are matched by walking the topology out from the matched ones,
+       the mirror of a vertex has to be a neighbour of the mirror of one of its neighbours
+maps are saved to <cache dir>/<topology hash>_<plane>.npz and loaded back for any mesh sharing the topology.
+
+positions and joints are mirrored through their nearest vertex:
+    mirrored = position of the mirror vertex + reflected offset from the nearest vertex
+so a whole set is mirrored with one nearest vertex query and one gather.
+
+usage:
+    import symmetry_map as sym
+    sym.mirror_joints(mc.ls("JOLeft*", type="joint"), "faceMesh")
+"""
+
+#initiate logging with module name
+logger = logging.getLogger(__name__)
+
+# topology hash, plane -> (N,) mirror vertex ids
+_maps = {}
+
+
+def get_cache_dir():
+    return os.path.join(mc.internalVar(userAppDir=True), "symmetryMaps")
+
+
+def get_mesh_topology(mfn_mesh):
+    polygon_counts, polygon_vertices = mfn_mesh.getVertices()
+    return np.asarray(polygon_counts, dtype=np.int64), np.asarray(polygon_vertices, dtype=np.int64)
+
+
+def hash_topology(vertex_count, polygon_counts, polygon_vertices):
+    digest = hashlib.sha1()
+    digest.update(np.int64(vertex_count).tobytes())
+    digest.update(np.ascontiguousarray(polygon_counts).tobytes())
+    digest.update(np.ascontiguousarray(polygon_vertices).tobytes())
+    return digest.hexdigest()
+
+
+def get_adjacency(vertex_count, polygon_counts, polygon_vertices):
+    """
+    vertex neighbours from the polygon edges, as CSR arrays
+
+    Returns:
+        (starts (V + 1,), neighbours), the neighbours of vertex i are neighbours[starts[i]:starts[i + 1]]
+    """
+    face_starts = np.concatenate([[0], np.cumsum(polygon_counts)[:-1]])
+    face_ids = np.repeat(np.arange(len(polygon_counts)), polygon_counts)
+    local = np.arange(len(polygon_vertices)) - face_starts[face_ids]
+    # next corner of the same polygon, wrapping around
+    next_ids = face_starts[face_ids] + (local + 1) % polygon_counts[face_ids]
+
+    edges = np.stack([polygon_vertices, polygon_vertices[next_ids]], axis=-1)
+    edges = np.unique(np.sort(np.concatenate([edges, edges[:, ::-1]]), axis=1), axis=0)
+    edges = np.concatenate([edges, edges[:, ::-1]])
+    edges = edges[np.lexsort((edges[:, 1], edges[:, 0]))]
+    starts = np.searchsorted(edges[:, 0], np.arange(vertex_count + 1))
+    return starts, edges[:, 1]
+
+
+def nearest_vertices(positions, queries, chunk_size=None):
+    """
+    nearest vertex of every query point
+
+    Args:
+        positions (array_like): (V, 3) vertex positions
+        queries (array_like): (N, 3) points
+
+    Returns:
+        (vertex ids (N,), distances (N,))
+    """
+    positions = np.asarray(positions, dtype=np.float64)
+    queries = np.atleast_2d(np.asarray(queries, dtype=np.float64))
+    if cKDTree is not None:
+        distances, vertex_ids = cKDTree(positions).query(queries)
+        return np.asarray(vertex_ids, dtype=np.int64), distances
+
+    # keep the distance block around 16M entries
+    if chunk_size is None:
+        chunk_size = max(1, 16000000 // max(len(positions), 1))
+    squared_positions = np.sum(positions * positions, axis=1)
+    vertex_ids = np.empty(len(queries), dtype=np.int64)
+    distances = np.empty(len(queries))
+    for start in range(0, len(queries), chunk_size):
+        chunk = queries[start:start + chunk_size]
+        squared = squared_positions[None, :] - 2.0 * chunk @ positions.T + np.sum(chunk * chunk, axis=1)[:, None]
+        nearest = np.argmin(squared, axis=1)
+        vertex_ids[start:start + chunk_size] = nearest
+        distances[start:start + chunk_size] = np.sqrt(np.maximum(squared[np.arange(len(chunk)), nearest], 0.0))
+    return vertex_ids, distances
+
+
+def build_symmetry_map(positions, adjacency, plane="YZ", tolerance=1e-3):
+    """
+    match every vertex to its mirror vertex
+
+    Args:
+        positions (array_like): (V, 3) vertex positions, symmetric across the plane through the origin
+        adjacency (tuple): CSR (starts, neighbours) from get_adjacency
+        plane (str or sequence): "YZ", "XZ", "XY" or the plane normal
+        tolerance (float): max distance between a mirrored vertex and its match, relative to the mesh size
+
+    Returns:
+        (V,) mirror vertex ids, -1 for vertices that could not be matched
+    """
+    positions = np.asarray(positions, dtype=np.float64)
+    starts, neighbours = adjacency
+    mirrored = cs.mirror_points(positions, plane)
+    size = np.linalg.norm(positions.max(axis=0) - positions.min(axis=0)) if len(positions) else 1.0
+
+    mirror_ids, distances = nearest_vertices(positions, mirrored)
+    mirror_ids[distances > tolerance * size] = -1
+    # a match has to be mutual, otherwise two vertices could claim the same mirror
+    matched = mirror_ids >= 0
+    mutual = np.zeros(len(positions), dtype=bool)
+    mutual[matched] = mirror_ids[mirror_ids[matched]] == np.nonzero(matched)[0]
+    mirror_ids[~mutual] = -1
+
+    # topology walk for the vertices the positions could not settle
+    unmatched = np.nonzero(mirror_ids < 0)[0]
+    while len(unmatched):
+        claimed = np.zeros(len(positions), dtype=bool)
+        claimed[mirror_ids[mirror_ids >= 0]] = True
+        progress = False
+        # the most constrained vertices first, the ones with the most matched neighbours
+        matched_counts = [np.count_nonzero(mirror_ids[neighbours[starts[vertex]:starts[vertex + 1]]] >= 0)
+                          for vertex in unmatched]
+        for vertex in unmatched[np.argsort(matched_counts, kind="stable")[::-1]]:
+            if mirror_ids[vertex] >= 0:
+                # matched as the mirror of a vertex earlier in this pass
+                continue
+            vertex_neighbours = neighbours[starts[vertex]:starts[vertex + 1]]
+            mirror_neighbours = mirror_ids[vertex_neighbours]
+            mirror_neighbours = mirror_neighbours[mirror_neighbours >= 0]
+            if not len(mirror_neighbours):
+                continue
+            candidates = np.unique(np.concatenate([neighbours[starts[neighbour]:starts[neighbour + 1]]
+                                                   for neighbour in mirror_neighbours]))
+            candidates = candidates[~claimed[candidates] | (candidates == vertex)]
+            if not len(candidates):
+                continue
+            # the candidate sharing the most mirrored neighbours, then the closest to the mirrored position
+            shared = np.array([np.isin(neighbours[starts[candidate]:starts[candidate + 1]],
+                                       mirror_neighbours).sum() for candidate in candidates])
+            candidates = candidates[shared == shared.max()]
+            best = candidates[np.argmin(np.sum((positions[candidates] - mirrored[vertex]) ** 2, axis=1))]
+            mirror_ids[vertex] = best
+            mirror_ids[best] = vertex
+            claimed[[vertex, best]] = True
+            progress = True
+        unmatched = np.nonzero(mirror_ids < 0)[0]
+        if not progress:
+            break
+
+    if len(unmatched):
+        logger.warning(f"{len(unmatched)} vertices could not be matched to a mirror vertex")
+    return mirror_ids
+
+
+def get_symmetry_map(mesh, plane="YZ", tolerance=1e-3, cache_dir=None, rebuild=False):
+    """
+    symmetry map of a mesh, from the session cache, the disk cache or built from the object space positions
+
+    Args:
+        mesh (str): mesh shape or transform
+        plane (str): "YZ", "XZ" or "XY"
+        tolerance (float): match tolerance relative to the mesh size
+        cache_dir (str): folder of the saved maps, the maya user folder if None
+        rebuild (bool): ignore the cached maps
+
+    Returns:
+        (V,) mirror vertex ids
+    """
+    mfn_mesh = om.MFnMesh(cs.get_dag_path(mesh))
+    polygon_counts, polygon_vertices = get_mesh_topology(mfn_mesh)
+    topology_hash = hash_topology(mfn_mesh.numVertices, polygon_counts, polygon_vertices)
+    key = (topology_hash, plane.upper())
+    if key in _maps and not rebuild:
+        return _maps[key]
+
+    filepath = os.path.join(cache_dir or get_cache_dir(), f"{topology_hash}_{plane.upper()}.npz")
+    if os.path.exists(filepath) and not rebuild:
+        with np.load(filepath) as data:
+            _maps[key] = data["mirror_ids"]
+        return _maps[key]
+
+    positions = cs.points_to_array(mfn_mesh.getPoints(om.MSpace.kObject))
+    adjacency = get_adjacency(mfn_mesh.numVertices, polygon_counts, polygon_vertices)
+    mirror_ids = build_symmetry_map(positions, adjacency, plane=plane, tolerance=tolerance)
+
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    np.savez_compressed(filepath, mirror_ids=mirror_ids)
+    logger.info(f"Symmetry map of {mesh} saved to {filepath}")
+    _maps[key] = mirror_ids
+    return mirror_ids
+
+
+def clear_cache():
+    _maps.clear()
+
+
+def mirror_positions(positions, mesh, plane="YZ", space=om.MSpace.kWorld):
+    """
+    mirror points through the symmetry map of a mesh, each point follows the mirror of its nearest vertex
+
+    the map and the plane are in the object space of the mesh, world points are brought into it,
+    mirrored there and moved back, so a moved or rotated mesh mirrors across its own plane
+
+    Args:
+        positions (array_like): (N, 3) points
+        mesh (str): mesh the points sit on or near
+        plane (str): "YZ", "XZ" or "XY"
+        space (MSpace): space of the points, kWorld or kObject
+
+    Returns:
+        (N, 3) mirrored points
+    """
+    if space not in (om.MSpace.kWorld, om.MSpace.kObject):
+        raise ValueError(f"Invalid space: {space}, use MSpace.kWorld or MSpace.kObject")
+    positions = np.atleast_2d(np.asarray(positions, dtype=np.float64))
+    mirror_ids = get_symmetry_map(mesh, plane=plane)
+    dag_path = cs.get_dag_path(mesh)
+    vertices = cs.points_to_array(om.MFnMesh(dag_path).getPoints(om.MSpace.kObject))
+    if space == om.MSpace.kWorld:
+        world_matrix = np.array(list(dag_path.inclusiveMatrix()), dtype=np.float64).reshape(4, 4)
+        positions = cs.transform_points(positions, np.linalg.inv(world_matrix))
+
+    nearest, distances = nearest_vertices(vertices, positions)
+    targets = mirror_ids[nearest]
+    # unmatched vertices fall back to a plain reflection
+    offsets = cs.mirror_points(positions - vertices[nearest], plane)
+    mirrored = np.where((targets >= 0)[:, None], vertices[np.maximum(targets, 0)] + offsets,
+                        cs.mirror_points(positions, plane))
+    if space == om.MSpace.kWorld:
+        mirrored = cs.transform_points(mirrored, world_matrix)
+    return mirrored
+
+
+def mirror_joints(joints, mesh, side="Left", other_side="Right", plane="YZ"):
+    """
+    move the other side counterpart of each joint to its mirrored position on the mesh
+
+    Returns:
+        list of the moved joints
+    """
+    joints = [joint for joint in joints if joint.replace(side, other_side) != joint]
+    if not joints:
+        return []
+    positions = [mc.xform(joint, translation=True, worldSpace=True, query=True) for joint in joints]
+    moved = []
+    for joint, position in zip(joints, mirror_positions(positions, mesh, plane=plane)):
+        other_joint = joint.replace(side, other_side)
+        if mc.ls(other_joint):
+            mc.xform(other_joint, translation=position.tolist(), worldSpace=True)
+            moved.append(other_joint)
+    return moved
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the modules live at the root of the repository, the Maya-free ones are importable without Maya
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+import conereader_eval as cre
+
+"""
+Maya-free tests of the cone sizes drawn and redrawn by conereader.draw_and_connect_cone / updateConeShape
+"""
+
+
+@pytest.mark.parametrize("angles", [(20.0, 80.0), (0.0, 90.0), (-45.0, 180.0)])
+def test_x_axis_cones_match_z_axis_cones(angles):
+    # the min and max locators of a reader built with axis "x" by conereader_builder
+    x_positions = cre.locator_position(angles, axis="x")
+    z_positions = cre.locator_position(angles, axis="z")
+    np.testing.assert_allclose(x_positions[:, 0], 0.0)
+
+    x_radius, x_ratio, x_side = cre.cone_dimensions(x_positions)
+    z_radius, z_ratio, z_side = cre.cone_dimensions(z_positions)
+    assert np.all(np.isfinite(x_ratio))
+    np.testing.assert_allclose(x_radius, z_radius)
+    np.testing.assert_allclose(x_ratio, z_ratio)
+    np.testing.assert_array_equal(x_side, z_side)
+
+
+def test_locator_on_the_cone_axis_draws_a_needle():
+    radius, ratio, side = cre.cone_dimensions(cre.CENTER_VECTOR)
+    assert radius == cre.MIN_CONE_RADIUS
+    assert ratio == pytest.approx(2.0 / cre.MIN_CONE_RADIUS)
+    assert side == 1.0
+
+
+def test_cone_height_ratio():
+    radius, ratio, side = cre.cone_dimensions(cre.locator_position(150.0, axis="x"))
+    assert radius == pytest.approx(1.0)
+    assert ratio == pytest.approx(np.sqrt(3.0))
+    assert side == -1.0
+
+
+def test_invalid_axis():
+    with pytest.raises(ValueError):
+        cre.locator_position(30.0, axis="y")
@@ -0,0 +1,83 @@
+import numpy as np
+import facs_blend_eval as fbe
+import facs_preview_eval as fpe
+
+"""
+Maya-free tests of the combination deltas keyed by facs_combination.get_combination_values
+"""
+
+SCALE_X = 6
+ROTATE_Z = 5
+
+
+def get_table(combination_entries=()):
+    """
+    shape 0 drives blend node 0 scaleX 1 -> 1.5 and rotateZ 0 -> 0.2, shapes 1 and 2 drive nothing,
+    shape 2 is the product of 0 and 1, blend node 1 is not driven
+
+    Args:
+        combination_entries (list): (output, channel, first value, last value) curves keyed on shape 2
+    """
+    entries = [(0, SCALE_X, 0, 1.0, 1.5), (0, ROTATE_Z, 0, 0.0, 0.2)]
+    entries += [(output, channel, 2, first, last) for output, channel, first, last in combination_entries]
+    outputs, channels, shapes, first_values, last_values = zip(*entries)
+    key_values = np.column_stack([first_values, last_values]).reshape(-1)
+    table = fbe.PoseTable(outputs, channels, shapes, np.arange(0, 2 * len(entries) + 1, 2),
+                          np.tile([0.0, 1.0], len(entries)), key_values,
+                          np.tile(fpe.NEUTRAL_CHANNELS, (2, 1)), shape_count=3)
+    return table, fpe.CorrectiveTable([2], [0, 2], [0, 1])
+
+
+def get_targets():
+    targets = np.tile(fpe.NEUTRAL_CHANNELS, (1, 1))
+    targets[0, SCALE_X] = 1.8
+    targets[0, ROTATE_Z] = 0.5
+    return targets
+
+
+def key_deltas(deltas):
+    """
+    the table with the deltas keyed on shape 2, first keys at the neutral channels
+    """
+    table, _ = get_table([(0, SCALE_X, 1.0, deltas[0, SCALE_X]), (0, ROTATE_Z, 0.0, deltas[0, ROTATE_Z])])
+    return table
+
+
+def test_new_curves_start_from_neutral():
+    table, correctives = get_table()
+    weights = correctives.apply([1.0, 1.0, 0.0])[0]
+    deltas = fpe.get_combination_deltas(table, weights, 2, get_targets(), [0])
+
+    # the new curves start at 1 for scale and 0 for rotate, the lower order shapes give 1.5 and 0.2
+    np.testing.assert_allclose(deltas[0, SCALE_X], 1.8 - 1.5 + 1.0)
+    np.testing.assert_allclose(deltas[0, ROTATE_Z], 0.5 - 0.2)
+    np.testing.assert_allclose(deltas[0, [0, 1, 2, 3, 4]], 0.0)
+    np.testing.assert_allclose(deltas[0, [7, 8]], 1.0)
+
+    # keyed, turning the combination on moves the channels by target - lower order evaluation
+    keyed = key_deltas(deltas)
+    change = keyed.evaluate(weights) - keyed.evaluate(np.array([1.0, 1.0, 0.0]))
+    np.testing.assert_allclose(change[0, [SCALE_X, ROTATE_Z]], [1.8 - 1.5, 0.5 - 0.2])
+
+
+def test_existing_curves_start_from_their_first_key():
+    table, correctives = get_table([(0, SCALE_X, 1.0, 1.1), (0, ROTATE_Z, 0.0, 0.1)])
+    weights = correctives.apply([1.0, 1.0, 0.0])[0]
+    deltas = fpe.get_combination_deltas(table, weights, 2, get_targets(), [0])
+
+    # the lower order evaluation holds the first keys of the combination curves, 1.5 + 1 and 0.2 + 0
+    np.testing.assert_allclose(deltas[0, SCALE_X], 1.8 - 2.5 + 1.0)
+    np.testing.assert_allclose(deltas[0, ROTATE_Z], 0.5 - 0.2)
+
+    # the keys replace the old ones, the combination reaches the targets
+    np.testing.assert_allclose(key_deltas(deltas).evaluate(weights)[0, [SCALE_X, ROTATE_Z]], [1.8, 0.5])
+
+
+def test_undriven_blend_node_keys_the_target():
+    table, correctives = get_table()
+    weights = correctives.apply([1.0, 1.0, 0.0])[0]
+    targets = np.vstack([get_targets(), get_targets()])
+    deltas = fpe.get_combination_deltas(table, weights, 2, targets, [0, -1])
+
+    np.testing.assert_allclose(deltas[1], targets[1])
+    np.testing.assert_allclose(deltas[0, SCALE_X], 1.8 - 1.5 + 1.0)
@@ -0,0 +1,299 @@
+import numpy as np
+import maya.api.OpenMaya as om
+import callback_registry as cbr
+
+"""
+spatial index over the UV triangles of a mesh
+
+the triangles are binned once into a uniform grid over the UV bounding box. A query only tests the
+triangles of the cell it falls in, so point-at-UV costs O(1) on average instead of a getPointAtUV call
+per polygon. Indices are cached per mesh and UV set and dropped by a topology changed callback, a cheap
+vertex/face/UV count check catches the rest. The world positions are read in one getPoints call per query batch
+so a deforming mesh does not invalidate the index. UVs moved without changing any count need rebuild=True.
+
+usage:
+    import uv_index as uvi
+    points = uvi.get_uv_index("faceMesh").points_at_uvs([[0.25, 0.5], [0.75, 0.5]])
+"""
+
+# (mesh path, uv set) -> (MObjectHandle of the mesh, mesh counts, UVIndex)
+_index_cache = {}
+# hash code of a mesh -> (MObjectHandle of the mesh, topology changed callback id)
+_mesh_callbacks = {}
+
+
+def get_dag_path(node):
+    selection_list = om.MSelectionList()
+    selection_list.add(node)
+    return selection_list.getDagPath(0)
+
+
+def get_mesh_data(mfn_mesh, uv_set=None):
+    """
+    read the triangles of a mesh with their vertex and UV ids, all through array calls
+
+    Returns:
+        (triangle vertex ids (T, 3), triangle uv ids (T, 3), uvs (U, 2), triangle face ids (T,))
+    """
+    polygon_counts, polygon_vertices = mfn_mesh.getVertices()
+    uv_counts, uv_ids = mfn_mesh.getAssignedUVs(uv_set) if uv_set else mfn_mesh.getAssignedUVs()
+    # triangle corners as offsets into their polygon
+    triangle_counts, triangle_offsets = mfn_mesh.getTriangleOffsets()
+
+    polygon_counts = np.asarray(polygon_counts, dtype=np.int64)
+    polygon_vertices = np.asarray(polygon_vertices, dtype=np.int64)
+    uv_counts = np.asarray(uv_counts, dtype=np.int64)
+    uv_ids = np.asarray(uv_ids, dtype=np.int64)
+    triangle_counts = np.asarray(triangle_counts, dtype=np.int64)
+    triangle_offsets = np.asarray(triangle_offsets, dtype=np.int64).reshape(-1, 3)
+
+    face_starts = np.concatenate([[0], np.cumsum(polygon_counts)[:-1]])
+    triangle_faces = np.repeat(np.arange(len(polygon_counts)), triangle_counts)
+    face_vertex_ids = face_starts[triangle_faces][:, None] + triangle_offsets
+
+    # faces without UVs are left out of the index
+    mapped = (uv_counts == polygon_counts)[triangle_faces]
+    uv_starts = np.concatenate([[0], np.cumsum(uv_counts)[:-1]])
+    uv_face_vertex_ids = uv_starts[triangle_faces][:, None] + triangle_offsets
+
+    triangle_vertices = polygon_vertices[face_vertex_ids[mapped]]
+    triangle_uvs = uv_ids[uv_face_vertex_ids[mapped]]
+
+    us, vs = mfn_mesh.getUVs(uv_set) if uv_set else mfn_mesh.getUVs()
+    uvs = np.stack([np.asarray(us, dtype=np.float64), np.asarray(vs, dtype=np.float64)], axis=-1)
+    return triangle_vertices, triangle_uvs, uvs, triangle_faces[mapped]
+
+
+def get_mesh_counts(mfn_mesh, uv_set=None):
+    return (mfn_mesh.numVertices, mfn_mesh.numPolygons, mfn_mesh.numFaceVertices,
+            mfn_mesh.numUVs(uv_set) if uv_set else mfn_mesh.numUVs())
+
+
+class UVIndex(object):
+
+    def __init__(self, mesh, triangle_vertices, triangle_uvs, uvs, triangle_faces, resolution=None, uv_set=None):
+        self.mesh = mesh
+        self.uv_set = uv_set
+        self.triangle_vertices = triangle_vertices
+        self.triangle_faces = triangle_faces
+        # (T, 3, 2) UVs of the triangle corners
+        self.triangles = uvs[triangle_uvs]
+
+        triangle_count = len(self.triangles)
+        if resolution is None:
+            # about two triangles per cell
+            resolution = max(1, int(np.sqrt(max(triangle_count, 1) / 2.0)))
+        self.resolution = resolution
+
+        self.uv_min = self.triangles.reshape(-1, 2).min(axis=0) if triangle_count else np.zeros(2)
+        self.uv_max = self.triangles.reshape(-1, 2).max(axis=0) if triangle_count else np.ones(2)
+        self.cell_size = np.maximum((self.uv_max - self.uv_min) / resolution, 1e-12)
+
+        # bin every triangle into every cell its bounding box overlaps, stored as CSR arrays
+        low = self.get_cells(self.triangles.min(axis=1))
+        high = self.get_cells(self.triangles.max(axis=1))
+        spans = (high - low + 1)
+        counts = spans[:, 0] * spans[:, 1]
+        triangle_ids = np.repeat(np.arange(triangle_count), counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        span_u = np.repeat(spans[:, 0], counts)
+        cell_u = np.repeat(low[:, 0], counts) + local % span_u
+        cell_v = np.repeat(low[:, 1], counts) + local // span_u
+        cell_ids = cell_v * resolution + cell_u
+
+        order = np.argsort(cell_ids, kind="stable")
+        self.cell_triangles = triangle_ids[order]
+        self.cell_starts = np.searchsorted(cell_ids[order], np.arange(resolution * resolution + 1))
+
+    def get_cells(self, uvs):
+        cells = np.floor((uvs - self.uv_min) / self.cell_size).astype(np.int64)
+        return np.clip(cells, 0, self.resolution - 1)
+
+    def get_positions(self, space=om.MSpace.kWorld):
+        points = om.MFnMesh(get_dag_path(self.mesh)).getPoints(space)
+        return np.array([(point.x, point.y, point.z) for point in points], dtype=np.float64)
+
+    def barycentric(self, uvs, triangle_ids):
+        corners = self.triangles[triangle_ids]
+        v0 = corners[:, 1] - corners[:, 0]
+        v1 = corners[:, 2] - corners[:, 0]
+        v2 = uvs - corners[:, 0]
+        denominator = v0[:, 0] * v1[:, 1] - v1[:, 0] * v0[:, 1]
+        denominator = np.where(np.abs(denominator) < 1e-20, 1e-20, denominator)
+        w1 = (v2[:, 0] * v1[:, 1] - v1[:, 0] * v2[:, 1]) / denominator
+        w2 = (v0[:, 0] * v2[:, 1] - v2[:, 0] * v0[:, 1]) / denominator
+        return np.stack([1.0 - w1 - w2, w1, w2], axis=-1)
+
+    def find_triangles(self, uvs, tolerance=1e-9):
+        """
+        find the triangle containing each UV
+
+        Args:
+            uvs (array_like): (N, 2) UVs
+
+        Returns:
+            (triangle ids (N,), barycentric weights (N, 3)), triangle id is -1 where no triangle contains the UV
+        """
+        uvs = np.atleast_2d(np.asarray(uvs, dtype=np.float64))
+        query_count = len(uvs)
+        cells = self.get_cells(uvs)
+        cell_ids = cells[:, 1] * self.resolution + cells[:, 0]
+        inside_bounds = np.all((uvs >= self.uv_min - tolerance) & (uvs <= self.uv_max + tolerance), axis=1)
+
+        starts = self.cell_starts[cell_ids]
+        counts = np.where(inside_bounds, self.cell_starts[cell_ids + 1] - starts, 0)
+
+        # every (query, candidate triangle) pair, tested in one vectorized pass
+        query_ids = np.repeat(np.arange(query_count), counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        candidates = self.cell_triangles[np.repeat(starts, counts) + local]
+
+        weights = self.barycentric(uvs[query_ids], candidates)
+        inside = np.all(weights >= -tolerance, axis=1)
+
+        triangle_ids = np.full(query_count, -1, dtype=np.int64)
+        result_weights = np.zeros((query_count, 3))
+        hits, first = np.unique(query_ids[inside], return_index=True)
+        triangle_ids[hits] = candidates[inside][first]
+        result_weights[hits] = weights[inside][first]
+        return triangle_ids, result_weights
+
+    def points_at_uvs(self, uvs, positions=None, space=om.MSpace.kWorld):
+        """
+        positions on the mesh at each UV
+
+        Args:
+            uvs (array_like): (N, 2) UVs
+            positions (array_like): vertex positions, read from the mesh if None
+            space (MSpace): space of the positions read from the mesh
+
+        Returns:
+            (N, 3) array, NaN where the UV is not mapped on the mesh
+        """
+        if positions is None:
+            positions = self.get_positions(space)
+        triangle_ids, weights = self.find_triangles(uvs)
+        points = np.full((len(triangle_ids), 3), np.nan)
+        found = triangle_ids >= 0
+        corners = positions[self.triangle_vertices[triangle_ids[found]]]
+        points[found] = np.einsum("nk,nkj->nj", weights[found], corners)
+        return points
+
+    def closest_uvs(self, uvs, search_rings=1):
+        """
+        the closest UV lying on a triangle of the mesh, for UVs falling in gaps between UV shells
+
+        Args:
+            uvs (array_like): (N, 2) UVs
+            search_rings (int): number of cell rings around the query searched before falling back to every triangle
+
+        Returns:
+            (closest uvs (N, 2), triangle ids (N,)), ValueError when the mesh has no mapped triangle
+        """
+        if not len(self.triangles):
+            raise ValueError(f"{self.mesh} has no mapped triangles in uv set {self.uv_set or '(current)'}")
+        uvs = np.atleast_2d(np.asarray(uvs, dtype=np.float64))
+        triangle_ids, weights = self.find_triangles(uvs)
+        closest = uvs.copy()
+        for query in np.nonzero(triangle_ids < 0)[0]:
+            cell = self.get_cells(uvs[query][None])[0]
+            low = np.clip(cell - search_rings, 0, self.resolution - 1)
+            high = np.clip(cell + search_rings, 0, self.resolution - 1)
+            candidates = [self.cell_triangles[self.cell_starts[v * self.resolution + u]:
+                                              self.cell_starts[v * self.resolution + u + 1]]
+                          for v in range(low[1], high[1] + 1) for u in range(low[0], high[0] + 1)]
+            candidates = np.unique(np.concatenate(candidates)) if candidates else np.zeros(0, dtype=np.int64)
+            if not len(candidates):
+                candidates = np.arange(len(self.triangles))
+            points = closest_points_on_triangles(uvs[query], self.triangles[candidates])
+            distances = np.sum((points - uvs[query]) ** 2, axis=1)
+            best = np.argmin(distances)
+            closest[query] = points[best]
+            triangle_ids[query] = candidates[best]
+        return closest, triangle_ids
+
+
+def closest_points_on_triangles(point, triangles):
+    """
+    closest point to a 2D point on each of many triangles
+
+    Args:
+        point (array_like): (2,) point
+        triangles (array_like): (T, 3, 2) triangles
+
+    Returns:
+        (T, 2) closest points
+    """
+    best = None
+    best_distance = None
+    # the closest point of a triangle that does not contain the point lies on one of its edges
+    for start, end in [(0, 1), (1, 2), (2, 0)]:
+        a = triangles[:, start]
+        b = triangles[:, end]
+        edge = b - a
+        length = np.maximum(np.sum(edge * edge, axis=1), 1e-20)
+        t = np.clip(np.sum((point - a) * edge, axis=1) / length, 0.0, 1.0)
+        candidate = a + t[:, None] * edge
+        distance = np.sum((candidate - point) ** 2, axis=1)
+        if best is None:
+            best, best_distance = candidate, distance
+        else:
+            closer = distance < best_distance
+            best = np.where(closer[:, None], candidate, best)
+            best_distance = np.where(closer, distance, best_distance)
+    return best
+
+
+def drop_mesh(mesh_object):
+    hash_code = om.MObjectHandle(mesh_object).hashCode()
+    for key in [key for key, entry in _index_cache.items() if entry[0].hashCode() == hash_code]:
+        del _index_cache[key]
+
+
+def topology_changed_callback(mesh_object, clientData):
+    drop_mesh(mesh_object)
+
+
+def watch_mesh(mesh_object):
+    # one callback per mesh, the registry removes it with the scene so it is installed again on the next index
+    handle = om.MObjectHandle(mesh_object)
+    handle_code = handle.hashCode()
+    watched = _mesh_callbacks.get(handle_code)
+    if watched and watched[0].isValid() and watched[0].object() == mesh_object and \
+            watched[1] in cbr.get_callbacks_on_node(mesh_object):
+        return
+    _mesh_callbacks[handle_code] = (handle, cbr.register_callback(
+        lambda callback: om.MPolyMessage.addPolyTopologyChangedCallback(mesh_object, callback),
+        topology_changed_callback, name="uv_index.topology_changed", node=mesh_object))
+
+
+def get_uv_index(mesh, uv_set=None, rebuild=False):
+    """
+    UV index of a mesh, rebuilt only when its topology or the number of its UVs changed
+
+    Args:
+        mesh (str): mesh shape or transform
+        uv_set (str): uv set, the current one if None
+        rebuild (bool): rebuild the index, for UVs moved in place
+
+    Returns:
+        UVIndex
+    """
+    dag_path = get_dag_path(mesh)
+    mfn_mesh = om.MFnMesh(dag_path)
+    mesh_object = mfn_mesh.object()
+    # the current uv set is resolved so switching it does not return the index of the previous one
+    key = (mfn_mesh.fullPathName(), uv_set or mfn_mesh.currentUVSetName())
+    counts = get_mesh_counts(mfn_mesh, key[1])
+
+    entry = _index_cache.get(key)
+    if rebuild or entry is None or not entry[0].isValid() or entry[0].object() != mesh_object or entry[1] != counts:
+        index = UVIndex(key[0], *get_mesh_data(mfn_mesh, key[1]), uv_set=key[1])
+        entry = (om.MObjectHandle(mesh_object), counts, index)
+        _index_cache[key] = entry
+        watch_mesh(mesh_object)
+    return entry[2]
+
+
+def clear_cache():
+    _index_cache.clear()